@@ -1,11 +1,20 @@
 from datetime import datetime, timedelta
 from typing import Optional
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+import asyncio
+import os
+import threading
+import time
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from sqlmodel import Session, select
-from database import get_session
+from sqlalchemy import event, inspect
+from sqlalchemy.exc import IntegrityError
+from database import engine, get_session, write_session_scope
 from models import User
 from pydantic import BaseModel
 
@@ -37,6 +46,87 @@ def verify_password(plain_password, hashed_password):
 def get_password_hash(password):
     return pwd_context.hash(password)
 
+class PasswordHasher:
+    """
+    Runs pwd_context.hash/verify (pbkdf2, deliberately slow) on a small thread pool
+    so a login doesn't stall the event loop and every WebSocket broadcast with it.
+    hashlib's pbkdf2 releases the GIL, so threads give real parallelism here.
+    At most `max_workers` hashes run at once; beyond `max_queue` waiting jobs new
+    requests are rejected with 503 instead of piling up.
+    """
+
+    def __init__(self, max_workers: int = 2, max_queue: int = 64):
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="pwd-hash")
+        self._lock = threading.Lock()
+        self.queued = 0
+        self.active = 0
+        self.completed = 0
+        self.rejected = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+
+    def _job(self, job, fn, *args):
+        waited = time.perf_counter() - job["submitted"]
+        with self._lock:
+            job["started"] = True
+            self.queued -= 1
+            self.active += 1
+            self.wait_seconds_total += waited
+            self.wait_seconds_max = max(self.wait_seconds_max, waited)
+        try:
+            return fn(*args)
+        finally:
+            with self._lock:
+                self.active -= 1
+                self.completed += 1
+
+    def _done(self, job, future):
+        # A job cancelled before it started (client gone, request timed out) still leaves the queue
+        with self._lock:
+            if not job["started"]:
+                self.queued -= 1
+
+    async def _run(self, fn, *args):
+        with self._lock:
+            if self.queued >= self.max_queue:
+                self.rejected += 1
+                raise HTTPException(status_code=503, detail="Authentication busy, retry shortly", headers={"Retry-After": "1"})
+            self.queued += 1
+        job = {"submitted": time.perf_counter(), "started": False}
+        try:
+            future = self._executor.submit(self._job, job, fn, *args)
+        except BaseException:
+            with self._lock:
+                self.queued -= 1
+            raise
+        future.add_done_callback(partial(self._done, job))
+        # Cancelling the await cancels the pool job too, if it hasn't started
+        return await asyncio.wrap_future(future)
+
+    async def verify(self, plain_password, hashed_password) -> bool:
+        return await self._run(verify_password, plain_password, hashed_password)
+
+    async def hash(self, password) -> str:
+        return await self._run(get_password_hash, password)
+
+    def metrics(self):
+        return {
+            "workers": self.max_workers,
+            "queued": self.queued,
+            "active": self.active,
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "wait_seconds_total": round(self.wait_seconds_total, 6),
+            "wait_seconds_max": round(self.wait_seconds_max, 6),
+        }
+
+password_hasher = PasswordHasher(
+    max_workers=int(os.getenv("PASSWORD_HASH_WORKERS", str(min(4, os.cpu_count() or 1)))),
+    max_queue=int(os.getenv("PASSWORD_HASH_QUEUE", "64")),
+)
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
     if expires_delta:
@@ -47,21 +137,101 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
+class TokenUserCache:
+    """
+    Bounded LRU of verified token -> user snapshot.
+    Entries expire with the token's own `exp` claim, but after `ttl` seconds at
+    the latest: the User mapper events below only drop them in this process, so a
+    user deleted or changed by another worker (or a script like fix_ownership.py)
+    is re-checked within `ttl`. A hit skips both the JWT decode and the user lookup.
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 60):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, token: str) -> Optional[User]:
+        with self._lock:
+            entry = self._entries.get(token)
+            if entry is None:
+                return None
+            snapshot, expires_at = entry
+            if expires_at <= time.time():
+                del self._entries[token]
+                return None
+            self._entries.move_to_end(token)
+        # Fresh detached instance per request, callers can't mutate the cached snapshot
+        return User(**snapshot)
+
+    def put(self, token: str, user: User, expires_at: float):
+        snapshot = {"id": user.id, "email": user.email, "hashed_password": user.hashed_password, "full_name": user.full_name}
+        expires_at = min(expires_at, time.time() + self.ttl)
+        with self._lock:
+            self._entries[token] = (snapshot, expires_at)
+            self._entries.move_to_end(token)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def invalidate_email(self, email: str):
+        with self._lock:
+            stale = [token for token, (snapshot, _) in self._entries.items() if snapshot["email"] == email]
+            for token in stale:
+                del self._entries[token]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+token_user_cache = TokenUserCache(
+    maxsize=int(os.getenv("AUTH_CACHE_SIZE", "1024")),
+    ttl=float(os.getenv("AUTH_CACHE_TTL", "60")),
+)
+
+@event.listens_for(User, "after_update")
+@event.listens_for(User, "after_delete")
+def _invalidate_cached_user(mapper, connection, target):
+    token_user_cache.invalidate_email(target.email)
+    # An email change leaves tokens issued for the old address behind
+    for old_email in inspect(target).attrs.email.history.deleted:
+        token_user_cache.invalidate_email(old_email)
+
+def authenticate_token(token: str, session: Optional[Session] = None) -> Optional[User]:
+    """
+    Resolves a bearer token to its User, or None if the token is invalid/expired
+    or the user no longer exists. Shared by get_current_user and the WebSocket endpoint.
+    """
+    user = token_user_cache.get(token)
+    if user is not None:
+        return user
+
+    try:
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    except JWTError:
+        return None
+    email: str = payload.get("sub")
+    if email is None:
+        return None
+
+    if session is None:
+        with Session(engine) as own_session:
+            user = own_session.exec(select(User).where(User.email == email)).first()
+    else:
+        user = session.exec(select(User).where(User.email == email)).first()
+    if user is None:
+        return None
+
+    token_user_cache.put(token, user, float(payload.get("exp", time.time())))
+    return user
+
 async def get_current_user(token: str = Depends(oauth2_scheme), session: Session = Depends(get_session)):
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        email: str = payload.get("sub")
-        if email is None:
-            raise credentials_exception
-    except JWTError:
-        raise credentials_exception
-    
-    user = session.exec(select(User).where(User.email == email)).first()
+    user = authenticate_token(token, session)
     if user is None:
         raise credentials_exception
     return user
@@ -78,24 +248,37 @@ async def register_user(user_input: UserCreate, session: Session = Depends(get_s
     existing = session.exec(select(User).where(User.email == user_input.email)).first()
     if existing:
         raise HTTPException(status_code=400, detail="Email already registered")
+    # Give the pooled connection back before awaiting the hasher
+    session.close()
     
-    # 2. Hash password & Create
-    hashed_pw = get_password_hash(user_input.password)
+    # 2. Hash password (off the event loop, and before taking the write session)
+    hashed_pw = await password_hasher.hash(user_input.password)
+
+    # 3. Create
     user = User(
         email=user_input.email, 
         hashed_password=hashed_pw,
         full_name=user_input.full_name
     )
-    session.add(user)
-    session.commit()
-    session.refresh(user)
+    async with write_session_scope() as write_session:
+        write_session.add(user)
+        try:
+            write_session.commit()
+        except IntegrityError:
+            # Registered concurrently between the check and the insert
+            raise HTTPException(status_code=400, detail="Email already registered")
+        write_session.refresh(user)
     return user
 
 @router.post("/login", response_model=Token)
 async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(), session: Session = Depends(get_session)):
     # 1. Authenticate
     user = session.exec(select(User).where(User.email == form_data.username)).first()
-    if not user or not verify_password(form_data.password, user.hashed_password):
+    # Give the pooled connection back before awaiting the hasher, otherwise a login
+    # burst holds every pooled connection while it waits and the next checkout
+    # blocks the event loop
+    session.close()
+    if not user or not await password_hasher.verify(form_data.password, user.hashed_password):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect username or password",
@@ -0,0 +1,79 @@
+"""
+Backfill readings from the old v1 `aqi.db` files (table aqi_data) into Measurement.
+
+Usage (from backend/):
+    python backfill_legacy_db.py path/to/aqi.db DEV_CAM_01 [--batch 10000]
+
+The target device must already be registered (its location is used for the rows).
+Rows go through MeasurementWriter: COPY on Postgres, executemany on SQLite, and
+re-running a backfill skips rows that are already stored.
+"""
+import argparse
+import os
+import sqlite3
+import sys
+import time
+from datetime import datetime
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from sqlmodel import Session
+from database import create_db_and_tables, write_engine
+from models import Device
+from measurement_writer import MeasurementWriter
+
+# aqi_data column -> Measurement.type
+LEGACY_COLUMNS = {
+    "pm25": "pm25", "pm10": "pm10", "co": "co", "so2": "so2", "no2": "no2", "o3": "o3",
+    "ph": "ph", "turbidity": "turbidity", "water_level": "level",
+}
+
+
+def parse_legacy_ts(value):
+    # SQLite CURRENT_TIMESTAMP format, occasionally ISO with 'T'
+    return datetime.fromisoformat(str(value).replace(" ", "T"))
+
+
+def backfill(db_path, device_id, batch_size=10000):
+    create_db_and_tables()
+    with Session(write_engine) as session:
+        dev = session.get(Device, device_id)
+        if not dev:
+            print(f"[!] Device {device_id} not registered. Register it first.")
+            return
+        location_id = dev.location_id
+
+    legacy = sqlite3.connect(db_path)
+    available = {row[1] for row in legacy.execute("PRAGMA table_info(aqi_data)")}
+    columns = [c for c in LEGACY_COLUMNS if c in available]
+    cursor = legacy.execute(f"SELECT timestamp, {', '.join(columns)} FROM aqi_data ORDER BY timestamp")
+
+    writer = MeasurementWriter(write_engine, batch_size=batch_size)
+    start = time.perf_counter()
+    seen = 0
+    for record in cursor:
+        ts = parse_legacy_ts(record[0])
+        for col, val in zip(columns, record[1:]):
+            if val is None:
+                continue
+            writer.add({
+                "location_id": location_id, "device_id": device_id,
+                "type": LEGACY_COLUMNS[col], "value": float(val), "timestamp": ts,
+            })
+            seen += 1
+    writer.flush()
+    legacy.close()
+
+    elapsed = time.perf_counter() - start
+    rate = seen / elapsed if elapsed else 0
+    print(f"[+] {seen} readings in {elapsed:.1f}s ({rate:,.0f}/s): "
+          f"{writer.inserted} inserted, {writer.duplicates} already present")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Backfill a legacy aqi.db into the Measurement table")
+    parser.add_argument("db_path")
+    parser.add_argument("device_id")
+    parser.add_argument("--batch", type=int, default=10000)
+    args = parser.parse_args()
+    backfill(args.db_path, args.device_id, args.batch)
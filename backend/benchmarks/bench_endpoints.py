@@ -0,0 +1,214 @@
+"""
+Benchmark: API endpoint latency on a seeded dataset, through the ASGI app (no server).
+
+    python benchmarks/bench_endpoints.py                                   # small SQLite dataset
+    python benchmarks/bench_endpoints.py --locations 100 --devices 10 --days 90 --interval 60 \
+        --output results.json [--compare previous.json]
+
+Seeds synthetic history (every device reports every --interval minutes for --days, up
+to now; every 5th device is an AQI camera) with MeasurementWriter, then times the read
+endpoints and ingest. DATABASE_URL selects the database (default: a fresh temporary
+SQLite file); --skip-seed reuses an already seeded one. The JSON output (dataset,
+commit, per-endpoint latency) is meant to be diffed across commits, --compare prints
+the ratio against an earlier run.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}")
+os.environ.setdefault("INGEST_RATE_LIMIT", "0")  # the ingest loop would otherwise hit the per-device limit
+
+import httpx
+import main
+from sqlmodel import Session, func, select
+from database import create_db_and_tables, engine, write_engine
+from measurement_writer import MeasurementWriter
+from models import Device, Location, Measurement, User
+
+EMAIL, PASSWORD = "bench@example.com", "bench-password"
+AQI_TYPES = ["pm25", "pm10", "co", "no2", "o3", "so2"]
+WATER_TYPES = ["ph", "turbidity", "level"]
+
+# (name, method, path); ingest bodies are built per iteration
+ENDPOINTS = [
+    ("public_locations", "GET", "/api/public/locations"),
+    ("locations_status", "GET", "/api/locations/status"),
+    ("devices", "GET", "/api/devices"),
+    ("status", "GET", "/api/status"),
+    ("export_csv", "GET", "/api/export/csv"),
+    ("ingest", "POST", "/api/ingest"),
+    ("ingest_batch", "POST", "/api/ingest/batch"),
+]
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def device_types(i):
+    return ("aqi_camera", AQI_TYPES) if i % 5 == 0 else ("water_sensor", WATER_TYPES)
+
+
+def seed(user_id, args):
+    """Locations, devices and measurement history for `user_id`; returns the number of rows."""
+    with Session(write_engine) as session:
+        for l in range(args.locations):
+            session.add(Location(name=f"BENCH_LOC_{l:04d}", display_name=f"Bench Location {l}", area="Bench",
+                                 site_type="Pole", latitude=12.9 + l * 0.001, longitude=77.5, owner_id=user_id))
+        session.commit()
+        loc_ids = [loc.id for loc in session.exec(select(Location).where(Location.owner_id == user_id)
+                                                  .order_by(Location.name)).all()]
+        devices = []
+        for l, loc_id in enumerate(loc_ids):
+            for d in range(args.devices):
+                dev_type, types = device_types(d)
+                device_id = f"BENCH_DEV_{l:04d}_{d:02d}"
+                session.add(Device(device_id=device_id, location_id=loc_id, owner_id=user_id, type=dev_type))
+                devices.append((device_id, loc_id, types))
+        session.commit()
+
+    rng = random.Random(1)
+    now = datetime.utcnow().replace(microsecond=0)
+    steps = int(args.days * 24 * 60 / args.interval)
+    writer = MeasurementWriter(write_engine, batch_size=50000)
+    start = time.perf_counter()
+    for step in range(steps, -1, -1):
+        ts = now - timedelta(minutes=step * args.interval)
+        for device_id, loc_id, types in devices:
+            writer.extend({"location_id": loc_id, "device_id": device_id, "type": t, "value": round(rng.uniform(0, 300), 2),
+                           "timestamp": ts} for t in types)
+    writer.flush()
+    print(f"Seeded {writer.inserted} measurements in {time.perf_counter() - start:.1f}s")
+    return writer.inserted
+
+
+def ingest_body(device_id, types, ts):
+    return {"device_id": device_id, "type": "aqi" if "pm25" in types else "water", "timestamp": ts.isoformat(),
+            "data": {t: round(random.uniform(0, 300), 2) for t in types}}
+
+
+async def time_endpoint(client, method, path, iterations, headers, body=None):
+    """Sequential requests; body(i) builds the JSON body of request i."""
+    times, sizes, statuses = [], [], set()
+    for i in range(-1, iterations):  # one warm-up
+        start = time.perf_counter()
+        if method == "GET":
+            r = await client.get(path, headers=headers)
+        else:
+            r = await client.post(path, json=body(i), headers=headers)
+        elapsed = time.perf_counter() - start
+        statuses.add(r.status_code)
+        if i >= 0:
+            times.append(elapsed * 1000)
+            sizes.append(len(r.content))
+    times.sort()
+    return {
+        "iterations": iterations,
+        "status": sorted(statuses),
+        "mean_ms": round(statistics.mean(times), 3),
+        "p50_ms": round(statistics.median(times), 3),
+        "p95_ms": round(times[max(0, int(len(times) * 0.95) - 1)], 3),
+        "max_ms": round(times[-1], 3),
+        "response_bytes": int(statistics.median(sizes)),
+    }
+
+
+async def main_async(args):
+    create_db_and_tables()
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=600) as client:
+        await client.post("/api/auth/register", json={"email": EMAIL, "password": PASSWORD})
+        r = await client.post("/api/auth/login", data={"username": EMAIL, "password": PASSWORD})
+        headers = {"Authorization": f"Bearer {r.json()['access_token']}"}
+
+        with Session(engine) as session:
+            user_id = session.exec(select(User.id).where(User.email == EMAIL)).one()
+            seeded = session.exec(select(func.count()).select_from(Location).where(Location.owner_id == user_id)).one()
+        if not seeded and not args.skip_seed:
+            seed(user_id, args)
+        with Session(engine) as session:
+            counts = {
+                "locations": session.exec(select(func.count()).select_from(Location)).one(),
+                "devices": session.exec(select(func.count()).select_from(Device)).one(),
+                "measurements": session.exec(select(func.count()).select_from(Measurement)).one(),
+            }
+            devices = [(d.device_id, AQI_TYPES if d.type == "aqi_camera" else WATER_TYPES)
+                       for d in session.exec(select(Device).where(Device.owner_id == user_id)).all()]
+        print(f"Dataset: {counts['locations']} locations, {counts['devices']} devices, "
+              f"{counts['measurements']} measurements ({engine.dialect.name})")
+
+        # Ingest: new readings (timestamps after the seeded history) spread over the devices
+        clock = datetime.utcnow()
+
+        def next_ts():
+            nonlocal clock
+            clock += timedelta(milliseconds=1)
+            return clock
+
+        bodies = {
+            "ingest": lambda i: ingest_body(*devices[i % len(devices)], next_ts()),
+            "ingest_batch": lambda i: {"records": [ingest_body(*devices[(i * args.batch + j) % len(devices)], next_ts())
+                                                   for j in range(args.batch)]},
+        }
+
+        results = {}
+        for name, method, path in ENDPOINTS:
+            if args.only and name not in args.only:
+                continue
+            iterations = args.iterations if method == "GET" else args.iterations * 5
+            results[name] = await time_endpoint(client, method, path, iterations, headers, bodies.get(name))
+            res = results[name]
+            print(f"  {name:18s} p50 {res['p50_ms']:9.2f} ms  p95 {res['p95_ms']:9.2f} ms  "
+                  f"max {res['max_ms']:9.2f} ms  {res['response_bytes']:>9} B  status {res['status']}")
+
+    report = {
+        "commit": git_commit(),
+        "created_at": datetime.utcnow().isoformat(),
+        "python": platform.python_version(),
+        "database": engine.dialect.name,
+        "dataset": {"locations": args.locations, "devices_per_location": args.devices, "days": args.days,
+                    "interval_minutes": args.interval, **counts},
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Results written to {args.output}")
+    if args.compare:
+        with open(args.compare) as f:
+            previous = json.load(f)
+        print(f"Compared with {previous.get('commit')} (p50 now / before):")
+        for name, res in results.items():
+            old = previous["results"].get(name)
+            if old:
+                print(f"  {name:18s} {res['p50_ms']:9.2f} / {old['p50_ms']:9.2f} ms  x{res['p50_ms'] / old['p50_ms']:.2f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="API endpoint benchmark on a seeded dataset")
+    parser.add_argument("--locations", type=int, default=20)
+    parser.add_argument("--devices", type=int, default=5, help="devices per location")
+    parser.add_argument("--days", type=float, default=7, help="days of history")
+    parser.add_argument("--interval", type=float, default=10, help="minutes between readings per device")
+    parser.add_argument("--iterations", type=int, default=20, help="timed requests per GET endpoint (x5 for ingest)")
+    parser.add_argument("--batch", type=int, default=50, help="records per /api/ingest/batch request")
+    parser.add_argument("--only", nargs="*", help="endpoint names to run")
+    parser.add_argument("--skip-seed", action="store_true", help="use the data already in DATABASE_URL")
+    parser.add_argument("--output", help="write results as JSON here")
+    parser.add_argument("--compare", help="earlier results JSON to compare against")
+    asyncio.run(main_async(parser.parse_args()))
@@ -0,0 +1,66 @@
+"""
+Microbenchmark: per-request CPU of /api/ingest body handling.
+
+  before: pydantic IngestPayload validation -> isinstance walk -> payload.dict()
+  after:  ingest_decoder.decode_ingest (single pass, decoded dict reused for broadcast)
+
+Run from backend/:  python benchmarks/bench_ingest_decode.py [iterations]
+"""
+import sys
+import os
+import json
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from main import IngestPayload
+from ingest_decoder import decode_ingest
+
+BODY = json.dumps({
+    "device_id": "DEV_CAM_01",
+    "type": "aqi",
+    "timestamp": "2026-01-01T10:00:00",
+    "data": {"pm25": 63.0, "pm10": 88, "co": 0.6, "so2": 4.1, "no2": 12.5, "o3": 31, "status": "MID"}
+}).encode()
+
+
+def old_path(body):
+    if hasattr(IngestPayload, "model_validate_json"):
+        payload = IngestPayload.model_validate_json(body)
+    else:
+        payload = IngestPayload.parse_raw(body)
+    readings = []
+    for key, val in payload.data.items():
+        if not isinstance(val, (int, float)):
+            continue
+        readings.append((key, val))
+    ws_message = payload.dict()
+    ws_message["location_id"] = "LOC"
+    return readings, ws_message
+
+
+def new_path(body):
+    record = decode_ingest(body)
+    ws_message = record.message
+    ws_message["location_id"] = "LOC"
+    return record.readings, ws_message
+
+
+def measure(fn, iterations):
+    # warm up
+    for _ in range(1000):
+        fn(BODY)
+    start = time.process_time()
+    for _ in range(iterations):
+        fn(BODY)
+    return (time.process_time() - start) / iterations * 1e6
+
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    before = measure(old_path, n)
+    after = measure(new_path, n)
+    print(f"Iterations: {n}")
+    print(f"  pydantic path : {before:8.2f} us CPU/request")
+    print(f"  fast decoder  : {after:8.2f} us CPU/request")
+    print(f"  speedup       : {before / after:8.2f}x")
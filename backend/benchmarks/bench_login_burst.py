@@ -0,0 +1,113 @@
+"""
+Load test: live broadcast latency during a login burst.
+
+A broadcaster pushes a message to a fake WebSocket subscriber every 20 ms through
+the real ConnectionManager, and we record how late each send happens relative to
+its schedule while N concurrent logins hit /api/auth/login through the ASGI app.
+
+  inline:    pbkdf2 verify on the event loop (previous behaviour)
+  offloaded: auth.password_hasher thread pool
+
+Run from backend/:  python benchmarks/bench_login_burst.py [logins]
+"""
+import sys
+import os
+import asyncio
+import statistics
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}"
+
+import httpx
+import auth
+import main
+from database import create_db_and_tables
+
+INTERVAL = 0.02
+EMAIL, PASSWORD = "bench@example.com", "bench-password"
+
+
+class InlineHasher:
+    """Old behaviour: hash/verify directly on the event loop."""
+
+    async def verify(self, plain_password, hashed_password):
+        return auth.verify_password(plain_password, hashed_password)
+
+    async def hash(self, password):
+        return auth.get_password_hash(password)
+
+
+class FakeSocket:
+    def __init__(self):
+        self.received = 0
+
+    async def send_text(self, text):
+        self.received += 1
+
+
+async def broadcaster(stop, lateness):
+    sock = FakeSocket()
+    main.manager.active_connections["BENCH"] = [sock]
+    next_tick = time.perf_counter()
+    while not stop.is_set():
+        next_tick += INTERVAL
+        await asyncio.sleep(max(0, next_tick - time.perf_counter()))
+        await main.manager.broadcast({"type": "aqi", "data": {"pm25": 1}}, "BENCH")
+        lateness.append((time.perf_counter() - next_tick) * 1000)
+    main.manager.active_connections.pop("BENCH", None)
+
+
+def summary(values):
+    values = sorted(values)
+    if not values:
+        return "no samples"
+    p95 = values[int(len(values) * 0.95) - 1] if len(values) >= 20 else values[-1]
+    return f"p50 {statistics.median(values):6.2f} ms   p95 {p95:6.2f} ms   max {values[-1]:6.2f} ms"
+
+
+async def run(client, logins):
+    stop = asyncio.Event()
+    lateness = []
+    task = asyncio.create_task(broadcaster(stop, lateness))
+    await asyncio.sleep(0.2)
+    start = time.perf_counter()
+    responses = await asyncio.gather(*[
+        client.post("/api/auth/login", data={"username": EMAIL, "password": PASSWORD}) for _ in range(logins)
+    ])
+    elapsed = time.perf_counter() - start
+    await asyncio.sleep(0.2)
+    stop.set()
+    await task
+    ok = sum(1 for r in responses if r.status_code == 200)
+    return lateness, ok, elapsed
+
+
+async def main_async(logins):
+    create_db_and_tables()
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        await client.post("/api/auth/register", json={"email": EMAIL, "password": PASSWORD})
+
+        idle = []
+        stop = asyncio.Event()
+        task = asyncio.create_task(broadcaster(stop, idle))
+        await asyncio.sleep(1)
+        stop.set()
+        await task
+        print(f"  idle      : {summary(idle)}")
+
+        offloaded = auth.password_hasher
+        for label, hasher in (("inline", InlineHasher()), ("offloaded", offloaded)):
+            auth.password_hasher = hasher
+            lateness, ok, elapsed = await run(client, logins)
+            print(f"  {label:10s}: {summary(lateness)}   ({ok}/{logins} logins in {elapsed:.2f}s)")
+        auth.password_hasher = offloaded
+        print(f"  hasher metrics: {offloaded.metrics()}")
+
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    print(f"Broadcast lateness, {INTERVAL * 1000:.0f} ms schedule, burst of {n} logins")
+    asyncio.run(main_async(n))
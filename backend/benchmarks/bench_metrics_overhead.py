@@ -0,0 +1,109 @@
+"""
+Microbenchmark: per-request cost of the /metrics instrumentation.
+
+  on:   RequestMetricsMiddleware + SQLAlchemy query hooks (default)
+  off:  middleware removed from the app, query hooks detached
+
+First the direct cost of the middleware (around a no-op app) and of the query hooks
+(SELECT 1), then requests through the ASGI app in-process (httpx.ASGITransport), alternating
+on/off rounds so drift affects both equally:
+  /api/health   no DB
+  /api/status   auth + one query
+
+Run from backend/:  python benchmarks/bench_metrics_overhead.py [requests per round] [rounds]
+"""
+import sys
+import os
+import asyncio
+import statistics
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}"
+
+import httpx
+from starlette.middleware import Middleware
+import main
+import metrics
+import query_log
+from database import create_db_and_tables
+
+EMAIL, PASSWORD = "bench@example.com", "bench-password"
+
+
+def set_instrumentation(enabled):
+    app = main.app
+    app.user_middleware = [m for m in app.user_middleware if m.cls is not metrics.RequestMetricsMiddleware]
+    if enabled:
+        app.user_middleware.insert(0, Middleware(metrics.RequestMetricsMiddleware))
+        query_log.instrument_queries()
+    else:
+        query_log.uninstrument_queries()
+    app.middleware_stack = None  # rebuilt on the next request
+
+
+async def per_request_us(client, path, headers, n):
+    start = time.perf_counter()
+    for _ in range(n):
+        await client.get(path, headers=headers)
+    return (time.perf_counter() - start) / n * 1e6
+
+
+async def direct_costs(n=50000):
+    """Middleware around a no-op ASGI app, and a trivial query with / without the hooks."""
+    async def noop_app(scope, receive, send):
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+
+    async def noop_send(message):
+        pass
+
+    scope = {"type": "http", "method": "GET", "path": "/x"}
+    wrapped = metrics.RequestMetricsMiddleware(noop_app)
+    timings = {}
+    for name, app in (("bare", noop_app), ("middleware", wrapped)):
+        start = time.perf_counter()
+        for _ in range(n):
+            await app(dict(scope), None, noop_send)
+        timings[name] = (time.perf_counter() - start) / n * 1e6
+    print(f"  middleware alone : {timings['middleware'] - timings['bare']:6.2f} us/request")
+
+    from sqlalchemy import text
+    from database import engine
+    with engine.connect() as conn:
+        for enabled in (False, True, False, True):
+            query_log.instrument_queries() if enabled else query_log.uninstrument_queries()
+            start = time.perf_counter()
+            for _ in range(n // 5):
+                conn.execute(text("SELECT 1"))
+            timings[enabled] = (time.perf_counter() - start) / (n // 5) * 1e6
+    print(f"  query hooks      : {timings[True] - timings[False]:6.2f} us/query (SELECT 1: {timings[False]:.1f} us bare)")
+
+
+async def main_async(n, rounds):
+    create_db_and_tables()
+    await direct_costs()
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        await client.post("/api/auth/register", json={"email": EMAIL, "password": PASSWORD})
+        r = await client.post("/api/auth/login", data={"username": EMAIL, "password": PASSWORD})
+        headers = {"Authorization": f"Bearer {r.json()['access_token']}"}
+
+        for path in ("/api/health", "/api/status"):
+            results = {True: [], False: []}
+            for _ in range(rounds):
+                for enabled in (False, True):
+                    set_instrumentation(enabled)
+                    await per_request_us(client, path, headers, 20)  # warm-up
+                    results[enabled].append(await per_request_us(client, path, headers, n))
+            off, on = statistics.median(results[False]), statistics.median(results[True])
+            print(f"  {path:12s}: off {off:8.1f} us   on {on:8.1f} us   overhead {on - off:+7.1f} us/request "
+                  f"({(on - off) / off:+.1%})")
+    set_instrumentation(True)
+
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    rounds = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+    print(f"Instrumentation overhead, {n} requests x {rounds} rounds per setting (median)")
+    asyncio.run(main_async(n, rounds))
@@ -0,0 +1,86 @@
+"""
+Microbenchmark: OCR frame preprocessing throughput (frames per second).
+
+  legacy:      the old preprocess_frame (new CLAHE + fresh buffers every call)
+  reused:      FramePreprocessor, cached CLAHE and dst= buffers (identical output)
+  downscale:   FramePreprocessor(max_width=...) on a 1080p frame, shrink first
+  rois:        FramePreprocessor on the calibrated ROIs only (ROI mode)
+
+Run from backend/:  python benchmarks/bench_ocr_preprocess.py [seconds per case]
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "services"))
+
+import cv2
+import numpy as np
+import ocr_ingest
+from ocr_ingest import FramePreprocessor
+
+
+def legacy_preprocess_frame(frame):
+    """preprocess_frame as it was before FramePreprocessor."""
+    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+    clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8, 8))
+    gray = clahe.apply(gray)
+    gray = cv2.resize(gray, None, fx=2, fy=2, interpolation=cv2.INTER_CUBIC)
+    gray = cv2.GaussianBlur(gray, (5, 5), 0)
+    _, thresh = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+    return thresh
+
+
+def monitor_frame(width, height):
+    rng = np.random.default_rng(0)
+    frame = rng.integers(20, 60, (height, width, 3), dtype=np.uint8)
+    for i, label in enumerate(ocr_ingest.LABELS):
+        y = int(height * (0.15 + 0.13 * i))
+        cv2.putText(frame, f"{label}: {40 + i * 7}", (width // 8, y), cv2.FONT_HERSHEY_SIMPLEX,
+                    width / 800, (230, 230, 230), max(1, width // 500))
+    return frame
+
+
+def fps(fn, seconds):
+    fn()  # warm-up (allocates the reusable buffers)
+    n = 0
+    start = time.perf_counter()
+    while time.perf_counter() - start < seconds:
+        fn()
+        n += 1
+    return n / (time.perf_counter() - start)
+
+
+# Shipped example calibration (real ones are per device and not in git)
+EXAMPLE_CALIBRATION = os.path.join(ocr_ingest.CALIBRATION_DIR, "DEV_CAM_01.example.json")
+
+
+def main(seconds):
+    hd = monitor_frame(1280, 720)
+    full_hd = monitor_frame(1920, 1080)
+    rois, _ = ocr_ingest.load_calibration(EXAMPLE_CALIBRATION, (1280, 720))
+
+    reused = FramePreprocessor()
+    assert np.array_equal(reused.apply(hd), legacy_preprocess_frame(hd)), "output differs from legacy"
+    downscale = FramePreprocessor(max_width=1280)
+    roi_pre = ocr_ingest.roi_preprocessor()
+
+    # (name, input, fn); speedups are relative to legacy on the same input
+    cases = [
+        ("legacy", "720p", lambda: legacy_preprocess_frame(hd)),
+        ("reused", "720p", lambda: reused.apply(hd)),
+        (f"rois ({len(rois)})", "720p", lambda: [roi_pre.apply(hd, rect) for rect in rois.values()]),
+        ("legacy", "1080p", lambda: legacy_preprocess_frame(full_hd)),
+        ("reused", "1080p", lambda: reused.apply(full_hd)),
+        ("downscale->1280", "1080p", lambda: downscale.apply(full_hd)),
+    ]
+    print(f"Preprocessing throughput, {seconds:.0f}s per case, OpenCV threads: {cv2.getNumThreads()}")
+    baseline = {}
+    for name, res, fn in cases:
+        rate = fps(fn, seconds)
+        baseline.setdefault(res, rate)
+        print(f"  {name:16s} {res:5s}: {rate:8.1f} frames/s  ({1000 / rate:6.2f} ms)  x{rate / baseline[res]:.1f}")
+
+
+if __name__ == "__main__":
+    main(float(sys.argv[1]) if len(sys.argv) > 1 else 2.0)
@@ -0,0 +1,144 @@
+"""
+Benchmark: ROI recognizers (template matching vs Tesseract) on recorded frames.
+
+    python benchmarks/bench_ocr_recognizers.py                      # synthetic display frames
+    python benchmarks/bench_ocr_recognizers.py FRAMES_DIR CAL.json TRUTH.json [--learn 5]
+
+FRAMES_DIR holds the recorded camera frames (png/jpg), CAL.json is the device's
+calibration file and TRUTH.json maps frame file name -> {label: value shown}.
+Templates come from the calibration's .glyphs.npz if present, otherwise they are
+learned from the first --learn frames (which are then left out of the scoring).
+
+Reports time per ROI and accuracy / unsure rate for each engine. Tesseract is
+skipped when it isn't installed.
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "services"))
+
+import cv2
+import numpy as np
+import pytesseract
+import ocr_ingest
+from ocr_ingest import FallbackRecognizer, TemplateRecognizer, TesseractRecognizer
+
+SYNTHETIC_ROIS = {"PM2.5": (180, 120, 200, 70), "PM10": (700, 120, 200, 70), "CO": (180, 320, 200, 70),
+                  "NO2": (700, 320, 200, 70), "O3": (180, 520, 200, 70), "SO2": (700, 520, 200, 70)}
+
+
+def render_monitor_frame(values, rng):
+    """One monitor-like frame showing `values`, with slight blur, noise and brightness drift."""
+    frame = np.full((720, 1280, 3), 30, np.uint8)
+    for label, (x, y, w, h) in SYNTHETIC_ROIS.items():
+        cv2.putText(frame, label, (x - 150, y + 50), cv2.FONT_HERSHEY_SIMPLEX, 1.2, (200, 200, 200), 2)
+        cv2.putText(frame, str(values[label]), (x + 10, y + 55), cv2.FONT_HERSHEY_SIMPLEX, 1.8, (235, 235, 235), 3)
+    frame = cv2.GaussianBlur(frame, (3, 3), 0)
+    return np.clip(frame * rng.uniform(0.8, 1.1) + rng.normal(0, 6, frame.shape), 0, 255).astype(np.uint8)
+
+
+def random_values(rng):
+    return {label: round(float(rng.uniform(0, 300)), 1) if label in ("CO", "O3") else int(rng.integers(0, 500))
+            for label in SYNTHETIC_ROIS}
+
+
+def synthetic_dataset(directory, n_frames=60, seed=1):
+    """Renders frames with random values into `directory`; returns (calibration path, truth path)."""
+    rng = np.random.default_rng(seed)
+    truth = {}
+    for i in range(n_frames):
+        values = random_values(rng)
+        name = f"frame_{i:04d}.png"
+        cv2.imwrite(os.path.join(directory, name), render_monitor_frame(values, rng))
+        truth[name] = values
+
+    calibration = os.path.join(directory, "calibration.json")
+    ocr_ingest.save_calibration(calibration, SYNTHETIC_ROIS, (1280, 720), invert=True)
+    truth_path = os.path.join(directory, "truth.json")
+    with open(truth_path, "w") as f:
+        json.dump(truth, f)
+    return calibration, truth_path
+
+
+def tesseract_available():
+    try:
+        pytesseract.get_tesseract_version()
+        return True
+    except Exception:
+        return False
+
+
+def evaluate(name, recognizer, samples):
+    times, correct, unsure = [], 0, 0
+    for roi, expected in samples:
+        start = time.perf_counter()
+        val = recognizer.read(roi)
+        times.append((time.perf_counter() - start) * 1000)
+        if val is None:
+            unsure += 1
+        elif abs(val - float(expected)) < 1e-6:
+            correct += 1
+    times.sort()
+    n = len(samples)
+    print(f"  {name:10s}: {statistics.median(times):7.3f} ms/ROI p50  {times[int(n * 0.95) - 1]:7.3f} ms p95   "
+          f"accuracy {correct / n:6.1%}  unsure {unsure / n:6.1%}  ({n} ROIs)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare ROI recognizers on recorded frames")
+    parser.add_argument("frames_dir", nargs="?")
+    parser.add_argument("calibration", nargs="?")
+    parser.add_argument("truth", nargs="?")
+    parser.add_argument("--learn", type=int, default=5, help="frames used to learn templates if no glyph file")
+    args = parser.parse_args()
+
+    if args.frames_dir:
+        frames_dir, calibration, truth_path = args.frames_dir, args.calibration, args.truth
+    else:
+        frames_dir = tempfile.mkdtemp()
+        calibration, truth_path = synthetic_dataset(frames_dir)
+        print(f"Synthetic frames in {frames_dir}")
+
+    with open(truth_path) as f:
+        truth = json.load(f)
+    names = sorted(n for n in truth if os.path.exists(os.path.join(frames_dir, n)))
+    frames = {n: cv2.imread(os.path.join(frames_dir, n)) for n in names}
+    first = frames[names[0]]
+    rois, invert = ocr_ingest.load_calibration(calibration, (first.shape[1], first.shape[0]))
+
+    def crops(frame_names):
+        for n in frame_names:
+            for label, (x, y, w, h) in rois.items():
+                if label in truth[n]:
+                    yield frames[n][y:y + h, x:x + w], truth[n][label]
+
+    glyphs = ocr_ingest.glyphs_path(calibration)
+    if os.path.exists(glyphs):
+        template = TemplateRecognizer.load(glyphs, invert)
+        scored = names
+    else:
+        template = TemplateRecognizer(invert=invert)
+        for roi, shown in crops(names[:args.learn]):
+            template.learn(roi, str(shown))
+        scored = names[args.learn:]
+        print(f"Learned {len(template.chars)} templates ({''.join(sorted(set(template.chars)))}) "
+              f"from {args.learn} frames")
+
+    samples = list(crops(scored))
+    print(f"Recognizers on {len(scored)} frames x {len(rois)} ROIs")
+    evaluate("template", template, samples)
+    if tesseract_available():
+        tesseract = TesseractRecognizer(invert)
+        evaluate("tesseract", tesseract, samples)
+        evaluate("fallback", FallbackRecognizer(template, tesseract), samples)
+    else:
+        print("  tesseract : not installed, skipped")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""
+Benchmark: full OCR pipeline (burst -> recognize -> vote) on a recording, headless.
+
+    python benchmarks/bench_ocr_replay.py [--workers N]
+
+Builds a synthetic recording (monitor values change every HOLD frames) with its
+calibration, learned glyph templates and ground truth, then runs
+`ocr_ingest.py replay` on it: inline (per-stage timings) and, with --workers, on
+the process pool. For real footage run the replay mode directly:
+
+    python services/ocr_ingest.py replay FRAMES_DIR_OR_VIDEO --truth truth.json [--workers 4]
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "services"))
+
+import cv2
+import numpy as np
+import ocr_ingest
+from bench_ocr_recognizers import SYNTHETIC_ROIS, random_values, render_monitor_frame, tesseract_available
+
+HOLD = 12  # frames per displayed set of values
+
+
+def synthetic_recording(directory, n_frames=240, seed=7):
+    rng = np.random.default_rng(seed)
+    truth = {}
+    recognizer = ocr_ingest.TemplateRecognizer(invert=True)
+    for i in range(n_frames):
+        if i % HOLD == 0:
+            values = random_values(rng)
+            truth[f"frame_{i:05d}.png"] = values
+        frame = render_monitor_frame(values, rng)
+        cv2.imwrite(os.path.join(directory, f"frame_{i:05d}.png"), frame)
+        # "Calibration": learn the font from the first screens
+        if i < 4 * HOLD and i % HOLD == 0:
+            for label, (x, y, w, h) in SYNTHETIC_ROIS.items():
+                recognizer.learn(frame[y:y + h, x:x + w], str(values[label]))
+
+    calibration = os.path.join(directory, "calibration.json")
+    ocr_ingest.save_calibration(calibration, SYNTHETIC_ROIS, (1280, 720), invert=True)
+    recognizer.save(ocr_ingest.glyphs_path(calibration))
+    truth_path = os.path.join(directory, "truth.json")
+    with open(truth_path, "w") as f:
+        json.dump(truth, f)
+    return calibration, truth_path
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Headless OCR pipeline benchmark on a synthetic recording")
+    parser.add_argument("--workers", type=int, default=0, help="also run on a pool of this many OCR processes")
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp()
+    calibration, truth_path = synthetic_recording(directory)
+    print(f"Synthetic recording in {directory} (values change every {HOLD} frames)")
+
+    # Template engine with the Tesseract fallback when it's installed
+    engine = "auto" if tesseract_available() else "template"
+    for workers in [0] + ([args.workers] if args.workers else []):
+        ocr_ingest.replay(directory, truth_path, workers=workers, calibration_file=calibration, mode="roi",
+                          stride=HOLD - ocr_ingest.CONSENSUS_K, engine=engine,
+                          report_path=os.path.join(directory, f"report_{workers or 'inline'}.json"))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""
+Benchmark: several cameras on one OCR supervisor (shared pool), fair vs FIFO scheduling.
+
+    python benchmarks/bench_ocr_supervisor.py [--cameras 4] [--workers 2]
+
+Each camera replays its own synthetic recording (see bench_ocr_replay.py) with bursts
+back to back. "fair" is the FairScheduler in front of the pool, "fifo" hands burst
+frames straight to the pool. Reports per-camera burst latency and total throughput.
+Uploads go to API_URL; without a server they land in a temporary spool.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "services"))
+os.environ.setdefault("OCR_SPOOL_FILE", os.path.join(tempfile.mkdtemp(), "bench_spool.db"))
+
+import ocr_ingest
+import ocr_supervisor
+from bench_ocr_recognizers import tesseract_available
+from bench_ocr_replay import synthetic_recording
+
+
+def run(cameras, workers, fifo):
+    supervisor = ocr_supervisor.Supervisor(cameras, workers)
+    if fifo:
+        for t in supervisor.threads:
+            t.pool = supervisor.pool
+    # Warm the worker processes up (spawn + imports) before timing
+    list(supervisor.pool.map(abs, range(workers)))
+    ocr_ingest.uploader = ocr_ingest.Uploader(ocr_ingest.API_URL, ocr_ingest.API_BATCH_URL, ocr_ingest.SPOOL_FILE)
+    start = time.perf_counter()
+    supervisor.start()
+    while supervisor.running():
+        time.sleep(0.1)
+    elapsed = time.perf_counter() - start
+    supervisor.stop()
+    return supervisor.metrics(), elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Multi-camera OCR supervisor benchmark")
+    parser.add_argument("--cameras", type=int, default=4)
+    parser.add_argument("--workers", type=int, default=2)
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp()
+    calibration, _ = synthetic_recording(directory)
+    engine = "auto" if tesseract_available() else "template"
+    cameras = [{"device_id": f"BENCH_CAM_{i + 1:02d}", "source": directory, "calibration": calibration,
+                "mode": "roi", "engine": engine, "interval": 0} for i in range(args.cameras)]
+    print(f"{args.cameras} cameras on {args.workers} OCR workers, synthetic recording in {directory}")
+
+    for name in ("fifo", "fair"):
+        metrics, elapsed = run([dict(cam) for cam in cameras], args.workers, fifo=name == "fifo")
+        bursts = sum(m["counters"].get("bursts", 0) for m in metrics["cameras"].values())
+        frames = sum(m["counters"].get("frames_ocrd", 0) for m in metrics["cameras"].values())
+        print(f"  {name}: {bursts} bursts, {frames} frames in {elapsed:.2f}s ({frames / elapsed:.0f} frames/s)")
+        for device_id, m in metrics["cameras"].items():
+            burst = m["stages"]["burst"]
+            wait = m["stages"].get("ocr_wait")
+            print(f"    {device_id}: burst p50 {burst['seconds_p50'] * 1000:6.1f} ms  p95 {burst['seconds_p95'] * 1000:6.1f} ms"
+                  + (f"   ocr wait p95 {wait['seconds_p95'] * 1000:6.1f} ms" if wait else ""))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""
+Benchmark: concurrent read/write throughput on SQLite, default engine vs tuned profile
+(WAL + pragmas, pooled readers, one dedicated writer connection).
+
+Readers run the "latest measurement per location" query used by the dashboard,
+writers insert small ingest-sized batches and commit each one.
+
+Run from backend/:  python benchmarks/bench_sqlite_concurrency.py [seconds] [readers] [writers]
+"""
+import sys
+import os
+import random
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlmodel import SQLModel, Session, select
+from database import create_sqlite_engines
+from models import Location, Device, Measurement
+from measurement_writer import insert_measurements
+
+SEED_ROWS = 50000
+LOCATIONS = 20
+
+
+def seed(write_engine):
+    SQLModel.metadata.create_all(write_engine)
+    with Session(write_engine) as session:
+        for i in range(LOCATIONS):
+            session.add(Location(id=i + 1, name=f"LOC_{i:02d}"))
+            session.add(Device(device_id=f"DEV_{i:02d}", location_id=i + 1, type="aqi"))
+        session.commit()
+        start = datetime(2026, 1, 1)
+        rows = [{
+            "location_id": n % LOCATIONS + 1, "device_id": f"DEV_{n % LOCATIONS:02d}",
+            "type": "pm25", "value": random.random() * 100, "timestamp": start + timedelta(seconds=n),
+        } for n in range(SEED_ROWS)]
+        insert_measurements(session, rows)
+        session.commit()
+
+
+def run(read_engine, write_engine, seconds, n_readers, n_writers):
+    stop = time.monotonic() + seconds
+    counts = {"reads": 0, "writes": 0, "errors": 0}
+    lock = threading.Lock()
+    clock = [datetime(2027, 1, 1)]
+
+    def reader():
+        done = errors = 0
+        while time.monotonic() < stop:
+            try:
+                with Session(read_engine) as session:
+                    loc_id = random.randint(1, LOCATIONS)
+                    session.exec(select(Measurement).where(Measurement.location_id == loc_id)
+                                 .order_by(Measurement.timestamp.desc()).limit(1)).first()
+                done += 1
+            except Exception:
+                errors += 1
+        with lock:
+            counts["reads"] += done
+            counts["errors"] += errors
+
+    def writer():
+        done = errors = 0
+        while time.monotonic() < stop:
+            with lock:
+                clock[0] += timedelta(seconds=1)
+                ts = clock[0]
+            dev = random.randint(0, LOCATIONS - 1)
+            rows = [{"location_id": dev + 1, "device_id": f"DEV_{dev:02d}", "type": t,
+                     "value": random.random(), "timestamp": ts} for t in ("pm25", "pm10", "co", "no2", "o3", "so2")]
+            try:
+                with Session(write_engine) as session:
+                    insert_measurements(session, rows)
+                    session.commit()
+                done += 1
+            except Exception:
+                errors += 1
+        with lock:
+            counts["writes"] += done
+            counts["errors"] += errors
+
+    threads = [threading.Thread(target=reader) for _ in range(n_readers)]
+    threads += [threading.Thread(target=writer) for _ in range(n_writers)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return {k: v / seconds if k != "errors" else v for k, v in counts.items()}
+
+
+if __name__ == "__main__":
+    seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 5
+    n_readers = int(sys.argv[2]) if len(sys.argv) > 2 else 4
+    n_writers = int(sys.argv[3]) if len(sys.argv) > 3 else 2
+
+    print(f"{seconds}s, {n_readers} readers, {n_writers} writers, {SEED_ROWS} seeded rows")
+    for label, tuned in (("default", False), ("tuned  ", True)):
+        with tempfile.TemporaryDirectory() as tmp:
+            url = f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+            read_engine, write_engine = create_sqlite_engines(url, tuned=tuned)
+            seed(write_engine)
+            result = run(read_engine, write_engine, seconds, n_readers, n_writers)
+            read_engine.dispose()
+            write_engine.dispose()
+        print(f"  {label}: {result['reads']:9.1f} reads/s  {result['writes']:8.1f} writes/s  {result['errors']} errors")
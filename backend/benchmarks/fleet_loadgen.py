@@ -0,0 +1,271 @@
+"""
+Load generator: a fleet of simulated ESP32 / camera devices against the API.
+
+    python benchmarks/fleet_loadgen.py --devices 5000 --locations 200 --rate 0.2 --duration 120 --subscribers 50
+    python benchmarks/fleet_loadgen.py --in-process --devices 500 --duration 20 --subscribers 20
+
+Registers a user, then N devices spread over M locations through /api/devices/register,
+then every device posts readings (simulate_esp32 payloads; every 5th device is an AQI
+camera) at --rate readings/s, each interval jittered by +-jitter. With --subscribers,
+K WebSocket clients listen on the locations (round-robin) and measure ingest ->
+broadcast latency from the payload's `timestamp` (UTC, stamped just before the POST),
+which the broadcast carries back. Clocks must agree, i.e. run it on the server box or
+use --in-process.
+
+--in-process runs against main.app through httpx.ASGITransport on a temporary SQLite
+database, with subscribers attached directly to the ConnectionManager (no server,
+no network). Reports ingest latency percentiles, error rates by kind, end-to-end
+latency and how far the generator itself fell behind its schedule.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from collections import Counter
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx
+from simulate_esp32 import read_ph, read_turbidity, read_water_level
+
+EMAIL, PASSWORD = "loadgen@example.com", "loadgen-password"
+REGISTER_CONCURRENCY = 20
+
+
+def percentile(values, p):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100))]
+
+
+def latency_summary(seconds):
+    ms = [s * 1000 for s in seconds]
+    return {"count": len(ms), **{f"p{p}_ms": round(percentile(ms, p), 2) if ms else None for p in (50, 95, 99)},
+            "max_ms": round(max(ms), 2) if ms else None}
+
+
+class Fleet:
+    def __init__(self, args):
+        self.args = args
+        self.devices = [
+            (f"{args.prefix}_DEV_{i:05d}", "aqi" if i % 5 == 0 else "water", f"{args.prefix}_LOC_{i % args.locations:04d}")
+            for i in range(args.devices)
+        ]
+        self.locations = sorted({loc for _, _, loc in self.devices})
+        self.ingest_latency = []
+        self.e2e_latency = []
+        self.schedule_lag = []
+        self.errors = Counter()
+        self.sent = 0
+        self.broadcasts = 0
+
+    def payload(self, device_id, dev_type):
+        if dev_type == "water":
+            data = {"ph": read_ph(), "turbidity": read_turbidity(), "level": read_water_level()}
+        else:
+            data = {"pm25": random.randint(5, 300), "pm10": random.randint(10, 400), "co": round(random.uniform(0, 5), 2),
+                    "no2": random.randint(0, 200), "o3": random.randint(0, 200), "so2": random.randint(0, 80)}
+        return {"device_id": device_id, "type": dev_type, "timestamp": datetime.utcnow().isoformat(), "data": data}
+
+    async def setup(self, client):
+        """User + devices. The first device of each location registers alone (it creates the location)."""
+        r = await client.post("/api/auth/register", json={"email": EMAIL, "password": PASSWORD, "full_name": "Load Generator"})
+        if r.status_code not in (200, 201, 400):
+            raise RuntimeError(f"register user: {r.status_code} {r.text[:200]}")
+        r = await client.post("/api/auth/login", data={"username": EMAIL, "password": PASSWORD})
+        if r.status_code != 200:
+            raise RuntimeError(f"login: {r.status_code} {r.text[:200]}")
+        self.token = r.json()["access_token"]
+        headers = {"Authorization": f"Bearer {self.token}"}
+
+        semaphore = asyncio.Semaphore(REGISTER_CONCURRENCY)
+        failures = Counter()
+
+        async def register(device_id, dev_type, location):
+            async with semaphore:
+                body = {"device_id": device_id, "device_type": "aqi_camera" if dev_type == "aqi" else "water_sensor",
+                        "location_id": location}
+                try:
+                    r = await client.post("/api/devices/register", json=body, headers=headers)
+                    if r.status_code != 200:
+                        failures[f"HTTP {r.status_code}"] += 1
+                except httpx.HTTPError as e:
+                    failures[type(e).__name__] += 1
+
+        start = time.perf_counter()
+        first = {}
+        for dev in self.devices:
+            first.setdefault(dev[2], dev)
+        await asyncio.gather(*[register(*dev) for dev in first.values()])
+        await asyncio.gather(*[register(*dev) for dev in self.devices if first[dev[2]] is not dev])
+        print(f"Registered {len(self.devices) - sum(failures.values())}/{len(self.devices)} devices in "
+              f"{len(self.locations)} locations ({time.perf_counter() - start:.1f}s)"
+              + (f", failures: {dict(failures)}" if failures else ""))
+
+    def on_message(self, text):
+        msg = json.loads(text)
+        sent_at = msg.get("timestamp")
+        if sent_at and msg.get("type") != "heartbeat":
+            self.broadcasts += 1
+            self.e2e_latency.append((datetime.utcnow() - datetime.fromisoformat(sent_at)).total_seconds())
+
+    async def device(self, client, device_id, dev_type, deadline):
+        interval = 1.0 / self.args.rate
+        # Spread the first readings over one interval so the fleet doesn't fire in lockstep
+        next_send = time.perf_counter() + random.uniform(0, interval)
+        while True:
+            delay = next_send - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            now = time.perf_counter()
+            if now >= deadline:
+                return
+            self.schedule_lag.append(now - next_send)
+            next_send += interval * random.uniform(1 - self.args.jitter, 1 + self.args.jitter)
+
+            payload = self.payload(device_id, dev_type)
+            start = time.perf_counter()
+            try:
+                r = await client.post("/api/ingest", json=payload)
+            except httpx.HTTPError as e:
+                self.errors[type(e).__name__] += 1
+                continue
+            finally:
+                self.sent += 1
+            self.ingest_latency.append(time.perf_counter() - start)
+            if r.status_code != 200:
+                self.errors[f"HTTP {r.status_code}"] += 1
+            elif r.json().get("status") != "success":
+                self.errors["status=error"] += 1
+
+    async def subscriber(self, location, ready, stop):
+        """One WebSocket client on a running server."""
+        import websockets
+        url = self.args.url.replace("http", "ws", 1).rstrip("/") + f"/ws/live/{location}?token={self.token}"
+        try:
+            async with websockets.connect(url, max_queue=None) as ws:
+                ready.append(location)
+                while not stop.is_set():
+                    try:
+                        self.on_message(await asyncio.wait_for(ws.recv(), timeout=0.5))
+                    except asyncio.TimeoutError:
+                        continue
+        except Exception as e:
+            self.errors[f"ws {type(e).__name__}"] += 1
+
+    async def run(self, client, attach_subscribers=None):
+        await self.setup(client)
+
+        stop = asyncio.Event()
+        subscribers = []
+        subscriber_locations = [self.locations[i % len(self.locations)] for i in range(self.args.subscribers)]
+        if attach_subscribers:
+            attach_subscribers(self, subscriber_locations)
+        elif subscriber_locations:
+            ready = []
+            subscribers = [asyncio.create_task(self.subscriber(loc, ready, stop)) for loc in subscriber_locations]
+            await asyncio.sleep(1.0)
+            print(f"{len(ready)}/{len(subscriber_locations)} WebSocket subscribers connected")
+
+        print(f"Driving {len(self.devices)} devices at {self.args.rate}/s each (+-{self.args.jitter:.0%} jitter) "
+              f"for {self.args.duration}s: ~{len(self.devices) * self.args.rate:.0f} readings/s")
+        start = time.perf_counter()
+        deadline = start + self.args.duration
+        await asyncio.gather(*[self.device(client, device_id, dev_type, deadline) for device_id, dev_type, _ in self.devices])
+        elapsed = time.perf_counter() - start
+        await asyncio.sleep(0.5)  # last broadcasts
+        stop.set()
+        await asyncio.gather(*subscribers)
+        return self.report(elapsed)
+
+    def report(self, elapsed):
+        errors = sum(self.errors.values())
+        return {
+            "devices": len(self.devices),
+            "locations": len(self.locations),
+            "rate_per_device": self.args.rate,
+            "duration_s": round(elapsed, 2),
+            "requests": self.sent,
+            "throughput_rps": round(self.sent / elapsed, 1),
+            "error_rate": round(errors / self.sent, 4) if self.sent else None,
+            "errors": dict(self.errors),
+            "ingest_latency": latency_summary(self.ingest_latency),
+            "subscribers": self.args.subscribers,
+            "broadcasts_received": self.broadcasts,
+            "e2e_latency": latency_summary(self.e2e_latency),
+            "schedule_lag": latency_summary(self.schedule_lag),
+        }
+
+
+def in_process_client():
+    """httpx client on main.app with a fresh SQLite database, plus a subscriber hook for the ConnectionManager."""
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'loadgen.db')}"
+    import main
+    from database import create_db_and_tables
+    create_db_and_tables()
+
+    class Subscriber:
+        def __init__(self, fleet):
+            self.fleet = fleet
+
+        async def send_text(self, text):
+            self.fleet.on_message(text)
+
+    def attach(fleet, locations):
+        for location in locations:
+            main.manager.active_connections.setdefault(location, []).append(Subscriber(fleet))
+
+    transport = httpx.ASGITransport(app=main.app)
+    return httpx.AsyncClient(transport=transport, base_url="http://loadgen", timeout=30), attach
+
+
+def print_report(report):
+    def fmt(summary):
+        if not summary["count"]:
+            return "no samples"
+        return (f"p50 {summary['p50_ms']:8.2f} ms  p95 {summary['p95_ms']:8.2f} ms  p99 {summary['p99_ms']:8.2f} ms  "
+                f"max {summary['max_ms']:8.2f} ms  (n={summary['count']})")
+
+    print(f"  requests     : {report['requests']} in {report['duration_s']}s ({report['throughput_rps']} req/s), "
+          f"error rate {report['error_rate']:.2%} {report['errors'] or ''}")
+    print(f"  ingest       : {fmt(report['ingest_latency'])}")
+    if report["subscribers"]:
+        print(f"  ingest->ws   : {fmt(report['e2e_latency'])}")
+    print(f"  schedule lag : {fmt(report['schedule_lag'])}")
+
+
+async def main_async(args):
+    if args.in_process:
+        client, attach = in_process_client()
+    else:
+        limits = httpx.Limits(max_connections=args.connections, max_keepalive_connections=args.connections)
+        client, attach = httpx.AsyncClient(base_url=args.url, timeout=args.timeout, limits=limits), None
+    async with client:
+        report = await Fleet(args).run(client, attach)
+    print_report(report)
+    if args.report:
+        with open(args.report, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Async device fleet load generator")
+    parser.add_argument("--url", default="http://localhost:8000", help="API base URL")
+    parser.add_argument("--in-process", action="store_true", help="run against main.app (ASGI) on a temporary database")
+    parser.add_argument("--devices", type=int, default=100)
+    parser.add_argument("--locations", type=int, default=10)
+    parser.add_argument("--rate", type=float, default=0.2, help="readings per second per device (0.2 = every 5s)")
+    parser.add_argument("--jitter", type=float, default=0.2, help="+- fraction of the interval")
+    parser.add_argument("--duration", type=float, default=60, help="seconds of ingest")
+    parser.add_argument("--subscribers", type=int, default=0, help="WebSocket subscribers")
+    parser.add_argument("--connections", type=int, default=500, help="max concurrent HTTP connections")
+    parser.add_argument("--timeout", type=float, default=8, help="request timeout (the ESP32 uses 8s)")
+    parser.add_argument("--prefix", default="LOAD", help="device / location id prefix")
+    parser.add_argument("--report", help="write the report as JSON here")
+    asyncio.run(main_async(parser.parse_args()))
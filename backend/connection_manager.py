@@ -1,3 +1,4 @@
+import json
 from fastapi import WebSocket
 from typing import List, Dict
 
@@ -5,6 +6,11 @@ class ConnectionManager:
     def __init__(self):
         # Map location_id -> List of WebSockets
         self.active_connections: Dict[str, List[WebSocket]] = {}
+        # Broadcast counters for /metrics
+        self.broadcasts = 0
+        self.sends = 0
+        self.send_failures = 0  # dropped frames (broken connections)
+        self.in_flight = 0      # broadcasts currently sending
 
     async def connect(self, websocket: WebSocket, location_id: str):
         await websocket.accept()
@@ -21,10 +27,28 @@ class ConnectionManager:
 
     async def broadcast(self, message: dict, location_id: str):
         if location_id in self.active_connections:
-            # Iterate over a copy to avoid modification issues during iteration (though unlikely async)
-            for connection in self.active_connections[location_id]:
-                try:
-                    await connection.send_json(message)
-                except Exception:
-                    # Handle broken connections if necessary
-                    pass
+            # Serialize once for all subscribers instead of per connection (send_json)
+            text = json.dumps(message)
+            self.broadcasts += 1
+            self.in_flight += 1
+            try:
+                # Iterate over a copy to avoid modification issues during iteration (though unlikely async)
+                for connection in self.active_connections[location_id]:
+                    try:
+                        await connection.send_text(text)
+                        self.sends += 1
+                    except Exception:
+                        # Handle broken connections if necessary
+                        self.send_failures += 1
+            finally:
+                self.in_flight -= 1
+
+    def metrics(self):
+        return {
+            "connections": sum(len(conns) for conns in self.active_connections.values()),
+            "locations": len(self.active_connections),
+            "broadcasts_in_flight": self.in_flight,
+            "broadcasts_total": self.broadcasts,
+            "sends_total": self.sends,
+            "send_failures_total": self.send_failures,
+        }
@@ -1,6 +1,13 @@
 from sqlmodel import SQLModel, create_engine, Session
+from sqlalchemy import event, text
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.pool import QueuePool
 
+import asyncio
 import os
+from contextlib import asynccontextmanager
+import threading
+import time
 
 # Default to SQLite for local, Use env var for Prod
 sqlite_url = os.getenv("DATABASE_URL", "sqlite:///env_cloud_v2.db")
@@ -9,12 +16,200 @@ sqlite_url = os.getenv("DATABASE_URL", "sqlite:///env_cloud_v2.db")
 if sqlite_url.startswith("postgres://"):
     sqlite_url = sqlite_url.replace("postgres://", "postgresql://", 1)
 
-connect_args = {"check_same_thread": False} if "sqlite" in sqlite_url else {}
-engine = create_engine(sqlite_url, echo=True, connect_args=connect_args)
+IS_SQLITE = sqlite_url.startswith("sqlite")
+
+# Engine settings (env driven). SQL echo is off unless DB_ECHO=1, logging every
+# statement to stdout is a throughput bottleneck in production.
+DB_ECHO = os.getenv("DB_ECHO", "0") == "1"
+
+def engine_options_from_env():
+    """Pool options for create_engine(): DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_POOL_TIMEOUT, DB_POOL_RECYCLE, DB_POOL_PRE_PING."""
+    return {
+        "pool_size": int(os.getenv("DB_POOL_SIZE", "5")),
+        "max_overflow": int(os.getenv("DB_MAX_OVERFLOW", "10")),
+        "pool_timeout": float(os.getenv("DB_POOL_TIMEOUT", "30")),
+        "pool_recycle": int(os.getenv("DB_POOL_RECYCLE", "1800")),
+        "pool_pre_ping": os.getenv("DB_POOL_PRE_PING", "1") == "1",
+    }
+
+class InstrumentedQueuePool(QueuePool):
+    """QueuePool that records how long checkouts wait for a free connection."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._stats_lock = threading.Lock()
+        self.checkouts = 0
+        self.checkout_timeouts = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        except Exception:
+            with self._stats_lock:
+                self.checkout_timeouts += 1
+            raise
+        finally:
+            waited = time.perf_counter() - start
+            with self._stats_lock:
+                self.checkouts += 1
+                self.wait_seconds_total += waited
+                self.wait_seconds_max = max(self.wait_seconds_max, waited)
+
+    def metrics(self):
+        capacity = self.size() + max(self._max_overflow, 0)
+        checked_out = self.checkedout()
+        return {
+            "pool_size": self.size(),
+            "max_overflow": self._max_overflow,
+            "checked_out": checked_out,
+            "overflow": self.overflow(),
+            "saturation": round(checked_out / capacity, 3) if capacity else None,
+            "checkouts": self.checkouts,
+            "checkout_timeouts": self.checkout_timeouts,
+            "checkout_wait_seconds_total": round(self.wait_seconds_total, 6),
+            "checkout_wait_seconds_max": round(self.wait_seconds_max, 6),
+        }
+
+# SQLite performance profile for small on-prem deployments (SQLITE_TUNED=0 restores plain defaults).
+# WAL lets readers run alongside the writer; NORMAL sync is durable across app crashes in WAL mode.
+SQLITE_PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "mmap_size": os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)),
+    "cache_size": os.getenv("SQLITE_CACHE_SIZE", "-65536"),  # negative = KiB, i.e. 64 MiB
+    "busy_timeout": os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"),
+    "temp_store": "MEMORY",
+}
+
+def apply_sqlite_pragmas(target_engine, pragmas=SQLITE_PRAGMAS):
+    """Runs the PRAGMAs on every new DBAPI connection of `target_engine`."""
+    @event.listens_for(target_engine, "connect")
+    def _set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+        cursor.close()
+
+def create_sqlite_engines(url, tuned=True, echo=False):
+    """
+    Returns (read_engine, write_engine) for a SQLite database.
+    Tuned: PRAGMAs applied on connect, readers use a connection pool and all writes
+    go through a single dedicated writer connection (pool of exactly one).
+    Untuned (or in-memory): one plain engine used for both.
+    """
+    connect_args = {"check_same_thread": False}
+    if ":memory:" in url:
+        read_engine = create_engine(url, echo=echo, connect_args=connect_args)
+        return read_engine, read_engine
+
+    pool_options = engine_options_from_env()
+    read_engine = create_engine(url, echo=echo, connect_args=connect_args, poolclass=InstrumentedQueuePool,
+                                pool_size=pool_options["pool_size"], max_overflow=pool_options["max_overflow"],
+                                pool_timeout=pool_options["pool_timeout"])
+    if not tuned:
+        return read_engine, read_engine
+
+    apply_sqlite_pragmas(read_engine)
+    write_engine = create_engine(url, echo=echo, connect_args=connect_args, poolclass=InstrumentedQueuePool,
+                                 pool_size=1, max_overflow=0, pool_timeout=pool_options["pool_timeout"])
+    apply_sqlite_pragmas(write_engine)
+    return read_engine, write_engine
+
+def create_server_engine(url, echo=False):
+    """
+    Engine for Postgres (or any server database) configured from the environment.
+    DB_STATEMENT_TIMEOUT_MS sets a per-statement timeout on every connection (Postgres).
+    """
+    connect_args = {}
+    statement_timeout = os.getenv("DB_STATEMENT_TIMEOUT_MS")
+    if statement_timeout and url.startswith("postgresql"):
+        connect_args["options"] = f"-c statement_timeout={int(statement_timeout)}"
+    return create_engine(url, echo=echo, connect_args=connect_args, poolclass=InstrumentedQueuePool,
+                         **engine_options_from_env())
+
+if IS_SQLITE:
+    engine, write_engine = create_sqlite_engines(
+        sqlite_url, tuned=os.getenv("SQLITE_TUNED", "1") != "0", echo=DB_ECHO
+    )
+else:
+    engine = create_server_engine(sqlite_url, echo=DB_ECHO)
+    write_engine = engine
+
+def pool_metrics():
+    """Checkout wait time and saturation for the read pool (and the SQLite writer pool, if separate)."""
+    pools = {"read": engine.pool}
+    if write_engine is not engine:
+        pools["write"] = write_engine.pool
+    return {name: pool.metrics() for name, pool in pools.items() if isinstance(pool, InstrumentedQueuePool)}
+
+# Serializes write sessions on the single SQLite writer connection without blocking the event loop
+# (waiting requests await the lock instead of blocking inside a pool checkout)
+_write_lock = asyncio.Lock() if write_engine is not engine else None
 
 def create_db_and_tables():
-    SQLModel.metadata.create_all(engine)
+    from partitions import measurement_partitions
+    if not measurement_partitions.enabled:
+        SQLModel.metadata.create_all(write_engine)
+        ensure_measurement_dedup_index()
+        ensure_measurement_lookup_indexes()
+        return
+
+    # Partitioned: `measurement` is created (or migrated) by the partition manager
+    tables = [t for t in SQLModel.metadata.sorted_tables if t.name != "measurement"]
+    SQLModel.metadata.create_all(write_engine, tables=tables)
+    measurement_partitions.setup(write_engine)
+
+def ensure_measurement_dedup_index():
+    """
+    create_all() doesn't add indexes to tables that already exist, so databases
+    created before the (device_id, type, timestamp) idempotency key get it here.
+    Duplicate rows left by earlier device retries are removed first (oldest row kept).
+    """
+    from models import Measurement
+    index = next(i for i in Measurement.__table__.indexes if i.name == "uq_measurement_device_type_ts")
+    try:
+        index.create(write_engine, checkfirst=True)
+    except IntegrityError:
+        with write_engine.begin() as conn:
+            removed = conn.execute(text(
+                "DELETE FROM measurement WHERE id NOT IN "
+                "(SELECT MIN(id) FROM measurement GROUP BY device_id, type, timestamp)"
+            )).rowcount
+        print(f"[DB] Removed {removed} duplicate measurement rows")
+        index.create(write_engine, checkfirst=True)
+
+def ensure_measurement_lookup_indexes():
+    """Adds the non-unique Measurement indexes to tables created before they were declared."""
+    from models import Measurement
+    for index in Measurement.__table__.indexes:
+        if not index.unique:
+            index.create(write_engine, checkfirst=True)
 
 def get_session():
     with Session(engine) as session:
         yield session
+
+@asynccontextmanager
+async def write_session_scope():
+    """
+    Session for code that writes. On tuned SQLite it is bound to the dedicated
+    writer connection; attributes aren't expired on commit so responses can be built
+    without going back to the database. Keep slow non-DB work (password hashing,
+    network calls) outside the scope, it holds the writer for its whole duration.
+    """
+    if _write_lock is None:
+        with Session(write_engine, expire_on_commit=False) as session:
+            yield session
+        return
+
+    async with _write_lock:
+        with Session(write_engine, expire_on_commit=False) as session:
+            yield session
+
+async def get_write_session():
+    """FastAPI dependency version of write_session_scope()."""
+    async with write_session_scope() as session:
+        yield session
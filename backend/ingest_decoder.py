@@ -0,0 +1,126 @@
+import json
+import math
+from typing import Any, Dict, List, Optional, Tuple
+
+# Known keys of `data`: numeric readings (stored, null = not read this time) and
+# string flags (broadcast only, e.g. the pump monitor's status="MID"). Any other key is
+# ignored, not rejected: a firmware that adds a sensor must not lose its known readings.
+READING_KEYS = frozenset({"pm25", "pm10", "co", "no2", "o3", "so2", "ph", "tds", "turbidity", "level", "irms"})
+FLAG_KEYS = frozenset({"status", "pump_status"})
+
+
+class IngestDecodeError(ValueError):
+    """Raised when an ingest body does not match the expected payload shape."""
+
+
+class IngestRecord:
+    """
+    Parsed /api/ingest body.
+    `message` is the WebSocket broadcast, built from the validated fields only (other
+    keys a client sends never reach subscribers), `readings` holds the numeric
+    (type, value) pairs that get persisted and `ignored` the unknown `data` keys.
+    """
+    __slots__ = ("device_id", "type", "timestamp", "data", "readings", "message", "ignored")
+
+    def __init__(self, device_id: str, type: str, timestamp: Optional[str],
+                 data: Dict[str, Any], readings: List[Tuple[str, float]], message: Dict[str, Any],
+                 ignored: Optional[List[str]] = None):
+        self.device_id = device_id
+        self.type = type
+        self.timestamp = timestamp
+        self.data = data
+        self.readings = readings
+        self.message = message
+        self.ignored = ignored or []
+
+
+def _is_number(val: Any) -> bool:
+    # bool is a subclass of int, but it's a flag, not a reading; json accepts NaN/Infinity
+    return not isinstance(val, bool) and isinstance(val, (int, float)) and math.isfinite(val)
+
+
+def decode_ingest_object(obj: Any) -> IngestRecord:
+    """
+    Validates an already-parsed ingest object in a single pass.
+    Same contract as IngestPayload: device_id/type are required strings, timestamp
+    is an optional string and data is an object whose keys are READING_KEYS (finite
+    number or null) or FLAG_KEYS (string or null). Flags and nulls are broadcast but
+    not returned as readings; unknown keys are dropped and listed in `ignored`.
+    An optional `confidence` object (reading key -> number, sent by the OCR service)
+    is broadcast, not stored.
+    """
+    if not isinstance(obj, dict):
+        raise IngestDecodeError("Body must be a JSON object")
+
+    device_id = obj.get("device_id")
+    if not isinstance(device_id, str):
+        raise IngestDecodeError("device_id: field required (string)")
+
+    dev_type = obj.get("type")
+    if not isinstance(dev_type, str):
+        raise IngestDecodeError("type: field required (string)")
+
+    timestamp = obj.get("timestamp")
+    if timestamp is not None and not isinstance(timestamp, str):
+        raise IngestDecodeError("timestamp: must be a string")
+
+    data = obj.get("data")
+    if not isinstance(data, dict):
+        raise IngestDecodeError("data: field required (object)")
+
+    readings = []
+    ignored = []
+    for key, val in data.items():
+        if key in READING_KEYS:
+            if val is None:
+                continue
+            if not _is_number(val):
+                raise IngestDecodeError(f"data.{key}: must be a number")
+            readings.append((key, float(val)))
+        elif key in FLAG_KEYS:
+            if val is not None and not isinstance(val, str):
+                raise IngestDecodeError(f"data.{key}: must be a string")
+        else:
+            ignored.append(key)
+    if ignored:
+        data = {key: val for key, val in data.items() if key in READING_KEYS or key in FLAG_KEYS}
+
+    message = {"device_id": device_id, "type": dev_type, "timestamp": timestamp, "data": data}
+    confidence = obj.get("confidence")
+    if isinstance(confidence, dict):
+        message["confidence"] = {key: val for key, val in confidence.items() if key in READING_KEYS and _is_number(val)}
+    return IngestRecord(device_id, dev_type, timestamp, data, readings, message, ignored)
+
+
+def decode_ingest(body: bytes) -> IngestRecord:
+    """Parses and validates a raw /api/ingest request body."""
+    try:
+        obj = json.loads(body)
+    except ValueError as e:
+        raise IngestDecodeError(f"Invalid JSON: {e}")
+    return decode_ingest_object(obj)
+
+
+def decode_ingest_batch(body: bytes, max_records: int = 1000) -> List[IngestRecord]:
+    """
+    Parses a /api/ingest/batch body: {"records": [<ingest object>, ...]} (a bare JSON
+    array is accepted too). Every record is validated like a single ingest body;
+    the first invalid one rejects the whole batch, naming its index.
+    """
+    try:
+        obj = json.loads(body)
+    except ValueError as e:
+        raise IngestDecodeError(f"Invalid JSON: {e}")
+    records = obj.get("records") if isinstance(obj, dict) else obj
+    if not isinstance(records, list):
+        raise IngestDecodeError("records: field required (array)")
+    if len(records) > max_records:
+        raise IngestDecodeError(f"records: at most {max_records} per batch")
+
+    decoded = []
+    for i, record in enumerate(records):
+        try:
+            decoded.append(decode_ingest_object(record))
+        except IngestDecodeError as e:
+            raise IngestDecodeError(f"records[{i}].{e}")
+    return decoded
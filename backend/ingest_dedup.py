@@ -0,0 +1,73 @@
+import hashlib
+import json
+import os
+import time
+from datetime import datetime
+from typing import Any, Dict, Optional, Tuple
+
+
+class ArrivalStamps:
+    """
+    Server-side timestamps for ingest records sent without one, stable across retries.
+    Ingest dedup is the unique (device_id, type, timestamp) index, so a retry is only
+    recognised if it carries the same timestamp as the first attempt. For records
+    without a timestamp the first arrival time is remembered and reused:
+      - keyed by the device's Idempotency-Key header, for `key_ttl` seconds;
+      - otherwise keyed by a hash of (device_id, type, data), for `window` seconds
+        from the first arrival. An identical reading sent again inside the window is
+        stored once (same values; only the sample rate drops).
+    In-memory and per process, like DeviceRateLimiter: with several workers a retry
+    that lands on another worker is not recognised. Expired entries are evicted by a
+    sweep that runs at most every `sweep_interval` seconds.
+    Not thread-safe: meant to be called from the event loop (async endpoints).
+    """
+
+    def __init__(self, window: float = 10.0, key_ttl: float = 3600.0,
+                 sweep_interval: float = 60.0, clock=time.monotonic):
+        self.window = window
+        self.key_ttl = key_ttl
+        self.sweep_interval = sweep_interval
+        self.clock = clock
+        self.entries: Dict[str, Tuple[float, datetime]] = {}  # key -> (expires at, stamp)
+        self._last_sweep = clock()
+
+    def stamp(self, device_id: str, dev_type: str, data: Dict[str, Any],
+              idempotency_key: Optional[str] = None) -> datetime:
+        """Arrival timestamp for a record without one (the first attempt's, for a retry)."""
+        now = self.clock()
+        if now - self._last_sweep >= self.sweep_interval:
+            self.sweep(now)
+
+        if idempotency_key:
+            key, ttl = f"key:{device_id}:{idempotency_key}", self.key_ttl
+        elif self.window > 0:
+            body = json.dumps([device_id, dev_type, data], sort_keys=True, separators=(",", ":"))
+            key, ttl = "body:" + hashlib.sha1(body.encode()).hexdigest(), self.window
+        else:
+            return datetime.utcnow()
+
+        entry = self.entries.get(key)
+        if entry is not None and entry[0] > now:
+            return entry[1]
+        stamp = datetime.utcnow()
+        self.entries[key] = (now + ttl, stamp)
+        return stamp
+
+    def sweep(self, now: Optional[float] = None):
+        now = self.clock() if now is None else now
+        expired = [key for key, (expires_at, _) in self.entries.items() if expires_at <= now]
+        for key in expired:
+            del self.entries[key]
+        self._last_sweep = now
+
+
+def arrival_stamps_from_env() -> ArrivalStamps:
+    """
+    INGEST_DEDUP_WINDOW: seconds an identical timestamp-less reading counts as a retry
+    (0 turns the body-hash check off). INGEST_IDEMPOTENCY_TTL: seconds an
+    Idempotency-Key is remembered.
+    """
+    return ArrivalStamps(
+        window=float(os.getenv("INGEST_DEDUP_WINDOW", "10")),
+        key_ttl=float(os.getenv("INGEST_IDEMPOTENCY_TTL", "3600")),
+    )
@@ -1,13 +1,20 @@
-from fastapi import FastAPI, HTTPException, Depends, WebSocket, WebSocketDisconnect
+from fastapi import FastAPI, HTTPException, Depends, Header, Request, Response, WebSocket, WebSocketDisconnect
+import hashlib
+import json
 import os
 from fastapi.middleware.cors import CORSMiddleware
 from sqlmodel import Session, select, desc, func
 from datetime import datetime
-from database import create_db_and_tables, get_session
+from database import create_db_and_tables, get_session, get_write_session, pool_metrics, write_session_scope
 from models import Location, Device, Measurement, User
 from pydantic import BaseModel
-from typing import Dict, Any, Optional
+from typing import Dict, Any, List, Optional
 from connection_manager import ConnectionManager
+from ingest_decoder import decode_ingest, decode_ingest_batch, IngestDecodeError, IngestRecord
+from ingest_dedup import arrival_stamps_from_env
+from measurement_writer import insert_measurements
+from rate_limit import limiter_from_env, retry_after_header
+import metrics
 
 app = FastAPI(title="Environmental Cloud API")
 
@@ -19,6 +26,12 @@ def on_startup():
 # Initialize WebSocket Manager
 manager = ConnectionManager()
 
+# Per-device ingest rate limiting (None when INGEST_RATE_LIMIT=0)
+ingest_limiter = limiter_from_env()
+
+# Retry-stable arrival timestamps for readings sent without one (see ingest_dedup)
+arrival_stamps = arrival_stamps_from_env()
+
 # Import Auth
 import auth
 
@@ -34,8 +47,21 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Total-Count"],  # /api/devices paging
 )
 
+# Request latency / DB query instrumentation, scraped from /metrics (METRICS_ENABLED=0 turns it off)
+if metrics.METRICS_ENABLED:
+    app.add_middleware(metrics.RequestMetricsMiddleware)
+    metrics.register_collector("db_pool", "Database connection pool state (see pool_metrics)",
+                               lambda: {(("pool", name),): values for name, values in pool_metrics().items()})
+    metrics.register_collector("password_hasher", "Password hashing thread pool",
+                               lambda: {(): auth.password_hasher.metrics()})
+    metrics.register_collector("websocket", "Live WebSocket subscribers and broadcasts", lambda: {(): manager.metrics()})
+    metrics.register_collector("websocket_location", "Live WebSocket subscribers per location",
+                               lambda: {(("location", loc),): {"connections": len(conns)}
+                                        for loc, conns in list(manager.active_connections.items())})
+
 # Pydantic Model for Ingestion
 # Pydantic Model for Registration
 class LocationInput(BaseModel):
@@ -52,7 +78,7 @@ class RegisterDevicePayload(BaseModel):
     location_input: Optional[LocationInput] = None
     location_id: Optional[str] = None # Allow manual ID if needed (backward compat)
 
-# Pydantic Model for Ingestion
+# Pydantic Model for Ingestion (documentation schema; /api/ingest decodes via ingest_decoder)
 # NOTE: data can contain both numeric readings and string flags (e.g. status="MID")
 class IngestPayload(BaseModel):
     device_id: str
@@ -60,6 +86,12 @@ class IngestPayload(BaseModel):
     timestamp: Optional[str] = None
     data: Dict[str, Any]
 
+# Batched ingest (offline spool replay from edge devices)
+INGEST_BATCH_MAX = int(os.getenv("INGEST_BATCH_MAX", "1000"))
+
+class IngestBatchPayload(BaseModel):
+    records: List[IngestPayload]
+
 @app.on_event("startup")
 def on_startup():
     create_db_and_tables()
@@ -68,11 +100,22 @@ def on_startup():
 def health_check():
     return {"status": "ok"}
 
+@app.get("/api/health/db")
+def db_health():
+    # Connection pool checkout wait time / saturation, for sizing workers and DB_POOL_SIZE
+    return {"status": "ok", "pools": pool_metrics()}
+
+@app.get("/metrics", include_in_schema=False)
+def prometheus_metrics():
+    if not metrics.METRICS_ENABLED:
+        raise HTTPException(status_code=404, detail="Not Found")
+    return Response(metrics.render(), media_type=metrics.CONTENT_TYPE)
+
 @app.post("/api/devices/register")
 async def register_device(
     payload: RegisterDevicePayload, 
     current_user: User = Depends(auth.get_current_user), # Secure Endpoint
-    session: Session = Depends(get_session)
+    session: Session = Depends(get_write_session)
 ):
     try:
         # 1. Validate Device ID (Check if already owned by ANOTHER user)
@@ -197,53 +240,110 @@ async def register_device(
         print(f"Registration Error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
-@app.post("/api/ingest")
-async def ingest_data(payload: IngestPayload, session: Session = Depends(get_session)):
+def parse_ingest_timestamp(record: IngestRecord, idempotency_key: Optional[str] = None) -> datetime:
+    # Accept ISO format from script, fall back to arrival time (the first attempt's for
+    # a retry, so it still hits the dedup index)
+    if record.timestamp:
+        try:
+            return datetime.fromisoformat(record.timestamp)
+        except ValueError:
+            pass
+    return arrival_stamps.stamp(record.device_id, record.type, record.data, idempotency_key)
+
+# (device_id, key) pairs already logged: a firmware sending a new field with every
+# reading is reported once per process, not on every request
+_ignored_metrics_logged = set()
+
+def log_ignored_metrics(record: IngestRecord):
+    """Reports `data` keys the decoder dropped (not in ingest_decoder.READING_KEYS/FLAG_KEYS)."""
+    for key in record.ignored:
+        if (record.device_id, key) not in _ignored_metrics_logged:
+            _ignored_metrics_logged.add((record.device_id, key))
+            print(f"⚠️ INGEST: {record.device_id} sent unknown metric '{key}', ignored")
+
+async def read_ingest_payload(request: Request) -> IngestRecord:
+    """
+    Decodes the ingest body and applies the per-device rate limit.
+    Runs as the first dependency so throttled requests never open a (write) session.
+    """
     try:
-        # 1. Lookup Device & Location (Source of Truth)
-        dev = session.get(Device, payload.device_id)
-        if not dev:
-             # Reject unregistered devices
-             raise HTTPException(status_code=400, detail=f"Device {payload.device_id} not registered. Call /api/devices/register first.")
-        
-        # Get mapped Location
-        loc = session.get(Location, dev.location_id)
-        if not loc:
-             raise HTTPException(status_code=500, detail="Device mapped to invalid location.")
-
-        # 3. Store Measurements
-        ts = datetime.utcnow()
-        if payload.timestamp:
-            try:
-                # Accept ISO format from script
-                ts = datetime.fromisoformat(payload.timestamp)
-            except:
-                pass
-
-        for key, val in payload.data.items():
-            # Only persist numeric readings; ignore flags like "status"
-            if not isinstance(val, (int, float)):
-                continue
-            meas = Measurement(
-                location_id=loc.id,
-                device_id=payload.device_id,
-                type=key,
-                value=val,
-                timestamp=ts
-            )
-            session.add(meas)
+        payload = decode_ingest(await request.body())
+    except IngestDecodeError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+
+    # Throttle misbehaving devices before any DB work
+    if ingest_limiter:
+        delay = ingest_limiter.acquire(payload.device_id, payload.type)
+        if delay:
+            raise HTTPException(status_code=429, detail="Ingest rate limit exceeded for this device", headers=retry_after_header(delay))
+    return payload
+
+@app.post(
+    "/api/ingest",
+    # Body is decoded by ingest_decoder (one pass, no model construction);
+    # keep the IngestPayload schema in the OpenAPI docs.
+    openapi_extra={"requestBody": {"required": True, "content": {"application/json": {"schema": IngestPayload.schema()}}}},
+)
+async def ingest_data(
+    payload: IngestRecord = Depends(read_ingest_payload),
+    idempotency_key: Optional[str] = Header(None, max_length=200),
+):
+    """
+    Stores one reading. Retries are deduplicated on (device_id, type, timestamp), so
+    devices should send the time the reading was taken in `timestamp` and resend the
+    same payload on failure. Without a timestamp the server stamps the arrival time:
+    a retry then counts as one only if it carries the same Idempotency-Key header
+    (within INGEST_IDEMPOTENCY_TTL) or the same data within INGEST_DEDUP_WINDOW
+    seconds of the first attempt, on the same server process.
+    Unknown `data` keys are dropped (logged, listed as ignored_metrics in the
+    response) and the known readings stored; only malformed known fields are a 422.
+    """
+    try:
+        # The writer scope (on SQLite, the process-wide writer lock) ends before the
+        # broadcasts: a slow WebSocket client must not stall every other write
+        async with write_session_scope() as session:
+            # 1. Lookup Device & Location (Source of Truth)
+            dev = session.get(Device, payload.device_id)
+            if not dev:
+                 # Reject unregistered devices (422: retrying won't help, uploaders drop it)
+                 raise HTTPException(status_code=422, detail=f"Device {payload.device_id} not registered. Call /api/devices/register first.")
         
-        session.commit()
+            # Get mapped Location
+            loc = session.get(Location, dev.location_id)
+            if not loc:
+                 raise HTTPException(status_code=500, detail="Device mapped to invalid location.")
+
+            # 3. Store Measurements
+            ts = parse_ingest_timestamp(payload, idempotency_key)
+
+            # Only numeric readings were kept by the decoder; flags like "status" are broadcast only
+            rows = [
+                {"location_id": loc.id, "device_id": payload.device_id, "type": key, "value": val, "timestamp": ts}
+                for key, val in payload.readings
+            ]
+            # Retries of an already stored reading (same device/type/timestamp) are skipped, not duplicated
+            inserted = insert_measurements(session, rows)
+            duplicates = len(rows) - inserted
+            session.commit()
+        metrics.INGEST_RECORDS.inc(("ingest",))
+        metrics.INGEST_ROWS.inc(("ingest",), inserted)
+        metrics.INGEST_DUPLICATES.inc(("ingest",), duplicates)
+        if payload.ignored:
+            metrics.INGEST_IGNORED.inc(("ingest",), len(payload.ignored))
+            log_ignored_metrics(payload)
 
         # 4. Broadcast Real-Time Data (Using Resolved Location)
-        ws_message = payload.dict()
-        if not ws_message.get("timestamp"):
-             ws_message["timestamp"] = ts.isoformat()
-        
-        # IMPORTANT: Add resolved location_id to message for frontend context
-        ws_message["location_id"] = loc.name 
+        # Skip re-broadcasting a pure retry, the dashboard already has these points
+        if inserted or not rows:
+            # The decoded body is reused as-is for the message, no model -> dict round trip
+            ws_message = payload.message
+            if not ws_message.get("timestamp"):
+                 ws_message["timestamp"] = ts.isoformat()
+            
+            # IMPORTANT: Add resolved location_id to message for frontend context
+            ws_message["location_id"] = loc.name 
 
-        await manager.broadcast(ws_message, loc.name)
+            await manager.broadcast(ws_message, loc.name)
         
         # EXACT FIX: Emit explicit heartbeat
         await manager.broadcast({
@@ -254,16 +354,120 @@ async def ingest_data(payload: IngestPayload, session: Session = Depends(get_ses
             "status": "online"
         }, loc.name)
         
-        return {"status": "success", "rows": len(payload.data), "resolved_location": loc.name}
+        result = {"status": "success", "rows": inserted, "duplicates": duplicates, "resolved_location": loc.name}
+        if payload.ignored:
+            result["ignored_metrics"] = payload.ignored
+        return result
 
+    except HTTPException:
+        raise
     except Exception as e:
         import traceback
         traceback.print_exc()
         print(f"❌ INGEST ERROR: {e}")
         return {"status": "error", "message": str(e)}
 
+async def read_ingest_batch(request: Request) -> List[IngestRecord]:
+    """Decodes a batch body; the rate limit is charged once per device per batch."""
+    try:
+        records = decode_ingest_batch(await request.body(), INGEST_BATCH_MAX)
+    except IngestDecodeError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+
+    # A replayed backlog is one upload, not a burst of live readings
+    if ingest_limiter:
+        for device_id, dev_type in {(r.device_id, r.type) for r in records}:
+            delay = ingest_limiter.acquire(device_id, dev_type)
+            if delay:
+                raise HTTPException(status_code=429, detail=f"Ingest rate limit exceeded for {device_id}", headers=retry_after_header(delay))
+    return records
+
+@app.post(
+    "/api/ingest/batch",
+    openapi_extra={"requestBody": {"required": True, "content": {"application/json": {"schema": IngestBatchPayload.schema()}}}},
+)
+async def ingest_batch(records: List[IngestRecord] = Depends(read_ingest_batch)):
+    """
+    Stores many ingest records in one transaction (same dedup as /api/ingest, so
+    replaying a spool twice is harmless). Records of unregistered devices are
+    skipped and listed in the response; a batch with no registered device at all
+    is a 422. Unknown `data` keys are dropped like in /api/ingest (ignored_metrics).
+    Only the newest record per device is broadcast, the dashboard shows current values.
+    """
+    try:
+        # Broadcast only after the writer scope is released (see ingest_data)
+        async with write_session_scope() as session:
+            device_ids = {r.device_id for r in records}
+            resolved = {
+                dev.device_id: loc
+                for dev, loc in session.exec(
+                    select(Device, Location).join(Location, Location.id == Device.location_id).where(Device.device_id.in_(device_ids))
+                ).all()
+            }
+            if device_ids and not resolved:
+                raise HTTPException(status_code=422, detail=f"Devices not registered: {', '.join(sorted(device_ids))}")
+
+            rows = []
+            newest = {}
+            for record in records:
+                loc = resolved.get(record.device_id)
+                if loc is None:
+                    continue
+                ts = parse_ingest_timestamp(record)
+                rows.extend(
+                    {"location_id": loc.id, "device_id": record.device_id, "type": key, "value": val, "timestamp": ts}
+                    for key, val in record.readings
+                )
+                if record.device_id not in newest or ts >= newest[record.device_id][0]:
+                    newest[record.device_id] = (ts, record)
+
+            inserted = insert_measurements(session, rows)
+            session.commit()
+        metrics.INGEST_RECORDS.inc(("batch",), len(records))
+        metrics.INGEST_ROWS.inc(("batch",), inserted)
+        metrics.INGEST_DUPLICATES.inc(("batch",), len(rows) - inserted)
+        ignored = set()
+        for record in records:
+            if record.ignored:
+                metrics.INGEST_IGNORED.inc(("batch",), len(record.ignored))
+                log_ignored_metrics(record)
+                ignored.update(record.ignored)
+
+        if inserted:
+            for device_id, (ts, record) in newest.items():
+                loc = resolved[device_id]
+                ws_message = record.message
+                if not ws_message.get("timestamp"):
+                    ws_message["timestamp"] = ts.isoformat()
+                ws_message["location_id"] = loc.name
+                await manager.broadcast(ws_message, loc.name)
+        for device_id in newest:
+            await manager.broadcast({
+                "type": "heartbeat",
+                "device_id": device_id,
+                "location_id": resolved[device_id].name,
+                "timestamp": datetime.utcnow().isoformat(),
+                "status": "online"
+            }, resolved[device_id].name)
+
+        return {
+            "status": "success",
+            "records": len(records),
+            "rows": inserted,
+            "duplicates": len(rows) - inserted,
+            "unknown_devices": sorted(device_ids - resolved.keys()),
+            "ignored_metrics": sorted(ignored),
+        }
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        import traceback
+        traceback.print_exc()
+        print(f"❌ BATCH INGEST ERROR: {e}")
+        return {"status": "error", "message": str(e)}
+
 from fastapi import Query, status
-from jose import JWTError, jwt
 from models import User
 
 @app.websocket("/ws/live/{location_id}")
@@ -273,15 +477,9 @@ async def websocket_endpoint(websocket: WebSocket, location_id: str, token: Opti
         await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
         return
     
-    try:
-        payload = jwt.decode(token, auth.SECRET_KEY, algorithms=[auth.ALGORITHM])
-        user_email: str = payload.get("sub")
-        if user_email is None:
-            print("❌ WS: Invalid token payload")
-            await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
-            return
-    except JWTError:
-        print("❌ WS: Token decode error")
+    # Same verified-token cache as the HTTP dependency (auth.get_current_user)
+    if auth.authenticate_token(token) is None:
+        print("❌ WS: Invalid token")
         await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
         return
 
@@ -321,40 +519,53 @@ async def get_system_status(
     }
 
 
+def json_with_etag(request: Request, payload) -> Response:
+    """
+    JSON response with an ETag hashed from the body. A poll whose If-None-Match
+    carries it gets 304 without a body (the browser cache revalidates on its own).
+    """
+    body = json.dumps(payload, separators=(",", ":")).encode()
+    etag = f'"{hashlib.sha1(body).hexdigest()}"'
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache", "Vary": "Authorization"}
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match:
+        tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+        if etag in tags or "*" in tags:
+            return Response(status_code=304, headers=headers)
+    return Response(body, media_type="application/json", headers=headers)
+
 @app.get("/api/locations/status")
 async def get_locations_status(
+    request: Request,
     current_user: User = Depends(auth.get_current_user),
     session: Session = Depends(get_session)
 ):
-    # Filter locations by current user for strict privacy
-    locs = session.exec(select(Location).where(Location.owner_id == current_user.id)).all()
+    # Filter locations by current user for strict privacy. One query: each location's
+    # latest reading is a correlated (location_id, timestamp) index seek.
+    last_seen = (select(Measurement.timestamp)
+                 .where(Measurement.location_id == Location.id)
+                 .order_by(Measurement.timestamp.desc()).limit(1)
+                 .correlate(Location).scalar_subquery())
+    rows = session.exec(select(Location, last_seen.label("last_seen"))
+                        .where(Location.owner_id == current_user.id).order_by(Location.id)).all()
+
+    now = datetime.utcnow()
     results = []
-    
-    for loc in locs:
-        # Check if ANY device in location has recent data (< 30s)
-        last_m = session.exec(select(Measurement).where(Measurement.location_id == loc.id).order_by(Measurement.timestamp.desc()).limit(1)).first()
-        
-        is_online = False
-        last_seen = None
-        if last_m:
-            last_seen = last_m.timestamp
-            diff = (datetime.utcnow() - last_m.timestamp).total_seconds()
-            # Debug Log
-            # print(f"🔍 Status Check [{loc.name}]: DB_TS={last_m.timestamp}, NOW={datetime.utcnow()}, Diff={diff}s")
-            
-            if diff < 45: # Relaxed from 30s to 45s for jitter
-                is_online = True
-        
+    for loc, last_seen_ts in rows:
+        # Any device in the location with recent data; 45s rather than 30s for jitter
+        is_online = last_seen_ts is not None and (now - last_seen_ts).total_seconds() < 45
         results.append({
             "location_id": loc.name,
             "name": loc.display_name or loc.name,
             "latitude": loc.latitude,
             "longitude": loc.longitude,
             "online": is_online,
-            "last_seen": last_seen.isoformat() if last_seen else None
+            "last_seen": last_seen_ts.isoformat() if last_seen_ts else None
         })
-        
-    return results
+
+    # The body only changes with new readings or when a location goes offline, so
+    # most dashboard polls end in a 304
+    return json_with_etag(request, results)
 
 @app.get("/api/location/{location_id}/capabilities")
 async def get_location_capabilities(location_id: str, session: Session = Depends(get_session)):
@@ -363,24 +574,49 @@ async def get_location_capabilities(location_id: str, session: Session = Depends
     return {"has_aqi": True, "has_water": True}
 
 @app.get("/api/devices")
-async def get_my_devices(current_user: User = Depends(auth.get_current_user), session: Session = Depends(get_session)):
-    # Return all devices owned by user, joined with location info
-    statement = select(Device, Location).where(Device.owner_id == current_user.id).outerjoin(Location, Device.location_id == Location.id)
+async def get_my_devices(
+    response: Response,
+    device_type: Optional[str] = Query(None, alias="type"),
+    location_id: Optional[str] = None,
+    limit: Optional[int] = Query(None, ge=1, le=1000),
+    offset: int = Query(0, ge=0),
+    current_user: User = Depends(auth.get_current_user),
+    session: Session = Depends(get_session)
+):
+    # Devices owned by user with location info and last_seen, in one query: the latest
+    # reading is a correlated subquery answered by a (device_id, timestamp) index seek
+    # (ORDER BY ... LIMIT 1 rather than max() so SQLite pushes it into partition tables).
+    # Optional filters (?type=water_sensor, ?location_id=<location name>) and paging
+    # (?limit=&offset=, total in X-Total-Count) for large fleets.
+    filters = [Device.owner_id == current_user.id]
+    if device_type:
+        filters.append(Device.type == device_type)
+    if location_id:
+        filters.append(Location.name == location_id)
+
+    last_seen = (select(Measurement.timestamp)
+                 .where(Measurement.device_id == Device.device_id)
+                 .order_by(Measurement.timestamp.desc()).limit(1)
+                 .correlate(Device).scalar_subquery())
+    statement = (select(Device, Location, last_seen.label("last_seen"))
+                 .outerjoin(Location, Device.location_id == Location.id)
+                 .where(*filters)
+                 .order_by(Device.device_id)
+                 .offset(offset).limit(limit))
     results = session.exec(statement).all()
-    
+
+    if limit is None and offset == 0:
+        total = len(results)
+    else:
+        total = session.exec(select(func.count()).select_from(Device)
+                             .outerjoin(Location, Device.location_id == Location.id).where(*filters)).one()
+    response.headers["X-Total-Count"] = str(total)
+
+    now = datetime.utcnow()
     data = []
-    for dev, loc in results:
-        # Check last measurement for this device
-        last_m = session.exec(select(Measurement).where(Measurement.device_id == dev.device_id).order_by(Measurement.timestamp.desc()).limit(1)).first()
-        is_online = False
-        last_seen_ts = None
-        
-        if last_m:
-             last_seen_ts = last_m.timestamp
-             # 30s threshold
-             if (datetime.utcnow() - last_m.timestamp).total_seconds() < 30:
-                 is_online = True
-                 
+    for dev, loc, last_seen_ts in results:
+        # 30s threshold
+        is_online = last_seen_ts is not None and (now - last_seen_ts).total_seconds() < 30
         data.append({
             "device_id": dev.device_id,
             "type": dev.type,
@@ -392,7 +628,7 @@ async def get_my_devices(current_user: User = Depends(auth.get_current_user), se
     return data
 
 @app.delete("/api/devices/{device_id}")
-async def delete_device(device_id: str, current_user: User = Depends(auth.get_current_user), session: Session = Depends(get_session)):
+async def delete_device(device_id: str, current_user: User = Depends(auth.get_current_user), session: Session = Depends(get_write_session)):
     # 1. Find the device and verify ownership
     device = session.exec(select(Device).where(Device.device_id == device_id, Device.owner_id == current_user.id)).first()
     if not device:
@@ -517,11 +753,11 @@ def get_public_locations(session: Session = Depends(get_session)):
             chart_history["labels"] = [time_bucket_iso[t] for t in sorted_times]
             
             # Explicit keys to ensure all arrays are populated equally
-            metrics = ["pm25", "pm10", "co", "no2", "o3", "so2", "level", "ph", "tds"]
+            metric_keys = ["pm25", "pm10", "co", "no2", "o3", "so2", "level", "ph", "tds"]
             
             for t in sorted_times:
                 data_point = time_buckets[t]
-                for m in metrics:
+                for m in metric_keys:
                     # Append actual value or 0 if missing for this specific timestamp
                     chart_history[m].append(data_point.get(m, 0.0))
 
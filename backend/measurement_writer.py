@@ -0,0 +1,133 @@
+import csv
+import io
+from typing import Any, Dict, Iterable, List
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlmodel import Session
+from models import Measurement
+from partitions import measurement_partitions
+
+# Columns of the uq_measurement_device_type_ts index (see models.Measurement)
+DEDUP_KEY = ["device_id", "type", "timestamp"]
+COLUMNS = ["location_id", "device_id", "timestamp", "type", "value"]
+
+# Postgres batches at least this large are loaded with COPY instead of INSERT
+COPY_MIN_ROWS = 500
+# Rows per executemany() call on the INSERT paths
+PAGE_SIZE = 5000
+
+
+def _insert_ignore_duplicates(dialect_name: str):
+    """INSERT ... ON CONFLICT (device_id, type, timestamp) DO NOTHING for the active backend."""
+    if dialect_name == "postgresql":
+        insert = postgresql.insert
+    elif dialect_name == "sqlite":
+        insert = sqlite.insert
+    else:
+        raise NotImplementedError(f"Idempotent insert not supported for '{dialect_name}'")
+    return insert(Measurement.__table__).on_conflict_do_nothing(index_elements=DEDUP_KEY)
+
+
+def _copy_postgres(session, rows: List[Dict[str, Any]]) -> int:
+    """
+    COPY rows (CSV) into a session-local staging table, then move them over with
+    INSERT ... SELECT ... ON CONFLICT DO NOTHING so duplicates are still skipped.
+    """
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    for row in rows:
+        writer.writerow([row["location_id"], row["device_id"], row["timestamp"].isoformat(), row["type"], row["value"]])
+    buf.seek(0)
+
+    conn = session.connection()
+    conn.exec_driver_sql(
+        "CREATE TEMP TABLE IF NOT EXISTS measurement_stage ("
+        "location_id integer, device_id varchar, timestamp timestamp, type varchar, value double precision"
+        ") ON COMMIT DELETE ROWS"
+    )
+    cursor = conn.connection.dbapi_connection.cursor()
+    try:
+        cursor.copy_expert(f"COPY measurement_stage ({', '.join(COLUMNS)}) FROM STDIN WITH (FORMAT csv)", buf)
+    finally:
+        cursor.close()
+    cols = ", ".join(COLUMNS)
+    inserted = conn.exec_driver_sql(
+        f"INSERT INTO measurement ({cols}) SELECT {cols} FROM measurement_stage "
+        f"ON CONFLICT ({', '.join(DEDUP_KEY)}) DO NOTHING"
+    ).rowcount
+    conn.exec_driver_sql("TRUNCATE measurement_stage")
+    return inserted
+
+
+def insert_measurements(session, rows: List[Dict[str, Any]]) -> int:
+    """
+    Inserts measurement rows (dicts of location_id, device_id, type, value, timestamp),
+    skipping rows that already exist for the same (device_id, type, timestamp).
+    Returns the number of rows actually inserted; the caller commits.
+
+    Postgres: large batches go through COPY, small ones (live ingest) through a
+    multi-row INSERT. SQLite: executemany, paged. With monthly partitioning the
+    needed partitions are created first (see partitions.py).
+    """
+    if not rows:
+        return 0
+    dialect = session.get_bind().dialect
+    if measurement_partitions.enabled:
+        measurement_partitions.ensure_for(session, rows)
+        if dialect.name == "sqlite":
+            # `measurement` is a view there, each row goes to its month's table
+            return sum(
+                session.execute(sqlite.insert(measurement_partitions.table_for(month))
+                                .on_conflict_do_nothing(index_elements=DEDUP_KEY), page).rowcount
+                for month, month_rows in measurement_partitions.group_by_month(rows).items()
+                for page in _pages(month_rows)
+            )
+
+    if dialect.name == "postgresql":
+        if len(rows) >= COPY_MIN_ROWS and dialect.driver == "psycopg2":
+            return _copy_postgres(session, rows)
+        # Batched multi-row INSERT; rowcount isn't reliable across pages there, RETURNING is
+        stmt = _insert_ignore_duplicates(dialect.name).returning(Measurement.__table__.c.id)
+        return sum(len(session.execute(stmt, page).all()) for page in _pages(rows))
+
+    # SQLite: plain executemany, rowcount is the number of rows inserted
+    stmt = _insert_ignore_duplicates(dialect.name)
+    return sum(session.execute(stmt, page).rowcount for page in _pages(rows))
+
+
+def _pages(rows: List[Dict[str, Any]]):
+    for start in range(0, len(rows), PAGE_SIZE):
+        yield rows[start:start + PAGE_SIZE]
+
+
+class MeasurementWriter:
+    """
+    Accumulates measurement rows and flushes them in batches through insert_measurements(),
+    one transaction per batch. Used for backfills and other bulk loads.
+    """
+
+    def __init__(self, engine, batch_size: int = 10000):
+        self.engine = engine
+        self.batch_size = batch_size
+        self.pending: List[Dict[str, Any]] = []
+        self.inserted = 0
+        self.duplicates = 0
+
+    def add(self, row: Dict[str, Any]):
+        self.pending.append(row)
+        if len(self.pending) >= self.batch_size:
+            self.flush()
+
+    def extend(self, rows: Iterable[Dict[str, Any]]):
+        for row in rows:
+            self.add(row)
+
+    def flush(self) -> int:
+        if not self.pending:
+            return 0
+        batch, self.pending = self.pending, []
+        with Session(self.engine) as session:
+            inserted = insert_measurements(session, batch)
+            session.commit()
+        self.inserted += inserted
+        self.duplicates += len(batch) - inserted
+        return inserted
@@ -0,0 +1,205 @@
+"""
+Built-in instrumentation exposed on /metrics in the Prometheus text format.
+
+- RequestMetricsMiddleware: latency histogram per route template / method / status,
+  plus DB queries and DB time per request.
+- Query count and time, totals and per request, from the query_log.py cursor hooks.
+- Counters the app bumps itself (ingest rows, ...).
+- Collectors read at scrape time (pool_metrics(), password_hasher.metrics(),
+  WebSocket connections), so they cost nothing per request.
+
+Values live in process memory, one set per worker process. METRICS_ENABLED=0
+turns the middleware and the endpoint off, and the query hooks too unless the
+slow-query log needs them.
+"""
+import bisect
+import os
+import threading
+import time
+from typing import Callable, Dict, List, Sequence, Tuple
+
+import query_log
+from query_log import route_label
+
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1") != "0"
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 200, 500)
+
+Labels = Tuple[str, ...]
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence, extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _format_value(value: float) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.values: Dict[Labels, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, labels: Labels = (), amount: float = 1):
+        with self._lock:
+            self.values[labels] = self.values.get(labels, 0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            items = list(self.values.items())
+        for labels, value in items:
+            lines.append(f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        # labels -> [bucket counts..., +Inf count, sum, count]
+        self.values: Dict[Labels, list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, labels: Labels, value: float):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self.values.get(labels)
+            if series is None:
+                series = self.values[labels] = [0] * (len(self.buckets) + 1) + [0.0, 0]
+            series[index] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            items = [(labels, list(series)) for labels, series in self.values.items()]
+        for labels, series in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), series):
+                cumulative += count
+                le = 'le="+Inf"' if bound == float("inf") else f'le="{float(bound)!r}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, labels, le)} {cumulative}")
+            label_str = _format_labels(self.labelnames, labels)
+            lines.append(f"{self.name}_sum{label_str} {_format_value(series[-2])}")
+            lines.append(f"{self.name}_count{label_str} {series[-1]}")
+        return lines
+
+
+# (prefix, help, fn), see register_collector()
+_collectors: List[Tuple[str, str, Callable]] = []
+
+
+def register_collector(prefix: str, help: str, fn):
+    """
+    Adds values read at scrape time. `fn()` returns {((label, value), ...): {key: number}};
+    each key becomes the metric <prefix>_<key> (a counter if it ends in _total, else a gauge).
+    """
+    _collectors.append((prefix, help, fn))
+
+
+def _render_collectors() -> List[str]:
+    lines = []
+    for prefix, help, fn in _collectors:
+        try:
+            groups = fn()
+        except Exception as e:
+            print(f"[METRICS] collector {prefix} failed: {e}")
+            continue
+        families: Dict[str, List[str]] = {}
+        for label_pairs, values in groups.items():
+            names = [n for n, _ in label_pairs]
+            label_values = [v for _, v in label_pairs]
+            for key, value in values.items():
+                if isinstance(value, bool) or not isinstance(value, (int, float)):
+                    continue
+                families.setdefault(f"{prefix}_{key}", []).append(
+                    f"{prefix}_{key}{_format_labels(names, label_values)} {_format_value(value)}")
+        for name, samples in families.items():
+            kind = "counter" if name.endswith("_total") else "gauge"
+            lines += [f"# HELP {name} {help}", f"# TYPE {name} {kind}", *samples]
+    return lines
+
+
+REQUEST_SECONDS = Histogram("http_request_duration_seconds", "HTTP request latency by route template",
+                            ("method", "route", "status"))
+REQUEST_QUERIES = Histogram("http_request_db_queries", "DB queries executed per HTTP request",
+                            ("method", "route"), QUERY_COUNT_BUCKETS)
+REQUEST_DB_SECONDS = Histogram("http_request_db_seconds", "Time spent in DB queries per HTTP request",
+                               ("method", "route"))
+INGEST_RECORDS = Counter("ingest_records_total", "Ingest records received", ("endpoint",))
+INGEST_ROWS = Counter("ingest_rows_total", "Measurement rows stored by ingest", ("endpoint",))
+INGEST_DUPLICATES = Counter("ingest_duplicate_rows_total", "Ingest rows skipped as already stored", ("endpoint",))
+INGEST_IGNORED = Counter("ingest_ignored_metrics_total", "Unknown data keys dropped by ingest", ("endpoint",))
+
+_metrics = [REQUEST_SECONDS, REQUEST_QUERIES, REQUEST_DB_SECONDS, INGEST_RECORDS, INGEST_ROWS, INGEST_DUPLICATES, INGEST_IGNORED]
+
+# db_queries_total, db_query_seconds_total, db_slow_queries_total
+register_collector("db", "DB queries executed / time spent / slower than SLOW_QUERY_MS (query_log.py)",
+                   lambda: {(): query_log.totals()})
+
+
+def render() -> str:
+    lines = []
+    for metric in _metrics:
+        lines += metric.render()
+    lines += _render_collectors()
+    return "\n".join(lines) + "\n"
+
+
+class RequestMetricsMiddleware:
+    """
+    Plain ASGI middleware (no BaseHTTPMiddleware task/queue overhead). Requests are
+    labelled by route template ("/api/devices/{device_id}"), so cardinality stays
+    bounded; requests that match no route are labelled "unmatched".
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats, token = query_log.begin_request(scope)
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            elapsed = time.perf_counter() - start
+            query_log.end_request(token)
+            # The router stores the matched route in the (shared) scope
+            route = route_label(scope)
+            method = scope["method"]
+            REQUEST_SECONDS.observe((method, route, str(status)), elapsed)
+            REQUEST_QUERIES.observe((method, route), stats.count)
+            REQUEST_DB_SECONDS.observe((method, route), stats.seconds)
+
+
+if METRICS_ENABLED or query_log.SLOW_QUERY_MS > 0:
+    query_log.instrument_queries()
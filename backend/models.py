@@ -1,4 +1,5 @@
 from typing import Optional
+from sqlalchemy import Index
 from sqlmodel import Field, SQLModel
 from datetime import datetime
 
@@ -26,6 +27,15 @@ class Device(SQLModel, table=True):
     type: str  # 'aqi_camera', 'water_sensor'
 
 class Measurement(SQLModel, table=True):
+    # Idempotency key: a retried reading (same device, type and timestamp) is stored once.
+    # (device_id, timestamp) / (location_id, timestamp): a device's or location's latest
+    # reading is one index seek (last_seen in /api/devices and /api/locations/status)
+    __table_args__ = (
+        Index("uq_measurement_device_type_ts", "device_id", "type", "timestamp", unique=True),
+        Index("ix_measurement_device_ts", "device_id", "timestamp"),
+        Index("ix_measurement_location_ts", "location_id", "timestamp"),
+    )
+
     id: Optional[int] = Field(default=None, primary_key=True)
     location_id: int = Field(foreign_key="location.id")
     device_id: str = Field(foreign_key="device.device_id")
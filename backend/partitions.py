@@ -0,0 +1,297 @@
+"""
+Optional monthly time partitioning of Measurement (MEASUREMENT_PARTITIONING=monthly).
+
+Postgres: `measurement` becomes a native RANGE-partitioned table with one partition
+per month (plus a DEFAULT partition as a safety net); the planner prunes months
+that a query's time range can't touch.
+
+SQLite: each month lives in its own table (measurement_y2026m10 ...) and
+`measurement` is a UNION ALL view over them, newest month first. Ids in the view
+are offset by month so they stay unique. Time filters are pushed into every
+branch and answered from each month's timestamp index.
+
+Either way the query endpoints keep selecting from `measurement` unchanged;
+writes go through measurement_writer, which calls ensure_for() first and, on
+SQLite, routes each row to its month table. Retention is drop_before(): whole
+months are dropped instead of deleting rows.
+
+CLI (from backend/):
+    python partitions.py list
+    python partitions.py drop-before 2025-01-01
+"""
+import os
+import re
+import sys
+from datetime import datetime
+from typing import Dict, Iterable, List, Set, Tuple
+
+from sqlalchemy import Column, MetaData, Table, event, text
+from models import Measurement
+
+Month = Tuple[int, int]
+
+TABLE_PATTERN = re.compile(r"^measurement_y(\d{4})m(\d{2})$")
+
+
+def lookup_indexes() -> List[Tuple[str, List[str]]]:
+    """(name, columns) of the non-unique Measurement indexes, which every partition gets too."""
+    return [(i.name, [c.name for c in i.columns]) for i in Measurement.__table__.indexes if not i.unique]
+
+
+def month_of(ts: datetime) -> Month:
+    return ts.year, ts.month
+
+
+def next_month(month: Month) -> Month:
+    year, mon = month
+    return (year + 1, 1) if mon == 12 else (year, mon + 1)
+
+
+def partition_name(month: Month) -> str:
+    return f"measurement_y{month[0]:04d}m{month[1]:02d}"
+
+
+def month_bounds(month: Month) -> Tuple[str, str]:
+    start = datetime(month[0], month[1], 1)
+    end_y, end_m = next_month(month)
+    return start.strftime("%Y-%m-%d %H:%M:%S"), datetime(end_y, end_m, 1).strftime("%Y-%m-%d %H:%M:%S")
+
+
+class MeasurementPartitions:
+
+    def __init__(self, enabled: bool):
+        self.enabled = enabled
+        self._known: Set[Month] = set()
+        self._loaded = False
+        self._tables: Dict[Month, Table] = {}
+
+    # --- catalog -------------------------------------------------------------
+    def list_months(self, conn) -> List[Month]:
+        if conn.dialect.name == "postgresql":
+            names = conn.execute(text(
+                "SELECT c.relname FROM pg_inherits i "
+                "JOIN pg_class c ON c.oid = i.inhrelid JOIN pg_class p ON p.oid = i.inhparent "
+                "WHERE p.relname = 'measurement'"
+            )).scalars().all()
+        else:
+            names = conn.execute(text(
+                "SELECT name FROM sqlite_master WHERE type = 'table' AND name LIKE 'measurement_y%'"
+            )).scalars().all()
+        months = []
+        for name in names:
+            match = TABLE_PATTERN.match(name)
+            if match:
+                months.append((int(match.group(1)), int(match.group(2))))
+        return sorted(months)
+
+    def _load(self, conn):
+        self._known = set(self.list_months(conn))
+        self._loaded = True
+
+    def _forget(self, *args):
+        # DDL done in a rolled back transaction is gone, re-read the catalog next time
+        self._loaded = False
+
+    # --- setup / migration ---------------------------------------------------
+    def setup(self, engine):
+        """
+        Creates the partitioned layout (called from create_db_and_tables), migrating an
+        existing plain `measurement` table, and makes sure the current and next month exist.
+        """
+        with engine.begin() as conn:
+            if conn.dialect.name == "postgresql":
+                self._setup_postgres(conn)
+            else:
+                self._setup_sqlite(conn)
+            self._load(conn)
+            current = month_of(datetime.utcnow())
+            self._create(conn, [current, next_month(current)])
+            self._create_lookup_indexes(conn)
+
+    def _setup_postgres(self, conn):
+        kind = conn.execute(text("SELECT relkind FROM pg_class WHERE relname = 'measurement'")).scalar()
+        if kind == "p":
+            return
+        if kind == "r":
+            conn.execute(text("ALTER TABLE measurement RENAME TO measurement_legacy"))
+            conn.execute(text("ALTER TABLE measurement_legacy RENAME CONSTRAINT measurement_pkey TO measurement_legacy_pkey"))
+            conn.execute(text("ALTER INDEX IF EXISTS uq_measurement_device_type_ts RENAME TO uq_measurement_legacy_device_type_ts"))
+
+        conn.execute(text(
+            "CREATE TABLE measurement ("
+            " id BIGSERIAL,"
+            " location_id INTEGER NOT NULL REFERENCES location (id),"
+            " device_id VARCHAR NOT NULL REFERENCES device (device_id),"
+            " timestamp TIMESTAMP WITHOUT TIME ZONE NOT NULL,"
+            " type VARCHAR NOT NULL,"
+            " value DOUBLE PRECISION NOT NULL,"
+            " PRIMARY KEY (id, timestamp)"
+            ") PARTITION BY RANGE (timestamp)"
+        ))
+        conn.execute(text("CREATE UNIQUE INDEX uq_measurement_device_type_ts ON measurement (device_id, type, timestamp)"))
+        conn.execute(text("CREATE TABLE measurement_default PARTITION OF measurement DEFAULT"))
+
+        if kind == "r":
+            months = conn.execute(text(
+                "SELECT DISTINCT EXTRACT(YEAR FROM timestamp)::int, EXTRACT(MONTH FROM timestamp)::int FROM measurement_legacy"
+            )).all()
+            self._known = set()
+            self._create(conn, [tuple(m) for m in months])
+            conn.execute(text(
+                "INSERT INTO measurement (location_id, device_id, timestamp, type, value) "
+                "SELECT location_id, device_id, timestamp, type, value FROM measurement_legacy "
+                "ON CONFLICT DO NOTHING"
+            ))
+            conn.execute(text("DROP TABLE measurement_legacy"))
+            print(f"[DB] Migrated measurement into {len(months)} monthly partitions")
+
+    def _setup_sqlite(self, conn):
+        kind = conn.execute(text("SELECT type FROM sqlite_master WHERE name = 'measurement'")).scalar()
+        if kind == "view":
+            return
+        if kind is None:
+            self._rebuild_view(conn, [])
+            return
+
+        conn.execute(text("ALTER TABLE measurement RENAME TO measurement_legacy"))
+        months = conn.execute(text(
+            "SELECT DISTINCT CAST(strftime('%Y', timestamp) AS INTEGER), CAST(strftime('%m', timestamp) AS INTEGER) "
+            "FROM measurement_legacy"
+        )).all()
+        months = [tuple(m) for m in months]
+        for month in months:
+            self._create_sqlite_table(conn, month)
+            start, end = month_bounds(month)
+            conn.execute(text(
+                f"INSERT OR IGNORE INTO {partition_name(month)} (location_id, device_id, timestamp, type, value) "
+                "SELECT location_id, device_id, timestamp, type, value FROM measurement_legacy "
+                "WHERE timestamp >= :start AND timestamp < :end ORDER BY timestamp"
+            ), {"start": start, "end": end})
+        conn.execute(text("DROP TABLE measurement_legacy"))
+        self._rebuild_view(conn, months)
+        print(f"[DB] Migrated measurement into {len(months)} monthly tables")
+
+    # --- partition creation --------------------------------------------------
+    def _create(self, conn, months: Iterable[Month]):
+        missing = sorted(set(months) - self._known)
+        if not missing:
+            return
+        if conn.dialect.name == "postgresql":
+            for month in missing:
+                start, end = month_bounds(month)
+                conn.execute(text(
+                    f"CREATE TABLE IF NOT EXISTS {partition_name(month)} PARTITION OF measurement "
+                    f"FOR VALUES FROM ('{start}') TO ('{end}')"
+                ))
+            self._known.update(missing)
+        else:
+            for month in missing:
+                self._create_sqlite_table(conn, month)
+            # From the catalog, not self._known: another process (partitions.py drop-before,
+            # another worker) may have dropped or added month tables since we loaded it
+            self._known = set(self.list_months(conn))
+            self._rebuild_view(conn, self._known)
+
+    def _create_sqlite_table(self, conn, month: Month):
+        name = partition_name(month)
+        conn.execute(text(
+            f"CREATE TABLE IF NOT EXISTS {name} ("
+            " id INTEGER NOT NULL PRIMARY KEY,"
+            " location_id INTEGER NOT NULL REFERENCES location (id),"
+            " device_id VARCHAR NOT NULL REFERENCES device (device_id),"
+            " timestamp DATETIME NOT NULL,"
+            " type VARCHAR NOT NULL,"
+            " value FLOAT NOT NULL)"
+        ))
+        conn.execute(text(f"CREATE UNIQUE INDEX IF NOT EXISTS uq_{name}_device_type_ts ON {name} (device_id, type, timestamp)"))
+        conn.execute(text(f"CREATE INDEX IF NOT EXISTS ix_{name}_timestamp ON {name} (timestamp)"))
+        for index_name, columns in lookup_indexes():
+            conn.execute(text(f"CREATE INDEX IF NOT EXISTS {index_name.replace('measurement', name, 1)} "
+                              f"ON {name} ({', '.join(columns)})"))
+
+    def _create_lookup_indexes(self, conn):
+        # Month tables / partitioned tables created before an index was declared get it here
+        # (on Postgres an index on the parent cascades to every partition)
+        if conn.dialect.name == "postgresql":
+            for index_name, columns in lookup_indexes():
+                conn.execute(text(f"CREATE INDEX IF NOT EXISTS {index_name} ON measurement ({', '.join(columns)})"))
+        else:
+            for month in self._known:
+                self._create_sqlite_table(conn, month)
+
+    def _rebuild_view(self, conn, months: Iterable[Month]):
+        # Month-offset ids keep rows from different tables distinct in the ORM identity map
+        branches = [
+            f"SELECT id + {year * 100 + mon} * 10000000000 AS id, location_id, device_id, timestamp, type, value "
+            f"FROM {partition_name((year, mon))}"
+            for year, mon in sorted(months, reverse=True)
+        ]
+        if not branches:
+            branches = ["SELECT NULL AS id, NULL AS location_id, NULL AS device_id, NULL AS timestamp, "
+                        "NULL AS type, NULL AS value WHERE 0"]
+        conn.execute(text("DROP VIEW IF EXISTS measurement"))
+        conn.execute(text("CREATE VIEW measurement AS " + " UNION ALL ".join(branches)))
+
+    def ensure_for(self, session, rows: Iterable[dict]):
+        """Creates any month partitions the rows need, inside the session's transaction."""
+        conn = session.connection()
+        if not self._loaded:
+            self._load(conn)
+        months = {month_of(row["timestamp"]) for row in rows}
+        if months - self._known:
+            event.listen(session, "after_rollback", self._forget, once=True)
+            self._create(conn, months)
+
+    # --- write routing (SQLite) ----------------------------------------------
+    def table_for(self, month: Month) -> Table:
+        """Core Table for a SQLite month table, used as the INSERT target."""
+        table = self._tables.get(month)
+        if table is None:
+            table = Table(partition_name(month), MetaData(),
+                          *[Column(c.name, c.type, primary_key=c.primary_key) for c in Measurement.__table__.columns])
+            self._tables[month] = table
+        return table
+
+    def group_by_month(self, rows: Iterable[dict]) -> Dict[Month, List[dict]]:
+        grouped: Dict[Month, List[dict]] = {}
+        for row in rows:
+            grouped.setdefault(month_of(row["timestamp"]), []).append(row)
+        return grouped
+
+    # --- retention -----------------------------------------------------------
+    def drop_before(self, engine, cutoff: datetime) -> List[str]:
+        """Drops every month partition older than `cutoff`'s month. Returns the dropped table names."""
+        cutoff_month = month_of(cutoff)
+        with engine.begin() as conn:
+            old = [m for m in self.list_months(conn) if m < cutoff_month]
+            for month in old:
+                conn.execute(text(f"DROP TABLE IF EXISTS {partition_name(month)}"))
+            if conn.dialect.name != "postgresql" and old:
+                self._rebuild_view(conn, self.list_months(conn))
+        self._loaded = False
+        return [partition_name(m) for m in old]
+
+
+measurement_partitions = MeasurementPartitions(
+    enabled=os.getenv("MEASUREMENT_PARTITIONING", "none").lower() == "monthly"
+)
+
+
+if __name__ == "__main__":
+    sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+    from database import write_engine
+
+    if not measurement_partitions.enabled:
+        print("[!] Set MEASUREMENT_PARTITIONING=monthly to manage partitions.")
+        sys.exit(1)
+
+    command = sys.argv[1] if len(sys.argv) > 1 else "list"
+    if command == "list":
+        with write_engine.connect() as conn:
+            for month in measurement_partitions.list_months(conn):
+                print(partition_name(month))
+    elif command == "drop-before" and len(sys.argv) > 2:
+        dropped = measurement_partitions.drop_before(write_engine, datetime.fromisoformat(sys.argv[2]))
+        print(f"[+] Dropped {len(dropped)} partitions: {', '.join(dropped) or '-'}")
+    else:
+        print(__doc__)
@@ -0,0 +1,161 @@
+"""
+SQL query instrumentation through SQLAlchemy cursor events (instead of DB_ECHO=1,
+which logs every statement).
+
+- Totals: query count and time for the process (exported by metrics.py).
+- Per request: count and time of the queries an HTTP request ran, so N+1
+  patterns show up per route (RequestMetricsMiddleware opens the request scope).
+- Slow-query log: statements slower than SLOW_QUERY_MS are printed with their
+  parameters and the calling route (SLOW_QUERY_MS=0 turns it off).
+- assert_max_queries(n): test helper, fails a block that runs more than n queries.
+"""
+import contextvars
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import List, Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "250"))
+# Longest statement / parameter text printed in the slow-query log
+SLOW_QUERY_MAX_CHARS = int(os.getenv("SLOW_QUERY_MAX_CHARS", "500"))
+
+
+class QueryStats:
+    """Queries run inside one scope (an HTTP request or an assert_max_queries block)."""
+    __slots__ = ("count", "seconds", "scope", "statements")
+
+    def __init__(self, scope=None, keep_statements=False):
+        self.count = 0
+        self.seconds = 0.0
+        self.scope = scope  # ASGI scope of the request, for the route in the slow log
+        self.statements: Optional[List[str]] = [] if keep_statements else None
+
+    def add(self, statement, elapsed):
+        self.count += 1
+        self.seconds += elapsed
+        if self.statements is not None:
+            self.statements.append(statement)
+
+
+_lock = threading.Lock()
+_totals = {"queries_total": 0, "query_seconds_total": 0.0, "slow_queries_total": 0}
+# Scope of the HTTP request being handled (shared with threadpool endpoints via context copy)
+_request: contextvars.ContextVar[Optional[QueryStats]] = contextvars.ContextVar("query_log_request", default=None)
+# Active assert_max_queries() blocks; they see queries from every thread
+_watchers: List[QueryStats] = []
+
+
+def route_label(scope) -> str:
+    """Route template of the matched route ("/api/devices/{device_id}"), "unmatched" if none."""
+    template = getattr(scope.get("route"), "path", None)
+    if template is None:
+        return "unmatched"
+    # Routes of an included router may carry their path without the router prefix
+    # (newer FastAPI); the prefix is the request path's leading segments
+    path = scope.get("path", "")
+    extra = path.rstrip("/").count("/") - template.rstrip("/").count("/")
+    if extra > 0:
+        template = "/".join(path.split("/")[:extra + 1]) + template
+    return template
+
+
+def begin_request(scope):
+    """Starts counting the queries of an HTTP request; returns (stats, token for end_request)."""
+    stats = QueryStats(scope)
+    return stats, _request.set(stats)
+
+
+def end_request(token):
+    _request.reset(token)
+
+
+def totals():
+    with _lock:
+        return {key: round(value, 6) if isinstance(value, float) else value for key, value in _totals.items()}
+
+
+def _shorten(text):
+    text = " ".join(str(text).split())
+    return text if len(text) <= SLOW_QUERY_MAX_CHARS else text[:SLOW_QUERY_MAX_CHARS] + "..."
+
+
+def _log_slow(statement, parameters, executemany, elapsed, request):
+    if request is not None and request.scope is not None:
+        caller = f"{request.scope.get('method', '')} {route_label(request.scope)}"
+    else:
+        caller = "(no request)"
+    if executemany and isinstance(parameters, (list, tuple)):
+        params = f"{len(parameters)} rows, first {_shorten(parameters[0]) if parameters else None}"
+    else:
+        params = _shorten(parameters)
+    print(f"⚠️ SLOW QUERY {elapsed * 1000:.1f} ms [{caller}] {_shorten(statement)} | params: {params}")
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info["query_start"].pop()
+    slow = SLOW_QUERY_MS > 0 and elapsed * 1000 >= SLOW_QUERY_MS
+    with _lock:
+        _totals["queries_total"] += 1
+        _totals["query_seconds_total"] += elapsed
+        if slow:
+            _totals["slow_queries_total"] += 1
+        for watcher in _watchers:
+            watcher.add(statement, elapsed)
+    request = _request.get()
+    if request is not None:
+        request.add(statement, elapsed)
+    if slow:
+        _log_slow(statement, parameters, executemany, elapsed, request)
+
+
+def _handle_error(exception_context):
+    starts = exception_context.connection.info.get("query_start") if exception_context.connection else None
+    if starts:
+        starts.pop()
+
+
+def instrument_queries():
+    """Counts and times every statement on every engine (idempotent)."""
+    if not event.contains(Engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(Engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(Engine, "after_cursor_execute", _after_cursor_execute)
+        event.listen(Engine, "handle_error", _handle_error)
+
+
+def uninstrument_queries():
+    if event.contains(Engine, "before_cursor_execute", _before_cursor_execute):
+        event.remove(Engine, "before_cursor_execute", _before_cursor_execute)
+        event.remove(Engine, "after_cursor_execute", _after_cursor_execute)
+        event.remove(Engine, "handle_error", _handle_error)
+
+
+@contextmanager
+def assert_max_queries(n, label="block"):
+    """
+    Test helper: fails if the block runs more than `n` queries. Counts every query in
+    the process while active (so requests served on other threads, e.g. by TestClient,
+    are included); yields the QueryStats, whose statements list the queries run.
+
+        with assert_max_queries(3, "GET /api/devices"):
+            client.get("/api/devices", headers=headers)
+    """
+    instrument_queries()
+    stats = QueryStats(keep_statements=True)
+    with _lock:
+        _watchers.append(stats)
+    try:
+        yield stats
+    finally:
+        with _lock:
+            _watchers.remove(stats)
+    if stats.count > n:
+        listing = "\n".join(f"  {i + 1}. {_shorten(s)}" for i, s in enumerate(stats.statements))
+        raise AssertionError(f"{label} executed {stats.count} queries, expected at most {n}:\n{listing}")
@@ -0,0 +1,109 @@
+import json
+import math
+import os
+import time
+from typing import Dict, Optional, Tuple
+
+# (rate in requests/second, burst capacity) per ingest payload type; "*" is the fallback.
+# Devices report every 5-10s, so these leave plenty of room for retries.
+DEFAULT_LIMITS: Dict[str, Tuple[float, float]] = {
+    "aqi": (1.0, 10),
+    "water": (1.0, 10),
+    "*": (2.0, 20),
+}
+
+
+def _load_limits(env_name: str) -> Dict[str, Tuple[float, float]]:
+    """Reads a JSON env var like {"aqi": [0.5, 5], "DEV_CAM_01": {"rate": 5, "burst": 20}}."""
+    raw = os.getenv(env_name)
+    if not raw:
+        return {}
+    limits = {}
+    for key, val in json.loads(raw).items():
+        if isinstance(val, dict):
+            limits[key] = (float(val["rate"]), float(val["burst"]))
+        else:
+            limits[key] = (float(val[0]), float(val[1]))
+    return limits
+
+
+class TokenBucket:
+    __slots__ = ("rate", "capacity", "tokens", "updated")
+
+    def __init__(self, rate: float, capacity: float, now: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = now
+
+    def take(self, now: float) -> float:
+        """Consumes one token. Returns 0 if allowed, else seconds until a token is available."""
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+
+class DeviceRateLimiter:
+    """
+    In-memory token buckets keyed by device_id.
+    Limits come from per-device overrides, then per-type defaults, then "*".
+    Buckets idle for longer than `idle_ttl` are evicted by a sweep that runs at most
+    every `sweep_interval` seconds, so memory stays proportional to active devices.
+    Not thread-safe: meant to be called from the event loop (async endpoints).
+    """
+
+    def __init__(self, defaults: Optional[Dict[str, Tuple[float, float]]] = None,
+                 overrides: Optional[Dict[str, Tuple[float, float]]] = None,
+                 idle_ttl: float = 300.0, sweep_interval: float = 60.0, clock=time.monotonic):
+        self.defaults = dict(DEFAULT_LIMITS)
+        self.defaults.update(defaults or {})
+        self.overrides = overrides or {}
+        self.idle_ttl = idle_ttl
+        self.sweep_interval = sweep_interval
+        self.clock = clock
+        self.buckets: Dict[str, TokenBucket] = {}
+        self._last_sweep = clock()
+
+    def limits_for(self, device_id: str, device_type: str) -> Tuple[float, float]:
+        return self.overrides.get(device_id) or self.defaults.get(device_type) or self.defaults["*"]
+
+    def acquire(self, device_id: str, device_type: str) -> float:
+        """Returns 0 if the request may proceed, else the Retry-After delay in seconds."""
+        now = self.clock()
+        if now - self._last_sweep >= self.sweep_interval:
+            self.sweep(now)
+
+        bucket = self.buckets.get(device_id)
+        if bucket is None:
+            rate, burst = self.limits_for(device_id, device_type)
+            bucket = self.buckets[device_id] = TokenBucket(rate, burst, now)
+        return bucket.take(now)
+
+    def sweep(self, now: Optional[float] = None):
+        now = self.clock() if now is None else now
+        cutoff = now - self.idle_ttl
+        idle = [key for key, bucket in self.buckets.items() if bucket.updated < cutoff]
+        for key in idle:
+            del self.buckets[key]
+        self._last_sweep = now
+
+
+def retry_after_header(delay: float) -> Dict[str, str]:
+    return {"Retry-After": str(max(1, math.ceil(delay)))}
+
+
+def limiter_from_env() -> Optional[DeviceRateLimiter]:
+    """
+    INGEST_RATE_LIMIT=0 disables limiting.
+    INGEST_RATE_DEFAULTS / INGEST_RATE_OVERRIDES: JSON maps of type / device_id -> [rate, burst].
+    """
+    if os.getenv("INGEST_RATE_LIMIT", "1") == "0":
+        return None
+    return DeviceRateLimiter(
+        defaults=_load_limits("INGEST_RATE_DEFAULTS"),
+        overrides=_load_limits("INGEST_RATE_OVERRIDES"),
+        idle_ttl=float(os.getenv("INGEST_RATE_IDLE_TTL", "300")),
+    )
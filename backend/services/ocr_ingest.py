@@ -4,11 +4,21 @@ import pytesseract
 import time
 import sqlite3
 import re
+import os
+import queue
+import threading
 import numpy as np
 import statistics
+import json
+import sys
+import multiprocessing
+from functools import partial
+from concurrent.futures import Future, ProcessPoolExecutor, FIRST_COMPLETED, wait
 from datetime import datetime
 from collections import deque
 
+from ocr_text import LABELS, extractor_for, label_extractor
+
 # ---------------------------------------------------------
 # CONFIGURATION
 # ---------------------------------------------------------
@@ -20,6 +30,15 @@ pytesseract.pytesseract.tesseract_cmd = r"C:\Program Files\Tesseract-OCR\tessera
 # 🔧 PRODUCTION URL
 #API_URL = "https://eco-intelligence.onrender.com/api/ingest" 
 API_URL = "http://localhost:8000/api/ingest"
+API_BATCH_URL = API_URL + "/batch"
+
+# UPLOAD CONFIG
+# Uploads run on a background thread; readings that can't be sent are spooled to disk
+# and replayed in batches once the link is back.
+UPLOAD_TIMEOUT = (3.05, 10)  # (connect, read) seconds
+SPOOL_FILE = os.getenv("OCR_SPOOL_FILE", os.path.join(os.path.dirname(os.path.abspath(__file__)), "ocr_spool.db"))
+SPOOL_BATCH = 200        # records per replay request
+UPLOAD_RETRY_MAX = 60    # max seconds between retries while the link is down
 
 # DEVICE CONFIG
 DEVICE_ID_CAM = "DEV_CAM_01"
@@ -29,86 +48,1127 @@ DEVICE_ID_CAM = "DEV_CAM_01"
 
 # ESP_URL = "http://10.161.184.150/data" # Deprecated: ESP32 sends directly to Cloud
 
+# OCR CONFIG
+# Burst frames are OCR'd in parallel by a pool of worker processes (one Tesseract each)
+OCR_WORKERS = int(os.getenv("OCR_WORKERS", str(os.cpu_count() or 1)))
+# Adaptive burst: stop as soon as every label has CONSENSUS_K readings that agree within
+# tolerance (a label not read yet keeps it going up to BURST_FRAMES); go past BURST_FRAMES
+# (up to BURST_MAX_FRAMES) only while some label's readings conflict. A label that is merely short of readings (unreadable for a moment, nothing
+# conflicting) extends the burst by at most BURST_SHORT_EXTRA frames.
+BURST_FRAMES = 10  # Frames per burst for stability (increased from 5 for better chance)
+BURST_MAX_FRAMES = 20
+BURST_SHORT_EXTRA = 3
+CONSENSUS_K = 3
+# A camera that stops delivering (unplugged, RTSP dropout) ends the burst after this many
+# failed reads in a row, GRAB_RETRY_DELAY seconds apart
+GRAB_MAX_FAILED_READS = 10
+GRAB_RETRY_DELAY = 0.05
+CONSENSUS_ABS_TOL = 0.1   # readings agree if within max(ABS_TOL, REL_TOL * value)
+CONSENSUS_REL_TOL = 0.02
+
+# Change detection: the burst is skipped while the display looks the same as at the last OCR.
+# Frames are compared as blurred 320x180 grayscale thumbnails; the display counts as changed
+# once CHANGE_MIN_PIXELS thumbnail pixels moved by more than CHANGE_PIXEL_DELTA (0-255).
+# A single digit changing is ~15-20 pixels on a full-screen display, sensor noise stays at 0.
+CHANGE_PIXEL_DELTA = int(os.getenv("OCR_CHANGE_PIXEL_DELTA", "24"))
+CHANGE_MIN_PIXELS = int(os.getenv("OCR_CHANGE_MIN_PIXELS", "8"))
+# What to do on an unchanged screen: "resend" the last voted values, or "skip" the upload
+UNCHANGED_ACTION = os.getenv("OCR_UNCHANGED_ACTION", "resend")
+# Force a real OCR at least this often even if nothing seems to change (seconds)
+CHANGE_MAX_AGE = float(os.getenv("OCR_CHANGE_MAX_AGE", "600"))
+
+# OCR MODE
+# "roi": OCR only the value rectangles from the device's calibration file (psm 7, digits only)
+# "full": OCR the whole frame and find values by label regex
+# "auto": roi if a calibration file exists, else full. Calibration files are per site and
+#         not in git (`python ocr_ingest.py calibrate` writes one; see DEV_CAM_01.example.json)
+OCR_MODE = os.getenv("OCR_MODE", "auto")
+CALIBRATION_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "calibration")
+CALIBRATION_FILE = os.getenv("OCR_CALIBRATION", os.path.join(CALIBRATION_DIR, f"{DEVICE_ID_CAM}.json"))
+# ROI recognizer: "tesseract", "template" (glyphs learned at calibration, no Tesseract at all)
+# or "auto": template with Tesseract as the fallback when it is unsure, if a glyph file exists
+OCR_ENGINE = os.getenv("OCR_ENGINE", "auto")
+# Template matches scoring below this (normalized correlation, -1..1) count as unsure
+TEMPLATE_MIN_SCORE = float(os.getenv("OCR_TEMPLATE_MIN_SCORE", "0.80"))
+# One line of digits per ROI
+ROI_TESSERACT_CONFIG = r"--oem 3 --psm 7 -c tessedit_char_whitelist=0123456789."
+
+# Full-frame preprocessing: frames wider than this are downscaled before CLAHE / 2x upscale
+# (0 = off; e.g. 1280 for a 1080p camera)
+PREPROCESS_MAX_WIDTH = int(os.getenv("OCR_PREPROCESS_MAX_WIDTH", "0"))
+
+# EXPANDED WHITELIST: Include lowercase a-z so 'g' isn't read as '9'
+# Also include / and ³ (if possible, though standard chars often suffice)
+TESSERACT_CONFIG = r"--oem 3 --psm 6 -c tessedit_char_whitelist=0123456789.ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz%:-/"
+
+# Label regexes (LABELS) and the text extractor live in ocr_text.py
+# LABELS key -> ingest payload key
+PAYLOAD_KEYS = {"PM2.5": "pm25", "PM10": "pm10", "CO": "co", "SO2": "so2", "NO2": "no2", "O3": "o3"}
+
 # ---------------------------------------------------------
 # UTILITY FUNCTIONS
 # ---------------------------------------------------------
-def save_to_db(data):
-    """Sends the voted AQI data to the Cloud API."""
-    
+def save_to_db(data, confidence=None, device_id=DEVICE_ID_CAM):
+    """
+    Sends the voted AQI data (and per-label vote confidence, if known) to the Cloud API.
+    Labels missing from `data` (not read in the burst) are left out of the payload.
+    """
+    sent = {label: key for label, key in PAYLOAD_KEYS.items() if label in data}
+    if not sent:
+        print("   [WARN] Nothing read in this burst, not uploading.")
+        return
+
     # payload builder
     timestamp = datetime.utcnow().isoformat()
     
     # 1. Send AQI Data
     aqi_payload = {
-        "device_id": DEVICE_ID_CAM,
+        "device_id": device_id,
         "type": "aqi",
         "timestamp": timestamp,
-        "data": {
-            "pm25": data.get('PM2.5', 0),
-            "pm10": data.get('PM10', 0),
-            "co": data.get('CO', 0),
-            "so2": data.get('SO2', 0),
-            "no2": data.get('NO2', 0),
-            "o3": data.get('O3', 0)
-        }
+        "data": {key: data[label] for label, key in sent.items()}
     }
+    if confidence is not None:
+        # Share of burst readings that agreed with the voted value (broadcast only, not stored)
+        aqi_payload["confidence"] = {key: confidence.get(label, 0.0) for label, key in sent.items()}
 
-    try:
-        # Send AQI
-        requests.post(API_URL, json=aqi_payload)
-        print(f"[SENT] Cloud Upload Success: AQI Data -> {DEVICE_ID_CAM}")
-    except Exception as e:
-        print(f"[ERROR] API Connection Failed: {e}")
+    # Never blocks the capture loop, the uploader thread sends (or spools) it
+    uploader.submit(aqi_payload)
+
+class UploadSpool:
+    """
+    On-disk FIFO (SQLite) of payloads that couldn't be uploaded. Survives restarts.
+    Only used from the uploader thread.
+    """
+
+    def __init__(self, path):
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS spool (id INTEGER PRIMARY KEY AUTOINCREMENT, payload TEXT NOT NULL, queued_at TEXT NOT NULL)"
+        )
+        self.conn.commit()
+
+    def add(self, payloads):
+        now = datetime.utcnow().isoformat()
+        self.conn.executemany("INSERT INTO spool (payload, queued_at) VALUES (?, ?)",
+                              [(json.dumps(p), now) for p in payloads])
+        self.conn.commit()
+
+    def peek(self, limit):
+        """Oldest `limit` entries as [(id, payload)]."""
+        rows = self.conn.execute("SELECT id, payload FROM spool ORDER BY id LIMIT ?", (limit,)).fetchall()
+        return [(row_id, json.loads(payload)) for row_id, payload in rows]
+
+    def remove_through(self, last_id):
+        self.conn.execute("DELETE FROM spool WHERE id <= ?", (last_id,))
+        self.conn.commit()
+
+    def __len__(self):
+        return self.conn.execute("SELECT COUNT(*) FROM spool").fetchone()[0]
+
+    def close(self):
+        self.conn.close()
+
+class Uploader(threading.Thread):
+    """
+    Background uploader: live payloads go to `url` over a keep-alive requests.Session.
+    Failures (network errors, timeouts, any non-2xx but 422) land in the UploadSpool and
+    are replayed oldest first to `batch_url`, one batch per loop so live readings aren't
+    held up. While the link is down, new payloads go straight to the spool and retries
+    back off exponentially. Only a validation error (422, e.g. malformed body or
+    unregistered device) drops payloads, and every dropped row is logged; a 401/404/413
+    from a proxy or an older backend keeps them spooled.
+    `on_result(payload, result, seconds)` is called for every live payload ("ok", "retry"
+    or "reject"; seconds spent posting it) from the uploader thread.
+    """
+
+    def __init__(self, url, batch_url, spool_path, timeout=UPLOAD_TIMEOUT, batch_size=SPOOL_BATCH, on_result=None):
+        super().__init__(daemon=True)
+        self.url = url
+        self.batch_url = batch_url
+        self.spool_path = spool_path
+        self.timeout = timeout
+        self.batch_size = batch_size
+        self.on_result = on_result
+        self.outbox = queue.Queue()
+        self.stop_event = threading.Event()
+        self.retry_delay = 0
+        self.next_attempt = 0.0
+
+    def submit(self, payload):
+        self.outbox.put(payload)
+
+    def stop(self, timeout=15):
+        """Finishes the current upload, spools whatever is still queued and stops."""
+        self.stop_event.set()
+        self.outbox.put(None)
+        self.join(timeout)
+
+    def _post(self, url, body):
+        """'ok', 'retry' (keep it) or 'reject' (validation error, the server will never take it)."""
+        try:
+            r = self.session.post(url, json=body, timeout=self.timeout)
+        except requests.RequestException as e:
+            print(f"[ERROR] API Connection Failed: {e}")
+            return "retry"
+        if r.status_code == 422:
+            print(f"[ERROR] Upload rejected ({r.status_code}): {r.text[:200]}")
+            return "reject"
+        try:
+            result = r.json() if r.status_code < 300 else {}
+        except ValueError:
+            result = {}
+        if result.get("status") != "success":
+            print(f"[ERROR] Upload failed ({r.status_code}): {r.text[:200]}")
+            return "retry"
+        if result.get("unknown_devices"):
+            print(f"[DROPPED] Readings of unregistered devices skipped by the server: {result['unknown_devices']}")
+        if result.get("ignored_metrics"):
+            print(f"[WARN] Fields not known to the server, ignored: {result['ignored_metrics']}")
+        return "ok"
+
+    @staticmethod
+    def _log_dropped(payloads):
+        for payload in payloads:
+            print(f"[DROPPED] {payload.get('device_id')} {payload.get('timestamp')} {payload.get('data')}")
+
+    def _link_down(self):
+        self.retry_delay = min(UPLOAD_RETRY_MAX, max(1, self.retry_delay * 2))
+        self.next_attempt = time.time() + self.retry_delay
+
+    def _link_up(self):
+        self.retry_delay = 0
+        self.next_attempt = 0.0
+
+    def _send(self, payload):
+        if time.time() < self.next_attempt:
+            self.spool.add([payload])  # link is down, don't wait out a timeout per reading
+            if self.on_result:
+                self.on_result(payload, "retry", 0.0)
+            return
+        start = time.perf_counter()
+        result = self._post(self.url, payload)
+        if self.on_result:
+            self.on_result(payload, result, time.perf_counter() - start)
+        if result == "ok":
+            self._link_up()
+            print(f"[SENT] Cloud Upload Success: AQI Data -> {payload.get('device_id')}")
+        elif result == "retry":
+            self.spool.add([payload])
+            self._link_down()
+            print(f"[SPOOL] Saved for later ({len(self.spool)} waiting)")
+        else:
+            self._log_dropped([payload])
+
+    def _replay_batch(self):
+        batch = self.spool.peek(self.batch_size)
+        if not batch or time.time() < self.next_attempt:
+            return
+        result = self._post(self.batch_url, {"records": [payload for _, payload in batch]})
+        if result == "retry":
+            self._link_down()
+            return
+        self._link_up()
+        if result == "reject":
+            self._log_dropped([payload for _, payload in batch])
+        self.spool.remove_through(batch[-1][0])
+        if result == "ok":
+            print(f"[SENT] Replayed {len(batch)} spooled readings ({len(self.spool)} left)")
+        else:
+            print(f"[DROPPED] {len(batch)} spooled readings rejected by the server ({len(self.spool)} left)")
+
+    def run(self):
+        self.session = requests.Session()
+        self.spool = UploadSpool(self.spool_path)
+        if len(self.spool):
+            print(f"[SPOOL] {len(self.spool)} readings waiting from an earlier run")
+        while True:
+            try:
+                payload = self.outbox.get(timeout=1.0)
+            except queue.Empty:
+                payload = None
+            if payload is None and self.stop_event.is_set():
+                break
+            try:
+                if payload is not None:
+                    self._send(payload)
+                self._replay_batch()
+            except Exception as e:
+                # Keep the thread alive; a re-spooled duplicate is harmless (server dedups)
+                print(f"[ERROR] Uploader: {e}")
+                if payload is not None:
+                    self.spool.add([payload])
+                self._link_down()
+
+        # Shutting down: nothing queued in memory may be lost
+        leftover = []
+        while not self.outbox.empty():
+            item = self.outbox.get_nowait()
+            if item is not None:
+                leftover.append(item)
+        if leftover:
+            self.spool.add(leftover)
+        self.spool.close()
+        self.session.close()
+
+uploader = Uploader(API_URL, API_BATCH_URL, SPOOL_FILE)
+
+class FramePreprocessor:
+    """
+    Reusable OCR preprocessing: grayscale -> (invert) -> CLAHE -> upscale -> blur -> Otsu
+    threshold (-> white border). The CLAHE object and every intermediate buffer are
+    created once per input shape and reused through OpenCV's dst= arguments, so a
+    steady stream of same-sized frames (or the same ROIs) allocates nothing.
+
+    max_width: downscale-first path, frames wider than this are shrunk (INTER_AREA)
+               before anything else so CLAHE, upscale and blur touch fewer pixels.
+    apply(frame, rect): run on one (x, y, w, h) region only.
+
+    The returned image is an internal buffer, overwritten by the next call with the same
+    input shape; copy it to keep it. One instance per thread/process.
+    """
+
+    def __init__(self, scale=2.0, clahe_clip=2.0, clahe_tiles=(8, 8), blur_ksize=5,
+                 interpolation=cv2.INTER_CUBIC, max_width=None, invert=False, border=0):
+        self.scale = scale
+        self.clahe_clip = clahe_clip
+        self.clahe_tiles = clahe_tiles
+        self.blur_ksize = blur_ksize
+        self.interpolation = interpolation
+        self.max_width = max_width
+        self.invert = invert
+        self.border = border
+        self._setup()
+
+    def _setup(self):
+        self.clahe = cv2.createCLAHE(clipLimit=self.clahe_clip, tileGridSize=self.clahe_tiles) if self.clahe_clip else None
+        self._buffers = {}
+
+    # cv2.CLAHE objects can't be pickled; workers rebuild it (and their own buffers)
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state["clahe"], state["_buffers"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._setup()
+
+    def _buffer(self, name, shape):
+        # Keyed by shape too, so ROIs of different sizes don't keep reallocating
+        key = (name, shape)
+        buf = self._buffers.get(key)
+        if buf is None:
+            buf = self._buffers[key] = np.empty(shape, np.uint8)
+        return buf
+
+    def apply(self, frame, rect=None):
+        if rect is not None:
+            x, y, w, h = rect
+            frame = frame[y:y + h, x:x + w]
+        h, w = frame.shape[:2]
+
+        # 1. Grayscale
+        gray = frame
+        if frame.ndim == 3:
+            gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY, dst=self._buffer("gray", (h, w)))
+
+        # 2. Downscale first (big camera frames)
+        if self.max_width and w > self.max_width:
+            h, w = round(h * self.max_width / w), self.max_width
+            gray = cv2.resize(gray, (w, h), dst=self._buffer("small", (h, w)), interpolation=cv2.INTER_AREA)
+
+        if self.invert:
+            gray = cv2.bitwise_not(gray, dst=self._buffer("inverted", (h, w)))
+
+        # 3. CLAHE, helps if lighting is uneven
+        if self.clahe is not None:
+            gray = self.clahe.apply(gray, dst=self._buffer("clahe", (h, w)))
+
+        # 4. Upscale, Tesseract reads small text better
+        if self.scale != 1:
+            h, w = round(h * self.scale), round(w * self.scale)
+            gray = cv2.resize(gray, (w, h), dst=self._buffer("scaled", (h, w)), interpolation=self.interpolation)
+
+        # 5. Blur to reduce noise, then Otsu threshold
+        k = self.blur_ksize
+        blurred = cv2.GaussianBlur(gray, (k, k), 0, dst=self._buffer("blurred", (h, w)))
+        _, binary = cv2.threshold(blurred, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU,
+                                  dst=self._buffer("binary", (h, w)))
+
+        # 6. White border (Tesseract likes whitespace around text)
+        if self.border:
+            b = self.border
+            binary = cv2.copyMakeBorder(binary, b, b, b, b, cv2.BORDER_CONSTANT, value=255,
+                                        dst=self._buffer("bordered", (h + 2 * b, w + 2 * b)))
+        return binary
+
+# Full-frame preprocessing (each OCR worker process gets its own copy and buffers)
+frame_preprocessor = FramePreprocessor(max_width=PREPROCESS_MAX_WIDTH or None)
 
 def preprocess_frame(frame):
     """
     Full-frame preprocessing to make text pop out against background.
+    Returns frame_preprocessor's reused buffer (see FramePreprocessor).
     """
-    # 1. Convert to Grayscale
-    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-    
-    # 2. CLAHE (Contrast Limited Adaptive Histogram Equalization)
-    #    Helps if lighting is uneven
-    clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8,8))
-    gray = clahe.apply(gray)
-    
-    # 3. Resize / Upscale
-    #    Upscaling helps Tesseract read small text
-    gray = cv2.resize(gray, None, fx=2, fy=2, interpolation=cv2.INTER_CUBIC)
-    
-    # 4. Blur to reduce noise
-    gray = cv2.GaussianBlur(gray, (5, 5), 0)
-    
-    # 5. Thresholding (Adaptive or Otsu)
-    #    Otsu is often good for black text on light bg or vice versa
-    _, thresh = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
-    
-    return thresh
+    return frame_preprocessor.apply(frame)
 
 def extract_value(text, label_patterns):
     """
     Scans the OCR text for a number appearing after any of the label patterns.
     Returns the first valid float found, or None.
     """
-    for pattern in label_patterns:
-        # Regex explanation:
-        # pattern: the label (e.g., "PM2\.5")
-        # [:\-\s]*: optional separator (colon, dash, space)
-        # ([0-9]+\.?[0-9]*): the number group
-        regex = rf"{pattern}[:\-\s]*([0-9]+\.?[0-9]*)"
-        match = re.search(regex, text, re.IGNORECASE)
-        if match:
+    return extractor_for(tuple(label_patterns)).extract(text).get(None)
+
+def extract_readings(text):
+    """
+    Pulls every pollutant in LABELS out of one frame's OCR text (single regex pass,
+    see ocr_text.LabelExtractor). Returns {label: value} for the labels found.
+    """
+    return label_extractor.extract(text)
+
+def load_calibration(path, frame_size=None):
+    """
+    Reads a calibration file:
+        {"frame_size": [w, h], "invert": false, "rois": {"PM2.5": [x, y, w, h], ...}}
+    Labels must be LABELS keys. If `frame_size` (w, h) differs from the calibrated one the
+    rectangles are scaled to it (re-calibrating at the new resolution is more accurate).
+    Returns ({label: (x, y, w, h)}, invert).
+    """
+    with open(path, encoding="utf-8") as f:
+        cal = json.load(f)
+    rois = {}
+    for label, rect in cal.get("rois", {}).items():
+        if label not in LABELS:
+            raise ValueError(f"{path}: unknown label '{label}' (expected one of {', '.join(LABELS)})")
+        if len(rect) != 4 or min(rect[2:]) <= 0:
+            raise ValueError(f"{path}: '{label}' must be [x, y, width, height]")
+        rois[label] = tuple(int(v) for v in rect)
+    if not rois:
+        raise ValueError(f"{path}: no ROIs defined")
+
+    calibrated = cal.get("frame_size")
+    if frame_size and calibrated and tuple(calibrated) != tuple(frame_size):
+        sx, sy = frame_size[0] / calibrated[0], frame_size[1] / calibrated[1]
+        print(f"[CAL] Scaling ROIs from {calibrated[0]}x{calibrated[1]} to {frame_size[0]}x{frame_size[1]}")
+        rois = {k: (round(x * sx), round(y * sy), round(w * sx), round(h * sy)) for k, (x, y, w, h) in rois.items()}
+    return rois, bool(cal.get("invert", False))
+
+def save_calibration(path, rois, frame_size, invert=False):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({
+            "device_id": DEVICE_ID_CAM,
+            "frame_size": list(frame_size),
+            "invert": invert,
+            "rois": {label: list(rect) for label, rect in rois.items()},
+        }, f, indent=2)
+    print(f"[CAL] Saved {len(rois)} ROIs to {path}")
+
+def calibrate(cap, path):
+    """Interactive: drag a rectangle around each value on screen (ENTER to accept, ESC to skip a label)."""
+    ret, frame = cap.read()
+    if not ret:
+        print("[ERROR] Could not read a frame to calibrate on.")
+        return
+    rois = {}
+    for label in LABELS:
+        x, y, w, h = cv2.selectROI(f"Select the {label} value (ESC to skip)", frame, showCrosshair=False)
+        cv2.destroyAllWindows()
+        if w and h:
+            rois[label] = (int(x), int(y), int(w), int(h))
+    if not rois:
+        return
+    save_calibration(path, rois, (frame.shape[1], frame.shape[0]))
+
+    # Teach the template recognizer this display's font from the same frame
+    recognizer = TemplateRecognizer()
+    for label, (x, y, w, h) in rois.items():
+        shown = input(f"Value shown for {label} (blank to skip): ").strip()
+        if shown and not recognizer.learn(frame[y:y + h, x:x + w], shown):
+            print(f"   [WARN] {label}: found a different number of glyphs than '{shown}', skipped")
+    if recognizer.chars:
+        recognizer.save(glyphs_path(path))
+
+def roi_preprocessor(invert=False):
+    """
+    Preprocessing for small value crops: 3x upscale (cheap at this size), light blur,
+    Otsu threshold and a white border. No CLAHE, a crop is evenly lit.
+    """
+    return FramePreprocessor(scale=3, clahe_clip=None, blur_ksize=3, invert=invert, border=10)
+
+def parse_number(text):
+    """First number in a digits-only OCR result, or None."""
+    match = re.search(r"[0-9]+(?:\.[0-9]+)?", text)
+    return float(match.group(0)) if match else None
+
+def glyphs_path(calibration_path):
+    """Template glyphs are stored next to the calibration file: DEV_CAM_01.json -> DEV_CAM_01.glyphs.npz"""
+    return os.path.splitext(calibration_path)[0] + ".glyphs.npz"
+
+# ---------------------------------------------------------
+# ROI RECOGNIZERS
+# ---------------------------------------------------------
+# A recognizer turns one ROI crop (BGR or grayscale) into a number, or None when it can't
+# read it confidently. They are plain picklable objects so they can be shipped to the
+# OCR worker processes.
+
+class TesseractRecognizer:
+    """Single-line digit OCR with Tesseract (one tesseract process per ROI)."""
+
+    def __init__(self, invert=False):
+        self.invert = invert
+        self.preprocessor = roi_preprocessor(invert)
+
+    def read(self, roi):
+        text = pytesseract.image_to_string(self.preprocessor.apply(roi), config=ROI_TESSERACT_CONFIG)
+        return parse_number(text)
+
+class TemplateRecognizer:
+    """
+    Tesseract-free reader for a fixed display font. The crop is binarized and split into
+    glyphs on empty columns; each glyph is scaled to a small fixed grid and scored against
+    every learned template in one matrix product (normalized correlation). Small blobs on
+    the baseline are decimal points. Works for both printed digits and seven-segment
+    displays, as long as the templates come from the same screen (see calibrate()).
+    """
+
+    TEMPLATE_SIZE = (16, 24)   # (w, h) each glyph is scaled to
+    NORM_HEIGHT = 48           # crops are scaled to this height before segmenting
+    MAX_SAMPLES = 8            # templates kept per character
+    JOIN_GAP = 1               # empty columns (at NORM_HEIGHT) bridged inside a glyph, e.g. split 7-segment strokes
+
+    def __init__(self, chars=None, templates=None, invert=False, min_score=TEMPLATE_MIN_SCORE):
+        self.chars = list(chars) if chars is not None else []
+        size = self.TEMPLATE_SIZE[0] * self.TEMPLATE_SIZE[1]
+        self.templates = np.asarray(templates, np.float32).reshape(-1, size) if templates is not None \
+            else np.empty((0, size), np.float32)
+        self.invert = invert
+        self.min_score = min_score
+
+    # --- persistence -------------------------------------------------------
+    @classmethod
+    def load(cls, path, invert=False, min_score=TEMPLATE_MIN_SCORE):
+        data = np.load(path)
+        return cls([str(c) for c in data["chars"]], data["templates"], invert, min_score)
+
+    def save(self, path):
+        np.savez(path, chars=np.array(self.chars), templates=self.templates)
+        print(f"[CAL] Saved {len(self.chars)} glyph templates ({''.join(sorted(set(self.chars)))}) to {path}")
+
+    # --- segmentation ------------------------------------------------------
+    def binarize(self, roi):
+        """Text pixels -> 255, background -> 0, at NORM_HEIGHT."""
+        gray = cv2.cvtColor(roi, cv2.COLOR_BGR2GRAY) if roi.ndim == 3 else roi
+        if self.invert:
+            gray = cv2.bitwise_not(gray)
+        scale = self.NORM_HEIGHT / gray.shape[0]
+        gray = cv2.resize(gray, (max(1, round(gray.shape[1] * scale)), self.NORM_HEIGHT), interpolation=cv2.INTER_AREA)
+        _, binary = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)
+        return binary
+
+    def segment(self, binary):
+        """Returns [(kind, glyph)] left to right, kind "glyph" or "." (glyph is None for dots)."""
+        cols = np.flatnonzero(binary.any(axis=0))
+        if cols.size == 0:
+            return []
+        # Runs of inked columns; gaps up to JOIN_GAP columns don't split a glyph
+        breaks = np.flatnonzero(np.diff(cols) > self.JOIN_GAP + 1)
+        starts = np.concatenate(([cols[0]], cols[breaks + 1]))
+        ends = np.concatenate((cols[breaks], [cols[-1]])) + 1
+
+        rows_ink = binary.any(axis=1)
+        text_rows = np.flatnonzero(rows_ink)
+        text_top, text_bottom = text_rows[0], text_rows[-1] + 1
+        text_height = text_bottom - text_top
+
+        parts = []
+        for x0, x1 in zip(starts, ends):
+            rows = np.flatnonzero(binary[:, x0:x1].any(axis=1))
+            y0, y1 = rows[0], rows[-1] + 1
+            if y1 - y0 < 0.35 * text_height:
+                # Short blob: a decimal point if it sits on the baseline, otherwise noise
+                if text_bottom - y1 < 0.25 * text_height:
+                    parts.append((".", None))
+                continue
+            parts.append(("glyph", binary[y0:y1, x0:x1]))
+        return parts
+
+    def vectorize(self, glyph):
+        vec = cv2.resize(glyph, self.TEMPLATE_SIZE, interpolation=cv2.INTER_AREA).astype(np.float32).ravel()
+        vec -= vec.mean()
+        norm = np.linalg.norm(vec)
+        return vec / norm if norm else vec
+
+    # --- learning / reading ------------------------------------------------
+    def learn(self, roi, text):
+        """Adds the glyphs of `roi`, which shows `text`. False if the segmentation doesn't line up with it."""
+        parts = self.segment(self.binarize(roi))
+        if [k if k == "." else "d" for k, _ in parts] != ["." if c == "." else "d" for c in text]:
+            return False
+        for (kind, glyph), char in zip(parts, text):
+            if kind != "glyph":
+                continue
+            if self.chars.count(char) >= self.MAX_SAMPLES:
+                continue
+            self.chars.append(char)
+            self.templates = np.vstack([self.templates, self.vectorize(glyph)])
+        return True
+
+    def read_text(self, roi):
+        """(text, lowest glyph score); text is None when there is nothing to read or no templates."""
+        if not self.chars:
+            return None, 0.0
+        parts = self.segment(self.binarize(roi))
+        glyphs = [g for kind, g in parts if kind == "glyph"]
+        if not glyphs:
+            return None, 0.0
+        scores = np.stack([self.vectorize(g) for g in glyphs]) @ self.templates.T
+        best = scores.argmax(axis=1)
+        decoded = iter(self.chars[i] for i in best)
+        text = "".join("." if kind == "." else next(decoded) for kind, _ in parts)
+        return text, float(scores[np.arange(len(glyphs)), best].min())
+
+    def read(self, roi):
+        text, score = self.read_text(roi)
+        if text is None or score < self.min_score:
+            return None
+        return parse_number(text)
+
+class FallbackRecognizer:
+    """Tries `primary` (fast) and only asks `fallback` (slow) when the primary is unsure."""
+
+    def __init__(self, primary, fallback):
+        self.primary = primary
+        self.fallback = fallback
+
+    def read(self, roi):
+        val = self.primary.read(roi)
+        return val if val is not None else self.fallback.read(roi)
+
+def build_recognizer(calibration_path, invert=False, engine=OCR_ENGINE):
+    """Recognizer for ROI mode per OCR_ENGINE (see CONFIGURATION)."""
+    path = glyphs_path(calibration_path)
+    tesseract = TesseractRecognizer(invert)
+    if engine == "tesseract" or (engine == "auto" and not os.path.exists(path)):
+        return tesseract
+    template = TemplateRecognizer.load(path, invert)
+    return template if engine == "template" else FallbackRecognizer(template, tesseract)
+
+# ROI recognizers of this OCR worker process, keyed by RoiOcr.key (see init_ocr_worker)
+_worker_recognizers = {}
+
+def init_ocr_worker(recognizers):
+    """Pool initializer: recognizers arrive once per worker instead of with every job."""
+    _worker_recognizers.update(recognizers or {})
+
+def ocr_pool(workers=OCR_WORKERS, ocr=None):
+    """
+    Process pool for OCR. Always spawned (the Windows default): forking a process that
+    already runs OpenCV / capture threads can crash the children. With a RoiOcr its
+    recognizer is installed in every worker up front.
+    """
+    recognizers = {ocr.key: ocr.recognizer} if isinstance(ocr, RoiOcr) else {}
+    return ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"),
+                               initializer=init_ocr_worker, initargs=(recognizers,))
+
+def run_ocr_job(ocr, frame):
+    """
+    Worker-side wrapper for one frame (or its ROI crops). Errors come back as plain
+    RuntimeErrors: some exceptions (pytesseract's) can't be unpickled in the parent,
+    which would otherwise break the whole pool.
+    """
+    try:
+        return ocr(frame)
+    except Exception as e:
+        raise RuntimeError(f"{type(e).__name__}: {e}") from None
+
+def record_stage(timings, stage, start):
+    """Adds the time since `start` to timings[stage] (a list of seconds); no-op without timings."""
+    if timings is not None:
+        timings.setdefault(stage, []).append(time.perf_counter() - start)
+
+class RoiOcr:
+    """
+    ROI pipeline for one burst frame: each calibrated rectangle is cropped and read as a
+    single number by the recognizer, so no label matching is involved.
+
+    Split so that only the crops (a few KB) cross the process boundary, not the frame:
+    prepare(frame) crops in the capturing process, the call reads the crops in the OCR
+    worker. The recognizer isn't pickled with the jobs either; workers get it from
+    init_ocr_worker, or load it once from the calibration's glyph file (`key` holds
+    build_recognizer's arguments), e.g. on a pool shared by several cameras.
+    """
+
+    def __init__(self, rois, recognizer, key):
+        self.rois = rois
+        self.recognizer = recognizer
+        self.key = key
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["recognizer"] = None
+        return state
+
+    def prepare(self, frame):
+        height, width = frame.shape[:2]
+        return {label: frame[y:y + h, x:x + w].copy() for label, (x, y, w, h) in self.rois.items()
+                if x + w <= width and y + h <= height}  # skip rectangles calibrated for a bigger frame
+
+    def _recognizer(self):
+        if self.recognizer is None:
+            self.recognizer = _worker_recognizers.get(self.key)
+            if self.recognizer is None:
+                self.recognizer = _worker_recognizers[self.key] = build_recognizer(*self.key)
+        return self.recognizer
+
+    def __call__(self, crops, timings=None):
+        recognizer = self._recognizer()
+        readings = {}
+        for label, crop in crops.items():
+            start = time.perf_counter()
+            val = recognizer.read(crop)
+            record_stage(timings, "recognize_roi", start)
+            if val is not None:
+                readings[label] = val
+        return readings
+
+def ocr_frame(frame, timings=None):
+    """
+    Full pipeline for one burst frame: preprocess -> Tesseract -> extract.
+    Runs inside the OCR worker processes, so it must stay a top-level function.
+    `timings` collects per-stage durations (in-process runs only, see replay()).
+    """
+    start = time.perf_counter()
+    processed = preprocess_frame(frame)
+    record_stage(timings, "preprocess", start)
+    start = time.perf_counter()
+    text = pytesseract.image_to_string(processed, config=TESSERACT_CONFIG)
+    record_stage(timings, "tesseract", start)
+    start = time.perf_counter()
+    readings = extract_readings(text)
+    record_stage(timings, "extract", start)
+    return readings
+
+class FrameGrabber(threading.Thread):
+    """
+    Capture side of the burst pipeline: reads `n_frames` frames from the camera
+    into a queue while the OCR workers are busy with earlier ones. Gives up after
+    `max_failed_reads` failed reads in a row; the queue always ends with None.
+    """
+
+    def __init__(self, cap, n_frames, max_failed_reads=GRAB_MAX_FAILED_READS, retry_delay=GRAB_RETRY_DELAY):
+        super().__init__(daemon=True)
+        self.cap = cap
+        self.n_frames = n_frames
+        self.max_failed_reads = max_failed_reads
+        self.retry_delay = retry_delay
+        self.frames = queue.Queue()
+        self.latest = None
+        self.stop_event = threading.Event()
+
+    def run(self):
+        captured = 0
+        failed = 0
+        try:
+            while captured < self.n_frames and not self.stop_event.is_set():
+                ret, fr = self.cap.read()
+                if not ret:
+                    if getattr(self.cap, "exhausted", False):
+                        break  # end of a recording (see RecordedFrames)
+                    failed += 1
+                    if failed >= self.max_failed_reads:
+                        print(f"   [WARN] Camera returned no frame {failed} times in a row, ending burst.")
+                        break
+                    self.stop_event.wait(self.retry_delay)
+                    continue
+                failed = 0
+                self.latest = fr
+                self.frames.put(fr)
+                captured += 1
+        except Exception as e:
+            print(f"   [WARN] Camera read failed, ending burst: {e}")
+        finally:
+            self.frames.put(None)  # end of burst
+
+    def stop(self):
+        self.stop_event.set()
+
+class FrameChangeDetector:
+    """
+    Cheap "did the display change?" check, about a millisecond per frame against
+    seconds of preprocess + Tesseract for a burst. The reference is the frame of the
+    last OCR (mark()), so slow drift still adds up to a change eventually.
+    """
+
+    def __init__(self, pixel_delta=CHANGE_PIXEL_DELTA, min_pixels=CHANGE_MIN_PIXELS,
+                 max_age=CHANGE_MAX_AGE, size=(320, 180)):
+        self.pixel_delta = pixel_delta
+        self.min_pixels = min_pixels
+        self.max_age = max_age
+        self.size = size
+        self.reference = None
+        self.marked_at = 0.0
+
+    def thumbnail(self, frame):
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) if frame.ndim == 3 else frame
+        small = cv2.resize(gray, self.size, interpolation=cv2.INTER_AREA)
+        # Blur so sensor noise and slight flicker don't count as a change
+        return cv2.GaussianBlur(small, (3, 3), 0)
+
+    def changed_pixels(self, frame):
+        """Number of thumbnail pixels that differ from the reference by more than pixel_delta."""
+        if self.reference is None:
+            return self.size[0] * self.size[1]
+        diff = cv2.absdiff(self.thumbnail(frame), self.reference)
+        return int(cv2.countNonZero(cv2.threshold(diff, self.pixel_delta, 255, cv2.THRESH_BINARY)[1]))
+
+    def changed(self, frame):
+        if time.time() - self.marked_at > self.max_age:
+            return True
+        return self.changed_pixels(frame) >= self.min_pixels
+
+    def mark(self, frame):
+        self.reference = self.thumbnail(frame)
+        self.marked_at = time.time()
+
+def agreeing_cluster(vals, abs_tol=CONSENSUS_ABS_TOL, rel_tol=CONSENSUS_REL_TOL):
+    """Largest group of readings that agree within tolerance (sorted list, possibly empty)."""
+    ordered = sorted(vals)
+    best = []
+    start = 0
+    for end in range(len(ordered)):
+        while ordered[end] - ordered[start] > max(abs_tol, rel_tol * abs(ordered[start])):
+            start += 1
+        if end - start + 1 > len(best):
+            best = ordered[start:end + 1]
+    return best
+
+def readings_needed(burst_readings, k=CONSENSUS_K):
+    """How many more agreeing readings the least settled label needs (0 = settled)."""
+    needed = 0
+    for vals in burst_readings.values():
+        needed = max(needed, k - len(agreeing_cluster(vals)))
+    return needed
+
+def burst_limit(burst_readings, n_frames, max_frames, k=CONSENSUS_K):
+    """
+    Frames the burst may use so far: max_frames while a label has conflicting readings
+    (not all within tolerance, no k agreeing yet), n_frames + BURST_SHORT_EXTRA while a
+    label only has too few (all agreeing), n_frames otherwise.
+    """
+    limit = n_frames
+    for vals in burst_readings.values():
+        cluster = len(agreeing_cluster(vals))
+        if cluster >= k:
+            continue
+        if cluster < len(vals):
+            return max_frames
+        if vals:
+            limit = min(max_frames, n_frames + BURST_SHORT_EXTRA)
+    return limit
+
+def run_burst(cap, pool, n_frames=BURST_FRAMES, max_frames=BURST_MAX_FRAMES, on_wait=None, workers=OCR_WORKERS,
+              ocr=ocr_frame, labels=LABELS, verbose=True, prepare=None):
+    """
+    Pipelined, adaptive burst: a capture thread fills a queue and frames are handed to
+    the OCR process pool, never more in flight than workers or than the readings still
+    needed for consensus. Stops as soon as every label has CONSENSUS_K agreeing
+    readings; a label with no reading yet keeps it going up to `n_frames`, and past
+    `n_frames` it only continues while some label needs more (see burst_limit).
+    Returns ({label: [values...]}, frames OCR'd). `on_wait(frame)` is called while
+    waiting so the preview keeps updating. `ocr` is the per-frame function run in the
+    pool (ocr_frame or a RoiOcr); `prepare(frame)` (default: ocr.prepare, if any) runs
+    here first and its result is what gets sent to the pool.
+    """
+    prepare = prepare or getattr(ocr, "prepare", None)
+    burst_readings = {k: [] for k in labels}
+    grabber = FrameGrabber(cap, max_frames)
+    grabber.start()
+
+    pending = set()
+    capture_done = False
+    submitted = 0
+    scanned = 0
+    while True:
+        needed = readings_needed(burst_readings)
+        limit = burst_limit(burst_readings, n_frames, max_frames)
+        if needed == 0 or scanned >= limit or (capture_done and not pending):
+            break
+
+        # Keep workers busy, but don't OCR frames the vote can't need yet
+        while not capture_done and len(pending) < min(workers, needed) and submitted < limit:
             try:
-                val = float(match.group(1))
-                return val
-            except ValueError:
+                fr = grabber.frames.get(timeout=0.03)
+            except queue.Empty:
+                break
+            if fr is None:
+                capture_done = True
+            else:
+                pending.add(pool.submit(run_ocr_job, ocr, prepare(fr) if prepare else fr))
+                submitted += 1
+
+        if not pending:
+            if submitted >= limit:
+                break
+            continue
+
+        done, pending = wait(pending, timeout=0.03, return_when=FIRST_COMPLETED)
+        for fut in done:
+            scanned += 1
+            try:
+                readings = fut.result()
+            except Exception as e:
+                print(f"   [Frame {scanned}] OCR failed: {e}")
+                continue
+            for label_key, val in readings.items():
+                burst_readings[label_key].append(val)
+            if verbose:
+                print(f"   [Frame {scanned}] Scanned.")
+
+        if on_wait and grabber.latest is not None:
+            on_wait(grabber.latest)
+
+    # Early exit: stop capturing and drop OCR jobs that haven't started
+    grabber.stop()
+    for fut in pending:
+        fut.cancel()
+    grabber.join()
+    return burst_readings, scanned
+
+def vote(burst_readings, verbose=True):
+    """
+    Voted value per label: median of the largest agreeing group of readings. Labels
+    with no reading are left out of the values (they'd otherwise be stored as 0).
+    Confidence: share of that label's readings in the group (0.0 when nothing was read).
+    """
+    final_data = {}
+    confidence = {}
+    for k, vals in burst_readings.items():
+        if not vals:
+            if verbose:
+                print(f"   [WARN] {k}: No valid data found in burst.")
+            confidence[k] = 0.0
+        else:
+            # Median is safer for removing outliers than mean
+            cluster = agreeing_cluster(vals)
+            final_val = statistics.median(cluster)
+            final_data[k] = final_val
+            confidence[k] = round(len(cluster) / len(vals), 2)
+            if verbose:
+                print(f"   [OK] {k}: {vals} -> Voted: {final_val} (confidence {confidence[k]})")
+    return final_data, confidence
+
+def select_pipeline(frame_size, calibration_file=CALIBRATION_FILE, mode=OCR_MODE, engine=OCR_ENGINE):
+    """
+    Per-frame OCR function for OCR_MODE: (ocr, labels, rois or None, description).
+    `ocr` is picklable (it runs in the worker processes) and takes a `timings=` keyword.
+    """
+    if mode == "roi" or (mode == "auto" and os.path.exists(calibration_file)):
+        rois, invert = load_calibration(calibration_file, frame_size)
+        recognizer = build_recognizer(calibration_file, invert, engine)
+        ocr = RoiOcr(rois, recognizer, (calibration_file, invert, engine))
+        return ocr, list(rois), rois, (f"ROI Mode: {', '.join(rois)} from {calibration_file}, "
+                                       f"{type(recognizer).__name__}")
+    return ocr_frame, list(LABELS), None, "Full-Screen Mode"
+
+# ---------------------------------------------------------
+# HEADLESS REPLAY
+# ---------------------------------------------------------
+class RecordedFrames:
+    """
+    cv2.VideoCapture-like reader over a video file or a directory of images (sorted by
+    name), for running the pipeline without a camera. `position` is the index of the
+    last frame returned; `exhausted` turns True at the end so FrameGrabber stops.
+    seek() makes replays deterministic (see replay()).
+    """
+
+    IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".bmp")
+
+    def __init__(self, source):
+        self.position = -1
+        self.exhausted = False
+        if os.path.isdir(source):
+            self.names = sorted(n for n in os.listdir(source) if n.lower().endswith(self.IMAGE_EXTENSIONS))
+            self.paths = [os.path.join(source, n) for n in self.names]
+            self._index = {n: i for i, n in enumerate(self.names)}
+            self.video = None
+        else:
+            self.video = cv2.VideoCapture(source)
+            if not self.video.isOpened():
+                raise ValueError(f"Can't open {source}")
+            self.names = None
+        self.count = len(self.paths) if self.video is None else int(self.video.get(cv2.CAP_PROP_FRAME_COUNT))
+        ret, first = self._read_at_start()
+        if not ret:
+            raise ValueError(f"No frames in {source}")
+        self.frame_size = (first.shape[1], first.shape[0])
+
+    def _read_at_start(self):
+        if self.video is None:
+            return (True, cv2.imread(self.paths[0])) if self.paths else (False, None)
+        ret, frame = self.video.read()
+        self.video.set(cv2.CAP_PROP_POS_FRAMES, 0)
+        return ret, frame
+
+    def read(self):
+        if self.exhausted:
+            return False, None
+        if self.video is None:
+            if self.position + 1 >= len(self.paths):
+                self.exhausted = True
+                return False, None
+            frame = cv2.imread(self.paths[self.position + 1])
+            ret = frame is not None
+        else:
+            ret, frame = self.video.read()
+            if not ret:
+                self.exhausted = True
+                return False, None
+        self.position += 1
+        return ret, frame
+
+    def seek(self, index):
+        """Next read() returns frame `index`."""
+        if self.video is not None:
+            self.video.set(cv2.CAP_PROP_POS_FRAMES, index)
+        self.position = index - 1
+        self.exhausted = index >= self.count
+
+    def frame_index(self, key):
+        """Frame index for a ground-truth key: file name for image directories, index for videos."""
+        if self.names is not None:
+            return self._index.get(key)
+        return int(key) if key.isdigit() else None
+
+    def release(self):
+        if self.video is not None:
+            self.video.release()
+
+class InlineExecutor:
+    """Executor that runs each job at submit() in the calling process (replay stage timings)."""
+
+    def submit(self, fn, *args, **kwargs):
+        future = Future()
+        try:
+            future.set_result(fn(*args, **kwargs))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+
+    def shutdown(self, **kwargs):
+        pass
+
+def expected_values(truth, frames, index):
+    """
+    Ground truth for a burst starting at frame `index`. The truth file maps frame keys
+    (file name or frame index) to the values on screen from that frame on, so the
+    latest entry at or before `index` applies.
+    """
+    best_pos, best = -1, None
+    for key, values in truth.items():
+        pos = frames.frame_index(key)
+        if pos is not None and best_pos < pos <= index:
+            best_pos, best = pos, values
+    return best
+
+def replay(source, truth_path=None, workers=0, calibration_file=CALIBRATION_FILE, mode=OCR_MODE, stride=0,
+           report_path=None, engine=OCR_ENGINE):
+    """
+    Headless run of the whole burst pipeline (preprocess -> OCR -> vote) over a recording.
+    Each burst starts right after the frames the previous one OCR'd, plus `stride` skipped
+    frames, so results don't depend on how far the capture thread read ahead.
+    workers=0 runs OCR in this process and reports per-stage timings; workers>0 uses the
+    process pool, as live.
+    Prints (and optionally writes as JSON) throughput, stage timings and accuracy.
+    """
+    frames = RecordedFrames(source)
+    truth = {}
+    if truth_path:
+        with open(truth_path, encoding="utf-8") as f:
+            truth = {str(k): v for k, v in json.load(f).items()}
+    ocr, labels, _, description = select_pipeline(frames.frame_size, calibration_file, mode, engine)
+    prepare = getattr(ocr, "prepare", None)
+    timings = {}
+    if workers:
+        pool = ocr_pool(workers, ocr)
+        # Start the workers before timing: live, the pool outlives every burst
+        list(pool.map(abs, range(workers)))
+    else:
+        pool = InlineExecutor()
+        ocr = partial(ocr, timings=timings)
+    print(f"[REPLAY] {source} ({frames.frame_size[0]}x{frames.frame_size[1]}), {description}, "
+          f"{workers or 'inline'} workers")
+
+    bursts = []
+    totals = {"correct": 0, "compared": 0}
+    per_label = {label: {"correct": 0, "compared": 0} for label in labels}
+    started = time.perf_counter()
+    while not frames.exhausted:
+        first = frames.position + 1
+        burst_start = time.perf_counter()
+        readings, scanned = run_burst(frames, pool, ocr=ocr, labels=labels, workers=max(workers, 1), verbose=False,
+                                      prepare=prepare)
+        if not scanned:
+            break
+        frames.seek(first + scanned + stride)
+        start = time.perf_counter()
+        final_data, confidence = vote(readings, verbose=False)
+        record_stage(timings, "vote", start)
+        bursts.append({"first_frame": first, "frames": scanned, "seconds": time.perf_counter() - burst_start,
+                       "values": final_data, "confidence": confidence})
+
+        expected = expected_values(truth, frames, first) if truth else None
+        for label, want in (expected or {}).items():
+            if label not in per_label:
                 continue
-    return None
+            ok = label in final_data and abs(final_data[label] - float(want)) <= CONSENSUS_ABS_TOL / 2
+            per_label[label]["compared"] += 1
+            per_label[label]["correct"] += ok
+            totals["compared"] += 1
+            totals["correct"] += ok
+    elapsed = time.perf_counter() - started
+    pool.shutdown(cancel_futures=True)
+    frames.release()
+
+    ocr_frames = sum(b["frames"] for b in bursts)
+    burst_ms = sorted(b["seconds"] * 1000 for b in bursts)
+    report = {
+        "source": source,
+        "pipeline": description,
+        "workers": workers,
+        "frames_covered": min(frames.count, frames.position + 1),
+        "bursts": len(bursts),
+        "ocr_frames": ocr_frames,
+        "ocr_frames_per_second": round(ocr_frames / elapsed, 2) if elapsed else None,
+        "burst_ms_p50": round(statistics.median(burst_ms), 2) if burst_ms else None,
+        "burst_ms_max": round(burst_ms[-1], 2) if burst_ms else None,
+        "stage_ms_mean": {stage: round(1000 * sum(v) / len(v), 3) for stage, v in timings.items()},
+        "accuracy": round(totals["correct"] / totals["compared"], 4) if totals["compared"] else None,
+        "accuracy_per_label": {label: round(c["correct"] / c["compared"], 4)
+                               for label, c in per_label.items() if c["compared"]},
+        "bursts_detail": bursts,
+    }
+
+    print(f"   {report['bursts']} bursts, {ocr_frames} frames OCR'd, {report['frames_covered']} covered "
+          f"in {elapsed:.2f}s ({report['ocr_frames_per_second']} OCR frames/s)")
+    print(f"   burst latency p50 {report['burst_ms_p50']} ms, max {report['burst_ms_max']} ms")
+    for stage, ms in report["stage_ms_mean"].items():
+        print(f"   stage {stage:14s}: {ms:9.3f} ms mean")
+    if report["accuracy"] is not None:
+        print(f"   accuracy {report['accuracy']:.1%} ({totals['correct']}/{totals['compared']} voted values) "
+              + " ".join(f"{k}={v:.0%}" for k, v in report["accuracy_per_label"].items()))
+    if report_path:
+        with open(report_path, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"   report written to {report_path}")
+    return report
 
 # ---------------------------------------------------------
 # OCR & LOGIC
 # ---------------------------------------------------------
-def main():
+def main(calibrate_only=False):
     cap = cv2.VideoCapture(0, cv2.CAP_DSHOW)
     cap.set(cv2.CAP_PROP_FRAME_WIDTH, 1280) # Try HD if available
     cap.set(cv2.CAP_PROP_FRAME_HEIGHT, 720)
@@ -117,23 +1177,29 @@ def main():
         print("[ERROR] Could not open camera.")
         return
 
-    print("[SUCCESS] Camera started (Full-Screen Mode).")
+    if calibrate_only:
+        calibrate(cap, CALIBRATION_FILE)
+        cap.release()
+        return
+
+    frame_size = (int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)))
+    ocr, labels, rois, description = select_pipeline(frame_size)
+    print(f"[SUCCESS] Camera started ({description}).")
     print("PRESS 's' TO SAVE DATA MANUALLY")
     print("PRESS 'q' TO QUIT")
     
     last_save_time = time.time()
     SAVE_INTERVAL = 10  # 10 seconds for "Live" feel
-    
-    # regex patterns for each pollutant (list allows aliases)
-    LABELS = {
-        "PM2.5": [r"PM\s*2\.?5", r"PM25"],
-        "PM10":  [r"PM\s*10", r"PM1O"],
-        "CO":    [r"CO", r"C0"],
-        "NO2":   [r"NO\s*2", r"N02"],
-        "O3":    [r"O\s*3", r"03"],
-        "SO2":   [r"SO\s*2", r"S02"]
-    }
 
+    uploader.start()
+
+    # OCR worker processes live for the whole session (spawning per burst would cost more than it saves)
+    pool = ocr_pool(OCR_WORKERS, ocr)
+    print(f"[OCR] {OCR_WORKERS} OCR worker processes")
+
+    detector = FrameChangeDetector()
+    last_voted = None  # (final_data, confidence) of the last real OCR
+    
     while True:
         try:
             ret, frame = cap.read()
@@ -143,6 +1209,9 @@ def main():
 
             # Display Feed
             display_frame = frame.copy()
+            for label, (x, y, w, h) in (rois or {}).items():
+                cv2.rectangle(display_frame, (x, y), (x + w, y + h), (0, 255, 0), 2)
+                cv2.putText(display_frame, label, (x, y - 5), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 2)
             
             # Show status info
             time_left = int(SAVE_INTERVAL - (time.time() - last_save_time))
@@ -165,83 +1234,68 @@ def main():
             elif key == ord('q'):
                 break
 
+            # Unchanged display: no need to OCR it again
+            if should_save and last_voted and not detector.changed(frame):
+                if UNCHANGED_ACTION == "resend":
+                    print("[SKIP] Display unchanged, re-sending last values.")
+                    save_to_db(*last_voted)
+                else:
+                    print("[SKIP] Display unchanged, nothing sent.")
+                last_save_time = time.time()
+                should_save = False
+
             # BURST CAPTURE LOGIC
             if should_save:
-                print("PROCESSING BURST (Full Screen)...")
+                print(f"PROCESSING BURST ({'ROI' if rois else 'Full Screen'})...")
                 cv2.putText(display_frame, "ANALYZING...", (200, 360), 
                            cv2.FONT_HERSHEY_SIMPLEX, 1.5, (0, 0, 255), 3)
                 cv2.imshow("AQI Monitor - Full Screen", display_frame)
                 cv2.waitKey(1) # Force UI update
 
-                # Buffer for burst readings
-                burst_readings = {k: [] for k in LABELS.keys()}
-                
-                # Take 10 frames for stability (increased from 5 for better chance)
-                for i in range(10): 
-                    ret, fr = cap.read()
-                    if not ret: continue
-                    
-                    # Preprocess
-                    processed = preprocess_frame(fr)
-                    
-                    # OCR Full Frame
-                    # EXPANDED WHITELIST: Include lowercase a-z so 'g' isn't read as '9'
-                    # Also include / and ³ (if possible, though standard chars often suffice)
-                    config = r"--oem 3 --psm 6 -c tessedit_char_whitelist=0123456789.ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz%:-/"
-                    text = pytesseract.image_to_string(processed, config=config)
-                    
-                    # Extract values
-                    for label_key, patterns in LABELS.items():
-                        # REGEX UPDATE:
-                        # Look for Label -> Separator -> Number
-                        # Stop at space or unit start (like u, g, p) to avoid merging '63g' -> '639'
-                        # Use word boundary \b or explicit space handling
-                        for pat in patterns:
-                            # Match: Label + optional sep + (GROUP: number) + optional space + unit or end
-                            # We don't strictly match unit, just ensuring we don't grab it as part of number
-                            regex = rf"{pat}[:\-\s]+([0-9]+\.?[0-9]*)"
-                            match = re.search(regex, text, re.IGNORECASE)
-                            if match:
-                                try:
-                                    val_str = match.group(1)
-                                    # Double check: if it ends with '9' and text had 'g' next to it?
-                                    # Hard to know in regex alone, but the whitelist fix should solve 80%
-                                    val = float(val_str)
-                                    
-                                    # Sanity Bounds Check (Heuristic)
-                                    # PM2.5 > 500 is rare, detected 639 is suspicious if previous was 63
-                                    if label_key == "PM2.5" and val > 600: continue 
-                                    
-                                    burst_readings[label_key].append(val)
-                                    break # Found a match for this label, stop checking logic patterns
-                                except ValueError:
-                                    continue
-                    
-                    print(f"   [Frame {i+1}/10] Scanned.")
-                    # Optional: time.sleep(0.1)
-
-                # Aggregate Results (Median/Mode)
-                final_data = {}
-                for k, vals in burst_readings.items():
-                    if not vals:
-                        print(f"   [WARN] {k}: No valid data found in burst.")
-                        final_data[k] = 0.0 # Default fallback
-                    else:
-                        # Median is safer for removing outliers than mean
-                        final_val = statistics.median(vals)
-                        final_data[k] = final_val
-                        print(f"   [OK] {k}: {vals} -> Voted: {final_val}")
+                def show_preview(fr):
+                    preview = fr.copy()
+                    cv2.putText(preview, "ANALYZING...", (200, 360), 
+                               cv2.FONT_HERSHEY_SIMPLEX, 1.5, (0, 0, 255), 3)
+                    cv2.imshow("AQI Monitor - Full Screen", preview)
+                    cv2.waitKey(1)
+
+                burst_start = time.time()
+                burst_readings, frames_used = run_burst(cap, pool, on_wait=show_preview, ocr=ocr, labels=labels)
+                print(f"   Burst OCR: {frames_used} frames in {time.time() - burst_start:.2f}s ({OCR_WORKERS} workers)")
+
+                final_data, confidence = vote(burst_readings)
+                detector.mark(frame)
+                last_voted = (final_data, confidence)
 
                 # Save
-                save_to_db(final_data)
+                save_to_db(final_data, confidence)
                 last_save_time = time.time()
 
         except Exception as e:
             print(f"⚠️ Error loop: {e}")
             time.sleep(1)
 
+    pool.shutdown(cancel_futures=True)
+    uploader.stop()
     cap.release()
     cv2.destroyAllWindows()
 
 if __name__ == "__main__":
-    main()
+    # python ocr_ingest.py                 -> live camera
+    # python ocr_ingest.py calibrate       -> draw the value rectangles and save the calibration file
+    # python ocr_ingest.py replay SOURCE   -> headless run over a video / image directory (see replay())
+    if sys.argv[1:2] == ["replay"]:
+        import argparse
+        parser = argparse.ArgumentParser(prog="ocr_ingest.py replay", description="Headless OCR replay and benchmark")
+        parser.add_argument("source", help="video file or directory of frames")
+        parser.add_argument("--truth", help="JSON: frame name/index -> {label: value shown from that frame on}")
+        parser.add_argument("--workers", type=int, default=0, help="OCR processes (0 = inline, with stage timings)")
+        parser.add_argument("--calibration", default=CALIBRATION_FILE)
+        parser.add_argument("--mode", default=OCR_MODE, choices=["auto", "roi", "full"])
+        parser.add_argument("--engine", default=OCR_ENGINE, choices=["auto", "template", "tesseract"])
+        parser.add_argument("--stride", type=int, default=0, help="frames skipped between bursts")
+        parser.add_argument("--report", help="write the report as JSON here")
+        args = parser.parse_args(sys.argv[2:])
+        replay(args.source, args.truth, args.workers, args.calibration, args.mode, args.stride, args.report, args.engine)
+    else:
+        main(calibrate_only=sys.argv[1:2] == ["calibrate"])
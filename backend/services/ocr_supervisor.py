@@ -0,0 +1,385 @@
+"""
+Multi-camera OCR supervisor: one process (one OpenCV, one OCR worker pool, one uploader)
+serving every monitor display on an edge box.
+
+    python ocr_supervisor.py [cameras.json] [--workers N] [--status-interval S]
+
+cameras.json (default services/cameras.json, env OCR_CAMERAS) lists the cameras, see
+cameras.example.json:
+
+    [{"device_id": "DEV_CAM_01", "source": 0},
+     {"device_id": "DEV_CAM_02", "source": "rtsp://10.0.0.12/stream1", "interval": 30,
+      "calibration": "calibration/DEV_CAM_02.json", "mode": "roi", "engine": "template"}]
+
+`source` is a camera index, a stream URL, or a video file / frame directory (headless
+runs, see ocr_ingest.RecordedFrames). Optional per camera: calibration (default
+calibration/<device_id>.json), mode, engine, interval (seconds between readings, 0 =
+back to back), width / height.
+
+Each camera gets a thread running the ocr_ingest loop (change check -> burst -> vote ->
+upload). Burst frames of all cameras go through a FairScheduler in front of the shared
+process pool, which hands free workers to the cameras round-robin, so one camera's burst
+can't starve the others. Capture, OCR and upload stages are timed per camera.
+"""
+import argparse
+import json
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import CancelledError, Future
+from functools import partial
+
+import cv2
+import ocr_ingest
+from ocr_ingest import (
+    CALIBRATION_DIR, DEVICE_ID_CAM, OCR_ENGINE, OCR_MODE, OCR_WORKERS, UNCHANGED_ACTION,
+    FrameChangeDetector, RecordedFrames, ocr_pool, run_burst, save_to_db, select_pipeline, vote,
+)
+
+# ---------------------------------------------------------
+# CONFIGURATION
+# ---------------------------------------------------------
+CAMERAS_FILE = os.getenv("OCR_CAMERAS", os.path.join(os.path.dirname(os.path.abspath(__file__)), "cameras.json"))
+SAVE_INTERVAL = 10          # default seconds between readings per camera
+IDLE_GRAB_INTERVAL = 0.2    # live cameras: drop buffered frames this often between bursts
+STATUS_INTERVAL = int(os.getenv("OCR_STATUS_INTERVAL", "60"))  # seconds between metrics printouts
+
+def load_cameras(path=CAMERAS_FILE):
+    """Camera configs from `path`; a single DEVICE_ID_CAM on camera 0 if the file doesn't exist."""
+    if not os.path.exists(path):
+        print(f"[WARN] {path} not found, using {DEVICE_ID_CAM} on camera 0")
+        return [{"device_id": DEVICE_ID_CAM, "source": 0}]
+    with open(path) as f:
+        cameras = json.load(f)
+    base = os.path.dirname(os.path.abspath(path))
+    seen = set()
+    for cam in cameras:
+        if "device_id" not in cam or "source" not in cam:
+            raise ValueError(f"{path}: every camera needs a device_id and a source")
+        if cam["device_id"] in seen:
+            raise ValueError(f"{path}: duplicate device_id {cam['device_id']}")
+        seen.add(cam["device_id"])
+        # Relative calibration paths / recordings are relative to the config file
+        for key in ("calibration", "source"):
+            value = cam.get(key)
+            if isinstance(value, str) and "://" not in value and not os.path.isabs(value):
+                candidate = os.path.join(base, value)
+                if key == "calibration" or os.path.exists(candidate):
+                    cam[key] = candidate
+    return cameras
+
+class StageMetrics:
+    """Per-camera stage timings (count, total, max, recent p50/p95) and counters. Thread-safe."""
+
+    def __init__(self, window=200):
+        self.lock = threading.Lock()
+        self.window = window
+        self.stages = {}
+        self.counters = {}
+
+    def record(self, stage, seconds):
+        with self.lock:
+            s = self.stages.get(stage)
+            if s is None:
+                s = self.stages[stage] = {"count": 0, "total": 0.0, "max": 0.0, "recent": deque(maxlen=self.window)}
+            s["count"] += 1
+            s["total"] += seconds
+            s["max"] = max(s["max"], seconds)
+            s["recent"].append(seconds)
+
+    def count(self, counter, n=1):
+        with self.lock:
+            self.counters[counter] = self.counters.get(counter, 0) + n
+
+    def metrics(self):
+        with self.lock:
+            stages = {}
+            for stage, s in self.stages.items():
+                recent = sorted(s["recent"])
+                stages[stage] = {
+                    "count": s["count"],
+                    "seconds_total": round(s["total"], 6),
+                    "seconds_max": round(s["max"], 6),
+                    "seconds_p50": round(recent[len(recent) // 2], 6),
+                    "seconds_p95": round(recent[max(0, int(len(recent) * 0.95) - 1)], 6),
+                }
+            return {"stages": stages, "counters": dict(self.counters)}
+
+class FairScheduler:
+    """
+    Front of the shared OCR process pool. Jobs queue per camera and at most `slots` are in
+    the pool at once; a free slot goes to the next camera (round-robin) that has work queued.
+    The pool itself is FIFO, so without this a 20-frame burst would hold every worker while
+    the other cameras wait. Queue wait and OCR time are recorded in each camera's metrics.
+    """
+
+    def __init__(self, pool, slots):
+        self.pool = pool
+        self.slots = slots
+        self.lock = threading.Lock()
+        self.queues = {}       # camera -> deque of (future, fn, args, queued_at)
+        self.turns = deque()   # cameras with queued jobs, in round-robin order
+        self.running = 0
+        self.metrics = {}      # camera -> StageMetrics
+
+    def client(self, camera, metrics):
+        """Executor-like view for one camera (what run_burst expects as `pool`)."""
+        self.metrics[camera] = metrics
+        return CameraExecutor(self, camera)
+
+    def submit(self, camera, fn, *args):
+        future = Future()
+        with self.lock:
+            jobs = self.queues.setdefault(camera, deque())
+            if not jobs:
+                self.turns.append(camera)
+            jobs.append((future, fn, args, time.perf_counter()))
+        self._dispatch()
+        return future
+
+    def _dispatch(self):
+        # Pick jobs under the lock, submit outside it: a job that finishes immediately
+        # runs _finished (and _dispatch again) from inside pool.submit
+        while True:
+            with self.lock:
+                if self.running >= self.slots or not self.turns:
+                    return
+                camera = self.turns.popleft()
+                jobs = self.queues[camera]
+                future, fn, args, queued_at = jobs.popleft()
+                if jobs:
+                    self.turns.append(camera)
+                if not future.set_running_or_notify_cancel():
+                    continue  # cancelled by run_burst while still queued
+                self.running += 1
+            started = time.perf_counter()
+            self.metrics[camera].record("ocr_wait", started - queued_at)
+            try:
+                job = self.pool.submit(fn, *args)
+            except Exception as e:
+                with self.lock:
+                    self.running -= 1
+                future.set_exception(e)
+                continue
+            job.add_done_callback(partial(self._finished, camera, future, started))
+
+    def _finished(self, camera, future, started, job):
+        with self.lock:
+            self.running -= 1
+        self.metrics[camera].record("ocr", time.perf_counter() - started)
+        if job.cancelled():  # pool shut down
+            future.set_exception(CancelledError())
+            return
+        error = job.exception()
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(job.result())
+        self._dispatch()
+
+    def queued(self):
+        with self.lock:
+            return {camera: len(jobs) for camera, jobs in self.queues.items()}
+
+class CameraExecutor:
+    def __init__(self, scheduler, camera):
+        self.scheduler = scheduler
+        self.camera = camera
+
+    def submit(self, fn, *args):
+        return self.scheduler.submit(self.camera, fn, *args)
+
+def open_capture(cam):
+    """cv2.VideoCapture for a camera index / stream URL, RecordedFrames for a file or directory."""
+    source = cam["source"]
+    if isinstance(source, str) and os.path.exists(source):
+        return RecordedFrames(source)
+    if isinstance(source, int):
+        cap = cv2.VideoCapture(source, cv2.CAP_DSHOW if os.name == "nt" else cv2.CAP_ANY)
+    else:
+        cap = cv2.VideoCapture(source)
+    cap.set(cv2.CAP_PROP_FRAME_WIDTH, cam.get("width", 1280))
+    cap.set(cv2.CAP_PROP_FRAME_HEIGHT, cam.get("height", 720))
+    return cap
+
+class CameraWorker(threading.Thread):
+    """One display: the ocr_ingest main loop without the preview window."""
+
+    def __init__(self, cam, scheduler, stop_event):
+        super().__init__(daemon=True, name=cam["device_id"])
+        self.cam = cam
+        self.device_id = cam["device_id"]
+        self.interval = cam.get("interval", SAVE_INTERVAL)
+        self.stop_event = stop_event
+        self.metrics = StageMetrics()
+        self.pool = scheduler.client(self.device_id, self.metrics)
+        self.workers = scheduler.slots
+        self.status = "starting"
+
+    def log(self, message):
+        print(f"[{self.device_id}] {message}")
+
+    def run(self):
+        try:
+            self.loop()
+        except Exception as e:
+            self.status = f"failed: {e}"
+            self.log(f"[ERROR] Camera stopped: {e}")
+
+    def loop(self):
+        cap = open_capture(self.cam)
+        if not isinstance(cap, RecordedFrames) and not cap.isOpened():
+            raise RuntimeError(f"could not open camera {self.cam['source']!r}")
+        if isinstance(cap, RecordedFrames):
+            frame_size = cap.frame_size
+        else:
+            frame_size = (int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)))
+        calibration = self.cam.get("calibration", os.path.join(CALIBRATION_DIR, f"{self.device_id}.json"))
+        ocr, labels, rois, description = select_pipeline(frame_size, calibration, self.cam.get("mode", OCR_MODE),
+                                                         self.cam.get("engine", OCR_ENGINE))
+        self.log(f"[SUCCESS] Camera started ({description}).")
+        self.status = "running"
+
+        detector = FrameChangeDetector()
+        last_voted = None
+        last_save_time = 0.0
+        try:
+            while not self.stop_event.is_set():
+                # Between readings only keep the driver's buffer fresh (grab doesn't decode)
+                if time.time() - last_save_time < self.interval:
+                    if hasattr(cap, "grab"):
+                        cap.grab()
+                    self.stop_event.wait(IDLE_GRAB_INTERVAL)
+                    continue
+
+                start = time.perf_counter()
+                ret, frame = cap.read()
+                self.metrics.record("capture", time.perf_counter() - start)
+                if not ret:
+                    if getattr(cap, "exhausted", False):
+                        self.log("End of recording.")
+                        break
+                    self.metrics.count("capture_failures")
+                    self.stop_event.wait(1)
+                    continue
+                last_save_time = time.time()
+
+                start = time.perf_counter()
+                unchanged = last_voted is not None and not detector.changed(frame)
+                self.metrics.record("change_check", time.perf_counter() - start)
+                if unchanged:
+                    self.metrics.count("unchanged")
+                    if UNCHANGED_ACTION == "resend":
+                        save_to_db(*last_voted, device_id=self.device_id)
+                    continue
+
+                start = time.perf_counter()
+                burst_readings, frames_used = run_burst(cap, self.pool, workers=self.workers, ocr=ocr,
+                                                        labels=labels, verbose=False)
+                self.metrics.record("burst", time.perf_counter() - start)
+                self.metrics.count("bursts")
+                self.metrics.count("frames_ocrd", frames_used)
+
+                start = time.perf_counter()
+                final_data, confidence = vote(burst_readings, verbose=False)
+                self.metrics.record("vote", time.perf_counter() - start)
+                detector.mark(frame)
+                last_voted = (final_data, confidence)
+                self.log(f"Burst: {frames_used} frames -> {final_data}")
+                save_to_db(final_data, confidence, device_id=self.device_id)
+        finally:
+            cap.release()
+            if self.status == "running":
+                self.status = "stopped"
+
+class Supervisor:
+    """Starts a CameraWorker per camera on one shared pool and uploader; collects their metrics."""
+
+    def __init__(self, cameras, workers=OCR_WORKERS, pool=None):
+        self.cameras = cameras
+        self.workers = workers
+        self.pool = pool or ocr_pool(workers)
+        self.scheduler = FairScheduler(self.pool, workers)
+        self.stop_event = threading.Event()
+        self.cameras_by_id = {}
+        self.threads = [CameraWorker(cam, self.scheduler, self.stop_event) for cam in cameras]
+        for t in self.threads:
+            self.cameras_by_id[t.device_id] = t
+        self.started_at = None
+
+    def record_upload(self, payload, result, seconds):
+        """Uploader callback (uploader thread): upload stage per camera."""
+        worker = self.cameras_by_id.get(payload.get("device_id"))
+        if worker is None:
+            return
+        if seconds:  # 0 = spooled without trying, the link is down
+            worker.metrics.record("upload", seconds)
+        worker.metrics.count({"ok": "uploaded", "retry": "spooled", "reject": "rejected"}.get(result, result))
+
+    def start(self):
+        self.started_at = time.time()
+        ocr_ingest.uploader.on_result = self.record_upload
+        ocr_ingest.uploader.start()
+        print(f"[OCR] {len(self.threads)} cameras on {self.workers} shared OCR worker processes")
+        for t in self.threads:
+            t.start()
+
+    def running(self):
+        return any(t.is_alive() for t in self.threads)
+
+    def stop(self):
+        self.stop_event.set()
+        for t in self.threads:
+            t.join()
+        self.pool.shutdown(cancel_futures=True)
+        ocr_ingest.uploader.stop()
+
+    def metrics(self):
+        queued = self.scheduler.queued()
+        elapsed = time.time() - self.started_at if self.started_at else 0.0
+        return {
+            "workers": self.workers,
+            "uptime_seconds": round(elapsed, 1),
+            "cameras": {
+                t.device_id: {"status": t.status, "ocr_queued": queued.get(t.device_id, 0), **t.metrics.metrics()}
+                for t in self.threads
+            },
+        }
+
+    def print_status(self):
+        for device_id, m in self.metrics()["cameras"].items():
+            stages = m["stages"]
+            parts = [f"{stage} p50 {s['seconds_p50'] * 1000:.0f}ms" for stage, s in stages.items()
+                     if stage in ("capture", "ocr_wait", "ocr", "burst", "upload")]
+            print(f"[STATUS] {device_id} {m['status']}: {m['counters'].get('bursts', 0)} bursts, "
+                  f"{m['counters'].get('uploaded', 0)} uploaded, {m['counters'].get('spooled', 0)} spooled | "
+                  + ", ".join(parts))
+
+def main():
+    parser = argparse.ArgumentParser(description="OCR supervisor for several monitor cameras")
+    parser.add_argument("config", nargs="?", default=CAMERAS_FILE, help="cameras JSON file")
+    parser.add_argument("--workers", type=int, default=OCR_WORKERS, help="shared OCR worker processes")
+    parser.add_argument("--status-interval", type=int, default=STATUS_INTERVAL, help="seconds between status lines")
+    parser.add_argument("--metrics", help="write the final metrics as JSON here")
+    args = parser.parse_args()
+
+    supervisor = Supervisor(load_cameras(args.config), args.workers)
+    supervisor.start()
+    last_status = time.time()
+    try:
+        while supervisor.running():
+            time.sleep(0.5)
+            if time.time() - last_status >= args.status_interval:
+                supervisor.print_status()
+                last_status = time.time()
+    except KeyboardInterrupt:
+        print("Stopping...")
+    supervisor.stop()
+    supervisor.print_status()
+    if args.metrics:
+        with open(args.metrics, "w") as f:
+            json.dump(supervisor.metrics(), f, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""
+Pollutant readings out of full-frame OCR text.
+
+All labels are matched by one precompiled regex in a single pass over the text
+(LabelExtractor), shared by extract_readings() and extract_value() in ocr_ingest.
+"""
+import re
+from functools import lru_cache
+
+# regex patterns for each pollutant (list allows aliases for common misreads: O <-> 0)
+LABELS = {
+    "PM2.5": [r"PM\s*2\.?5", r"PM25"],
+    "PM10":  [r"PM\s*10", r"PM1O"],
+    "CO":    [r"CO", r"C0"],
+    "NO2":   [r"NO\s*2", r"N02"],
+    "O3":    [r"O\s*3", r"03"],
+    "SO2":   [r"SO\s*2", r"S02"]
+}
+
+# Sanity bounds: a value above this is a misread (PM2.5 > 500 is rare, a stray 9 from the
+# unit turns 63 into 639), the match is ignored and a later occurrence is used instead.
+# They also decide the "639g" case below, so every label shown in µg needs one
+MAX_VALUES = {"PM2.5": 600, "PM10": 1000}
+
+# Label -> separator (colon, dash, equals, space) -> number. A 'g' glued to the number is
+# kept in its own group: "63µg" often comes out as "639g" (µ read as 9), which is only
+# undone when the value is above its MAX_VALUES bound and dropping the 9 brings it under
+SEPARATOR = r"[:=\-\s]+"
+NUMBER = r"(?P<value>[0-9]+(?:\.[0-9]*)?)(?P<unit_g>g)?"
+
+
+class LabelExtractor:
+    """
+    Finds a number after each label's aliases with one compiled regex, in one pass.
+
+    `labels` maps label -> list of alias regexes (like LABELS). The first occurrence of
+    a label wins, unless it is above its MAX_VALUES bound.
+    """
+
+    def __init__(self, labels, max_values=None):
+        self.max_values = dict(max_values or {})
+        self.groups = {}  # regex group name -> label
+        alternatives = []
+        for i, (label, patterns) in enumerate(labels.items()):
+            group = f"label{i}"
+            self.groups[group] = label
+            # Aliases starting with a digit ("03") must not match inside a number ("1.03")
+            aliases = "|".join(rf"(?<![0-9.]){p}" if p[:1].isdigit() else p for p in patterns)
+            alternatives.append(f"(?P<{group}>{aliases})")
+        # Only try the alternation where a label can start; roughly halves the scan time
+        first = {p[0].lower() for patterns in labels.values() for p in patterns}
+        guard = f"(?=[{re.escape(''.join(sorted(first)))}])" if all(c.isalnum() for c in first) else ""
+        self.regex = re.compile(rf"{guard}(?:{'|'.join(alternatives)}){SEPARATOR}{NUMBER}", re.IGNORECASE)
+
+    def label_of(self, match):
+        for group, label in self.groups.items():
+            if match.start(group) != -1:
+                return label
+        return None
+
+    def extract(self, text):
+        """Returns {label: value} for the labels found in `text`."""
+        readings = {}
+        for match in self.regex.finditer(text):
+            label = self.label_of(match)
+            if label in readings:
+                continue
+            value = match.group("value")
+            val = float(value)
+            limit = self.max_values.get(label, float("inf"))
+            if val > limit and match.group("unit_g") and len(value) > 1 and value.endswith("9") and value[-2] != ".":
+                # Only read the 9 as µ when that brings the value back in range:
+                # "639g" -> 63, but a real "69g" stays 69
+                val = float(value[:-1])
+            if val > limit:
+                continue
+            readings[label] = val
+            if len(readings) == len(self.groups):
+                break
+        return readings
+
+
+@lru_cache(maxsize=None)
+def extractor_for(patterns):
+    """Compiled single-label extractor for a tuple of alias patterns (cached)."""
+    return LabelExtractor({None: list(patterns)})
+
+
+label_extractor = LabelExtractor(LABELS, MAX_VALUES)
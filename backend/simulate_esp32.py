@@ -2,11 +2,13 @@ import requests
 import time
 import random
 import json
+from datetime import datetime
 
 # Configuration matching user's ESP32 code
 CLOUD_API = "http://localhost:8000/api/ingest"
 DEVICE_ID = "DEV_WATER_01"
 DEVICE_TYPE = "water"
+MAX_ATTEMPTS = 3  # Retries resend the same payload; the backend dedupes on (device_id, type, timestamp)
 
 def read_ph():
     # Simulate pH logic: normal range 6.5 - 8.5
@@ -24,6 +26,8 @@ def send_to_cloud():
     payload = {
         "device_id": DEVICE_ID,
         "type": DEVICE_TYPE,
+        # Stamp at read time so a retried upload is recognised as the same reading
+        "timestamp": datetime.utcnow().isoformat(),
         "data": {
             "ph": read_ph(),
             "turbidity": read_turbidity(),
@@ -31,18 +35,20 @@ def send_to_cloud():
         }
     }
     
-    try:
-        print(f"Sending: {json.dumps(payload)}")
-        # ESP32 sets 8s timeout
-        response = requests.post(CLOUD_API, json=payload, timeout=8)
-        
-        if response.status_code == 200:
-            print(f"[OK] Response: {response.text}")
-        else:
-            print(f"[ERR] HTTP {response.status_code}: {response.text}")
+    print(f"Sending: {json.dumps(payload)}")
+    for attempt in range(1, MAX_ATTEMPTS + 1):
+        try:
+            # ESP32 sets 8s timeout
+            response = requests.post(CLOUD_API, json=payload, timeout=8)
             
-    except Exception as e:
-        print(f"[ERR] Exception: {e}")
+            if response.status_code == 200:
+                print(f"[OK] Response: {response.text}")
+            else:
+                print(f"[ERR] HTTP {response.status_code}: {response.text}")
+            return
+                
+        except Exception as e:
+            print(f"[ERR] Exception (attempt {attempt}/{MAX_ATTEMPTS}): {e}")
 
 if __name__ == "__main__":
     print(f"--- Simulating ESP32: {DEVICE_ID} ---")
@@ -0,0 +1,128 @@
+"""
+API tests for /api/devices and /api/locations/status: query count independent of
+fleet size, paging and filters, ETag revalidation.
+
+Run from backend/:  python -m pytest -q test_api_queries.py
+"""
+import importlib
+from datetime import datetime, timedelta
+
+import pytest
+
+from query_log import assert_max_queries
+
+# Queries per request once the token is cached: the endpoint's own query, plus the
+# count for X-Total-Count when paging
+MAX_QUERIES = 2
+
+
+@pytest.fixture(scope="module")
+def client(tmp_path_factory):
+    # database.py reads DATABASE_URL at import time, so main is imported here
+    db = tmp_path_factory.mktemp("api") / "test.db"
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setenv("DATABASE_URL", f"sqlite:///{db}")
+        mp.setenv("INGEST_RATE_LIMIT", "0")
+        from fastapi.testclient import TestClient
+        main = importlib.import_module("main")
+        with TestClient(main.app) as client:
+            yield client
+
+
+def make_user(client, email):
+    client.post("/api/auth/register", json={"email": email, "password": "pw"})
+    token = client.post("/api/auth/login", data={"username": email, "password": "pw"}).json()["access_token"]
+    return {"Authorization": f"Bearer {token}"}
+
+
+def add_devices(client, headers, devices):
+    """devices: (device_id, type, location name); each gets one reading from a minute ago."""
+    timestamp = (datetime.utcnow() - timedelta(minutes=1)).isoformat()
+    for device_id, device_type, location in devices:
+        r = client.post("/api/devices/register", headers=headers,
+                        json={"device_id": device_id, "device_type": device_type, "location_id": location})
+        assert r.status_code == 200, r.text
+        r = client.post("/api/ingest", json={"device_id": device_id, "type": device_type,
+                                             "timestamp": timestamp, "data": {"pm25": 12}})
+        assert r.status_code == 200, r.text
+    return timestamp
+
+
+@pytest.fixture(scope="module")
+def small(client):
+    headers = make_user(client, "small@example.com")
+    timestamp = add_devices(client, headers, [("S1", "aqi", "SMALL_LOC")])
+    return headers, timestamp
+
+
+@pytest.fixture(scope="module")
+def fleet(client):
+    headers = make_user(client, "fleet@example.com")
+    devices = [(f"F{i:02d}", "aqi" if i % 2 else "water", f"FLEET_LOC_{i % 5}") for i in range(20)]
+    add_devices(client, headers, devices)
+    return headers
+
+
+def count_queries(client, url, headers):
+    client.get(url, headers=headers)  # token lookup on the first request
+    with assert_max_queries(MAX_QUERIES, f"GET {url}") as stats:
+        r = client.get(url, headers=headers)
+    assert r.status_code == 200
+    return stats.count
+
+
+@pytest.mark.parametrize("url", ["/api/devices", "/api/devices?limit=5", "/api/locations/status"])
+def test_query_count_does_not_grow_with_fleet(client, small, fleet, url):
+    assert count_queries(client, url, small[0]) == count_queries(client, url, fleet)
+
+
+def test_devices_lists_last_seen(client, small):
+    headers, timestamp = small
+    r = client.get("/api/devices", headers=headers)
+    assert r.json() == [{"device_id": "S1", "type": "aqi", "location_name": "SMALL_LOC",
+                         "location_id": "SMALL_LOC", "last_seen": timestamp, "status": "OFFLINE"}]
+    assert r.headers["X-Total-Count"] == "1"
+
+
+def test_devices_paging(client, fleet):
+    r = client.get("/api/devices?limit=8&offset=16", headers=fleet)
+    assert [d["device_id"] for d in r.json()] == ["F16", "F17", "F18", "F19"]
+    assert r.headers["X-Total-Count"] == "20"
+    assert client.get("/api/devices?limit=0", headers=fleet).status_code == 422
+
+
+def test_devices_filters(client, fleet):
+    r = client.get("/api/devices?type=water&location_id=FLEET_LOC_0", headers=fleet)
+    assert [d["device_id"] for d in r.json()] == ["F00", "F10"]
+    assert r.headers["X-Total-Count"] == "2"
+    r = client.get("/api/devices?type=water&limit=3", headers=fleet)
+    assert [d["device_id"] for d in r.json()] == ["F00", "F02", "F04"]
+    assert r.headers["X-Total-Count"] == "10"
+
+
+def test_locations_status(client, fleet):
+    r = client.get("/api/locations/status", headers=fleet)
+    assert [loc["location_id"] for loc in r.json()] == [f"FLEET_LOC_{i}" for i in range(5)]
+    assert all(loc["last_seen"] and not loc["online"] for loc in r.json())
+
+
+def test_locations_status_etag(client, small):
+    headers, _ = small
+    r = client.get("/api/locations/status", headers=headers)
+    etag = r.headers["ETag"]
+    assert r.headers["Cache-Control"] == "private, no-cache"
+
+    r = client.get("/api/locations/status", headers={**headers, "If-None-Match": etag})
+    assert r.status_code == 304
+    assert r.content == b""
+    assert r.headers["ETag"] == etag
+    # Weak form and lists of tags match too
+    r = client.get("/api/locations/status", headers={**headers, "If-None-Match": f'"other", W/{etag}'})
+    assert r.status_code == 304
+
+    # A new reading changes the body, so the old tag no longer matches
+    client.post("/api/ingest", json={"device_id": "S1", "type": "aqi", "data": {"pm25": 13}})
+    r = client.get("/api/locations/status", headers={**headers, "If-None-Match": etag})
+    assert r.status_code == 200
+    assert r.headers["ETag"] != etag
+    assert r.json()[0]["online"] is True
@@ -0,0 +1,73 @@
+"""
+Unit tests for the OCR text extractor (services/ocr_text.py).
+
+Run from backend/:  python -m pytest -q test_ocr_extractor.py
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "services"))
+
+from ocr_text import LABELS, LabelExtractor, extractor_for, label_extractor
+
+SCREEN = """PM2.5: 63 ug/m3
+PM10: 88 ug/m3
+CO: 0.8 mg/m3
+NO2: 21 ppb
+O3: 34.5 ppb
+SO2: 4 ppb"""
+
+
+def test_full_screen():
+    assert label_extractor.extract(SCREEN) == {"PM2.5": 63, "PM10": 88, "CO": 0.8, "NO2": 21, "O3": 34.5, "SO2": 4}
+
+
+def test_letter_o_read_as_zero_and_back():
+    assert label_extractor.extract("PM1O: 80") == {"PM10": 80}
+    assert label_extractor.extract("C0: 1.2") == {"CO": 1.2}
+    assert label_extractor.extract("03 - 41\nN02 12\nS02=3") == {"O3": 41, "NO2": 12, "SO2": 3}
+
+
+def test_co_is_not_co2():
+    assert label_extractor.extract("CO2: 410 ppm\nCO: 0.6") == {"CO": 0.6}
+    assert label_extractor.extract("C02 415") == {}
+
+
+def test_micro_read_as_nine():
+    assert label_extractor.extract("PM2.5: 639g/m3") == {"PM2.5": 63}
+    assert label_extractor.extract("PM10: 1209g/m3") == {"PM10": 120}
+    # A real 9 followed by a proper unit is kept
+    assert label_extractor.extract("PM10: 639 ug/m3") == {"PM10": 639}
+    assert label_extractor.extract("PM2.5: 49ug/m3") == {"PM2.5": 49}
+
+
+def test_plausible_nine_before_g_is_kept():
+    # Regression: "69g" was read as 6; 69 is in range, so the 9 is a digit
+    assert label_extractor.extract("PM2.5: 69g/m3") == {"PM2.5": 69}
+    assert label_extractor.extract("PM10: 99g/m3") == {"PM10": 99}
+    # Out of range either way: ignored, the later occurrence is used
+    assert label_extractor.extract("PM2.5: 7009g\nPM2.5: 70") == {"PM2.5": 70}
+    # No bound, nothing to judge the 9 by
+    assert extractor_for(tuple(LABELS["PM2.5"])).extract("PM2.5: 639g").get(None) == 639
+
+
+def test_pm25_sanity_bound():
+    assert label_extractor.extract("PM2.5: 639 ug") == {}
+    assert label_extractor.extract("PM2.5: 700\nPM2.5: 70") == {"PM2.5": 70}
+
+
+def test_digit_alias_not_inside_number():
+    assert label_extractor.extract("CO: 1.03 4") == {"CO": 1.03}
+
+
+def test_label_without_value():
+    assert label_extractor.extract("PM2.5: --\nPM10 : 15") == {"PM10": 15}
+
+
+def test_first_occurrence_wins():
+    assert LabelExtractor(LABELS).extract("O3: 10\nO3: 20") == {"O3": 10}
+
+
+def test_single_label_extractor():
+    assert extractor_for(tuple(LABELS["PM2.5"])).extract("PM 2.5 - 12").get(None) == 12
+    assert extractor_for(tuple(LABELS["PM2.5"])) is extractor_for(tuple(LABELS["PM2.5"]))
@@ -0,0 +1,78 @@
+"""
+Unit tests for the SQL query instrumentation (query_log.py).
+
+Run from backend/:  python -m pytest -q test_query_log.py
+"""
+import pytest
+from sqlalchemy import create_engine, text
+
+import query_log
+from query_log import assert_max_queries
+
+
+@pytest.fixture
+def engine():
+    engine = create_engine("sqlite://")
+    query_log.instrument_queries()
+    yield engine
+    engine.dispose()
+
+
+def test_assert_max_queries_passes_and_counts(engine):
+    with engine.connect() as conn:
+        with assert_max_queries(2) as stats:
+            conn.execute(text("SELECT 1"))
+            conn.execute(text("SELECT 2"))
+    assert stats.count == 2
+    assert stats.statements == ["SELECT 1", "SELECT 2"]
+
+
+def test_assert_max_queries_fails_with_listing(engine):
+    with engine.connect() as conn:
+        with pytest.raises(AssertionError) as excinfo:
+            with assert_max_queries(1, "GET /api/devices"):
+                for i in range(3):
+                    conn.execute(text(f"SELECT {i}"))
+    message = str(excinfo.value)
+    assert "GET /api/devices executed 3 queries, expected at most 1" in message
+    assert "3. SELECT 2" in message
+
+
+def test_request_scope_counts_only_its_queries(engine):
+    with engine.connect() as conn:
+        conn.execute(text("SELECT 1"))
+        stats, token = query_log.begin_request({"type": "http", "method": "GET", "path": "/x"})
+        try:
+            conn.execute(text("SELECT 2"))
+        finally:
+            query_log.end_request(token)
+        conn.execute(text("SELECT 3"))
+    assert stats.count == 1
+    assert stats.seconds > 0
+
+
+def test_slow_query_logged_with_params_and_route(engine, monkeypatch, capsys):
+    class Route:
+        path = "/api/devices/{device_id}"
+
+    monkeypatch.setattr(query_log, "SLOW_QUERY_MS", 1e-6)
+    before = query_log.totals()["slow_queries_total"]
+    scope = {"type": "http", "method": "GET", "path": "/api/devices/D1", "route": Route()}
+    stats, token = query_log.begin_request(scope)
+    try:
+        with engine.connect() as conn:
+            conn.execute(text("SELECT :device_id"), {"device_id": "D1"})
+    finally:
+        query_log.end_request(token)
+    out = capsys.readouterr().out
+    assert "SLOW QUERY" in out
+    assert "[GET /api/devices/{device_id}]" in out
+    assert "SELECT ? | params: ('D1',)" in out
+    assert query_log.totals()["slow_queries_total"] > before
+
+
+def test_slow_query_log_disabled(engine, monkeypatch, capsys):
+    monkeypatch.setattr(query_log, "SLOW_QUERY_MS", 0)
+    with engine.connect() as conn:
+        conn.execute(text("SELECT 1"))
+    assert "SLOW QUERY" not in capsys.readouterr().out